@@ -0,0 +1,178 @@
+# almacen_tweets.py
+
+"""
+Almacén local (SQLite) de tweets ya descargados, particionado por término y día.
+
+Cada término guarda qué días del pasado ya se descargaron por completo
+(tabla `cobertura`). Una consulta nueva sólo pide a Apify los días que faltan
+y combina el resultado con lo almacenado, así que desplazar la ventana un día
+cuesta un día de scraping y no la semana entera.
+
+Las ventanas son semiabiertas, como los operadores since/until de Twitter:
+`start` incluido, `end` excluido.
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from esquema import COLUMNAS, aplicar_esquema
+
+
+
+
+def _sql(nombre):
+    return '"' + nombre.replace('"', '""') + '"'
+
+
+def dias_de_ventana(start, end):
+    """Días de la ventana [start, end); si start == end, sólo ese día."""
+    dias = [start + timedelta(days=i) for i in range((end - start).days)]
+    return dias or [start]
+
+
+def rangos_contiguos(dias):
+    """Agrupa una lista ordenada de días en rangos [inicio, fin) consecutivos."""
+    rangos = []
+    for dia in dias:
+        if rangos and rangos[-1][1] == dia:
+            rangos[-1][1] = dia + timedelta(days=1)
+        else:
+            rangos.append([dia, dia + timedelta(days=1)])
+    return [tuple(rango) for rango in rangos]
+
+
+class AlmacenTweets:
+    """Tweets por (término, url) más la cobertura por (término, orden, día)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directorio = os.path.dirname(path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        columnas = ", ".join(f"{_sql(c)}" for c in COLUMNAS if c != 'url')
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS tweets (
+                       termino TEXT NOT NULL,
+                       dia TEXT NOT NULL,
+                       url TEXT NOT NULL,
+                       {columnas},
+                       PRIMARY KEY (termino, url)
+                   )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tweets_termino_dia ON tweets (termino, dia)")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS cobertura (
+                       termino TEXT NOT NULL,
+                       orden TEXT NOT NULL,
+                       dia TEXT NOT NULL,
+                       obtenido REAL NOT NULL,
+                       PRIMARY KEY (termino, orden, dia)
+                   )"""
+            )
+
+    def dias_faltantes(self, termino, orden, start, end):
+        """Días de la ventana que todavía no se descargaron completos."""
+        with self._lock:
+            cubiertos = {
+                fila[0] for fila in self._conn.execute(
+                    "SELECT dia FROM cobertura WHERE termino = ? AND orden = ? AND dia >= ? AND dia <= ?",
+                    (termino, orden, start.isoformat(), end.isoformat()),
+                )
+            }
+        return [dia for dia in dias_de_ventana(start, end) if dia.isoformat() not in cubiertos]
+
+    def guardar(self, termino, orden, df, dias_completos=()):
+        """
+        Guarda (o actualiza) los tweets de `df` para `termino` y marca como
+        cubiertos `dias_completos`. Sólo deberían marcarse días ya terminados y
+        descargados sin cortar por `maxItems`.
+        """
+        columnas = [c for c in COLUMNAS if c != 'url']
+        filas = []
+        if not df.empty and 'url' in df.columns and 'createdAt' in df.columns:
+            fechas = pd.to_datetime(df['createdAt'], errors='coerce', utc=True)
+            for registro, fecha in zip(df.to_dict('records'), fechas):
+                if pd.isna(fecha) or not registro.get('url'):
+                    continue
+                valores = [fecha.isoformat() if c == 'createdAt' else _valor_sql(registro.get(c)) for c in columnas]
+                filas.append((termino, fecha.date().isoformat(), registro['url'], *valores))
+
+        marcas = ", ".join("?" * (3 + len(columnas)))
+        obtenido = datetime.now(timezone.utc).timestamp()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO tweets (termino, dia, url, {', '.join(_sql(c) for c in columnas)}) VALUES ({marcas})",
+                filas,
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cobertura (termino, orden, dia, obtenido) VALUES (?, ?, ?, ?)",
+                [(termino, orden, dia.isoformat(), obtenido) for dia in dias_completos],
+            )
+
+    def tweets_por_dia(self, termino):
+        """Promedio de tweets almacenados de `termino` por día con tweets, o None si no hay ninguno."""
+        with self._lock:
+            total, dias = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT dia) FROM tweets WHERE termino = ?", (termino,)
+            ).fetchone()
+        return total / dias if dias else None
+
+    def leer(self, termino, start, end):
+        """Tweets almacenados de `termino` cuya fecha cae en la ventana [start, end)."""
+        dias = dias_de_ventana(start, end)
+        with self._lock:
+            df = pd.read_sql_query(
+                f"SELECT {', '.join(_sql(c) for c in COLUMNAS)} FROM tweets WHERE termino = ? AND dia >= ? AND dia <= ?",
+                self._conn,
+                params=(termino, dias[0].isoformat(), dias[-1].isoformat()),
+            )
+        if df.empty:
+            return pd.DataFrame()
+        df['createdAt'] = pd.to_datetime(df['createdAt'], errors='coerce', utc=True, format='ISO8601')
+        return aplicar_esquema(df)
+
+
+def _valor_sql(valor):
+    """Convierte NaN/NaT a NULL y los escalares de numpy a tipos nativos."""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    return valor.item() if hasattr(valor, 'item') else valor
+
+
+def obtener_incremental(almacen, termino, start, end, obtener_rango, orden="Top", max_items=None, hoy=None,
+                        on_almacenados=None):
+    """
+    Devuelve los tweets de `termino` en [start, end) pidiendo a Apify sólo los
+    rangos de días que faltan en `almacen`.
+
+    `obtener_rango(termino, inicio, fin)` descarga un rango [inicio, fin) y
+    devuelve un DataFrame. Un día queda cubierto si ya terminó (anterior a
+    `hoy`, en UTC) y la descarga no se cortó en `max_items`.
+    `on_almacenados(df)` recibe los tweets devueltos que no vinieron de
+    `obtener_rango` en esta llamada (los que ya estaban guardados).
+
+    Devuelve `(df, dias_descargados)`.
+    """
+    hoy = hoy or datetime.now(timezone.utc).date()
+    faltantes = almacen.dias_faltantes(termino, orden, start, end)
+    descargados = []
+    for inicio, fin in rangos_contiguos(faltantes):
+        df_rango = obtener_rango(termino, inicio, fin)
+        completo = max_items is None or len(df_rango) < max_items
+        dias_completos = [dia for dia in dias_de_ventana(inicio, fin) if dia < hoy] if completo else []
+        almacen.guardar(termino, orden, df_rango, dias_completos)
+        if 'url' in df_rango.columns:
+            descargados.append(df_rango['url'])
+    df = almacen.leer(termino, start, end)
+    if on_almacenados is not None and not df.empty:
+        on_almacenados(df[~df['url'].isin(pd.concat(descargados))] if descargados else df)
+    return df, len(faltantes)
@@ -5,12 +5,28 @@ from apify_client import ApifyClient
 import pandas as pd
 import google.generativeai as genai
 from datetime import date, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import plotly.express as px
 import re
-import io
-import json
-import random
+import os
+import uuid
+
+from almacen_tweets import AlmacenTweets
+from cache_sentimientos import CacheSentimientos
+from cache_temas import CacheTemas
+from chat import MAX_TWEETS_CHAT, IndiceTweets, responder
+from clasificacion import nombre_modelo
+from esquema import SENTIMIENTOS
+from exportacion import FORMATOS, exportar_memoizado, ruta_exportacion
+from llm import MODELO_GEMINI, Circuito, ClienteLLM, CubetaTokens
+from lotes import MAX_TOKENS_LOTE, MIN_TOKENS_LOTE, PRESUPUESTO_TOKENS_LOTE
+from metricas import a_openmetrics
+from pipeline import ejecutar_analisis, parsear_terminos
+from rollup import formato_largo, rollup
+from prefiltro import UMBRAL_PREFILTRO
+from rankings import RankingsTweets
+from resultados import distribucion_sentimientos, huella_ejecucion, metricas_alcance, tabla_distribucion
+from scraping import obtener_tweets
+from trabajos import EN_COLA, EN_CURSO, ESTADOS_FINALES, FALLIDO, INTERRUMPIDO, TERMINADO, ColaTrabajos
 
 
 
@@ -26,6 +42,193 @@ st.set_page_config(
 # Por ejemplo, si los correos son 'usuario@miempresa.com', entonces el dominio es 'miempresa.com'.
 COMPANY_EMAIL_DOMAIN = "publicalatam.com" # <--- ¡CAMBIA ESTO!
 
+# --- Directorio de datos locales (cachés persistentes) ---
+DATA_DIR = os.environ.get("LISTENING_DATA_DIR", ".cache")
+
+
+@st.cache_resource
+def get_cache_sentimientos():
+    """Caché de sentimientos compartida por todas las sesiones del servidor."""
+    return CacheSentimientos(os.path.join(DATA_DIR, "sentimientos.sqlite3"))
+
+
+@st.cache_resource
+def get_cache_temas():
+    """Caché de temas por fragmento de tweets, compartida por todas las sesiones del servidor."""
+    return CacheTemas(os.path.join(DATA_DIR, "temas.sqlite3"))
+
+
+@st.cache_resource
+def get_almacen_tweets():
+    """Almacén local de tweets descargados, compartido por todas las sesiones."""
+    return AlmacenTweets(os.path.join(DATA_DIR, "tweets.sqlite3"))
+
+
+@st.cache_resource
+def get_cola_trabajos():
+    """Cola de análisis en segundo plano, compartida por todas las sesiones del servidor."""
+    return ColaTrabajos(
+        os.path.join(DATA_DIR, "trabajos.sqlite3"),
+        os.path.join(DATA_DIR, "resultados"),
+        max_workers=int(os.environ.get("LISTENING_MAX_TRABAJOS", 2)),
+    )
+
+
+def id_sesion():
+    """
+    ID de la sesión del navegador, con el que se guardan y listan sus trabajos.
+    También va en el enlace (?sesion=ID), así sobrevive a un refresco.
+    """
+    sesion = st.query_params.get("sesion") or st.session_state.get("sesion") or uuid.uuid4().hex[:12]
+    st.session_state["sesion"] = sesion
+    st.query_params["sesion"] = sesion
+    return sesion
+
+
+# Un resultado se reutiliza durante una hora si la ventana llega hasta hoy (pueden aparecer
+# tweets nuevos); si la ventana ya cerró, mientras esté guardado.
+VIGENCIA_RESULTADOS = 3600
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def cargar_resultado(trabajo_id):
+    """Resultado de un trabajo terminado, leído del disco una sola vez (no se debe modificar)."""
+    return get_cola_trabajos().resultado(trabajo_id)
+
+
+def figura_sentimientos(conteo):
+    """Gráfico de torta de la distribución de sentimientos (ver `resultados.tabla_distribucion`)."""
+    fig = px.pie(
+        conteo,
+        values='Cantidad',
+        names='Sentimiento',
+        title='Distribución de Sentimientos de los Tweets',
+        hover_data=['Porcentaje'],
+        labels={'Porcentaje': 'Porcentaje (%)'},
+        color='Sentimiento',
+        color_discrete_map={
+            'POSITIVO': '#4CAF50', # Green
+            'NEGATIVO': '#F44336', # Red
+            'NEUTRO': '#9E9E9E'     # Grey
+        }
+    )
+    fig.update_traces(textposition='inside', textinfo='percent+label', marker=dict(line=dict(color='#000000', width=1)))
+    fig.update_layout(
+        margin=dict(t=40, b=0, l=0, r=0),
+        legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="right", x=1)
+    )
+    return fig
+
+
+def figura_tendencia(tabla, etiqueta, titulo, nombre_serie, nombre_valor, **kwargs):
+    """Gráfico de líneas de una tabla de `rollup` (una línea por columna)."""
+    fig = px.line(
+        formato_largo(tabla, nombre_serie, nombre_valor),
+        x='time_bucket',
+        y=nombre_valor,
+        color=nombre_serie,
+        title=titulo,
+        markers=len(tabla) <= 60,
+        **kwargs
+    )
+    fig.update_layout(
+        xaxis_title=etiqueta,
+        yaxis_title=nombre_valor,
+        margin=dict(t=40, b=0, l=0, r=0),
+        yaxis_range=[0, None]
+    )
+    return fig
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def agregados_dashboard(clave_resultado, _df, ventana=None, _rankings=None):
+    """
+    Tablas y figuras del dashboard de un resultado. La clave de caché es
+    `clave_resultado` (huella de la ejecución + ID del trabajo); `_df` no se hashea.
+    `ventana` (`(start_date, end_date)`) extiende las series de tiempo a todo el
+    período pedido. Sin la columna `sentimiento` (resultado parcial, recién
+    scrapeado) no hay distribución ni evolución de sentimientos. Los rankings
+    vienen calculados por el pipeline (`_rankings`); sólo los resultados
+    guardados antes de que existieran se recorren acá.
+    """
+    conteo = distribucion_sentimientos(_df) if 'sentimiento' in _df.columns else None
+    fig = figura_sentimientos(conteo) if conteo is not None else None
+
+    # Series de tiempo: una sola pasada sobre el DataFrame (ver `rollup.py`)
+    serie = rollup(_df, *(ventana or (None, None)))
+    fig_timeline = fig_sentimientos_tiempo = fig_terminos_tiempo = None
+    if serie is not None:
+        etiqueta = serie["etiqueta"]
+        fig_timeline = figura_tendencia(
+            serie["totales"][["tweets"]].rename(columns={"tweets": "Tweets"}), etiqueta,
+            'Cantidad de Tweets por ' + etiqueta, 'Serie', 'Número de Tweets',
+        )
+        fig_timeline.update_layout(showlegend=False)
+        if serie["proporciones"] is not None and serie["sentimientos"].to_numpy().sum():
+            fig_sentimientos_tiempo = figura_tendencia(
+                serie["proporciones"] * 100, etiqueta, 'Sentimiento por ' + etiqueta,
+                'Sentimiento', 'Porcentaje de tweets clasificados',
+                color_discrete_map={'POSITIVO': '#4CAF50', 'NEGATIVO': '#F44336', 'NEUTRO': '#9E9E9E'},
+            )
+        if serie["terminos"].shape[1] > 1:
+            fig_terminos_tiempo = figura_tendencia(
+                serie["terminos"], etiqueta, 'Tweets por término y ' + etiqueta, 'Término', 'Número de Tweets',
+            )
+
+    rankings = _rankings if _rankings is not None else RankingsTweets.desde_df(_df)
+    return {
+        "metricas": metricas_alcance(_df),
+        "top_tweets": rankings.top_tweets(),
+        "top_usuarios": rankings.top_seguidores(),
+        "top_activos": rankings.top_activos(),
+        "top_interaccion": rankings.top_interaccion(),
+        "distribucion": conteo,
+        "fig_distribucion": fig,
+        "fig_timeline": fig_timeline,
+        "fig_sentimientos_tiempo": fig_sentimientos_tiempo,
+        "fig_terminos_tiempo": fig_terminos_tiempo,
+    }
+
+
+# Avance global de un trabajo: (inicio, peso) de cada etapa
+PESO_ETAPAS = {"scraping": (0.0, 0.4), "clasificacion": (0.4, 0.4), "temas": (0.8, 0.2)}
+
+ETIQUETAS_EXPORTACION = {
+    "parquet": "Parquet",
+    "csv.gz": "CSV (gzip)",
+    "json": "Temas y datos de la ejecución (JSON)",
+}
+
+ETIQUETAS_ESTADO = {
+    EN_COLA: "en cola",
+    EN_CURSO: "en curso",
+    TERMINADO: "terminado",
+    FALLIDO: "fallido",
+    INTERRUMPIDO: "interrumpido",
+}
+
+
+@st.cache_resource
+def get_limitador_llm():
+    """
+    Limitador de peticiones a Gemini compartido por todas las sesiones: la
+    cuota es de la API Key (una sola, la de `st.secrets`). El límite lo fija
+    `limitador_llm(rpm)` con lo configurado en la página.
+    """
+    return CubetaTokens()
+
+
+def limitador_llm(rpm):
+    limitador = get_limitador_llm()
+    limitador.configurar(rpm)
+    return limitador
+
+
+@st.cache_resource
+def get_circuito_llm():
+    """Cortocircuito compartido: si Gemini falla para una sesión, las demás también esperan."""
+    return Circuito()
+
 
 # --- CSS personalizado ---
 st.markdown(
@@ -125,107 +328,22 @@ def main_app():
     model = None
     if gemini_api_key:
         genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel("gemini-2.0-flash")
+        model = genai.GenerativeModel(MODELO_GEMINI)
     else:
         st.error("Por favor, configura tu GEMINI_API_KEY en `.streamlit/secrets.toml` para habilitar el análisis de sentimiento.")
 
     # --- Función para scraping ---
-    @st.cache_data(ttl=3600) # Cachea los datos por 1 hora
-    def get_twitter_data(search_terms, start_date, end_date, sort_type):
-        try:
-            apify_client = ApifyClient(apify_token)
-            actor_id = "apidojo/twitter-scraper-lite"
-            run_input = {
-                "end": end_date,
-                "maxItems": 10000, # Mantener un límite razonable para evitar usos excesivos de la API
-                "searchTerms": search_terms,
-                "sort": sort_type,
-                "start": start_date
-            }
-            run = apify_client.actor(actor_id).call(run_input=run_input)
-            dataset_items = apify_client.run(run['id']).dataset().list_items().items
-            if dataset_items:
-                df = pd.DataFrame(dataset_items)
-                df['author/profilePicture'] = df['author'].apply(lambda x: x.get('profilePicture') if isinstance(x, dict) else None)
-                df['author/followers'] = df['author'].apply(lambda x: x.get('followers') if isinstance(x, dict) else None)
-                df['author/userName'] = df['author'].apply(lambda x: x.get('userName') if isinstance(x, dict) else None)
-
-                # Asegurarse de que 'viewCount' y 'author/followers' sean numéricos
-                df['viewCount'] = pd.to_numeric(df['viewCount'], errors='coerce').fillna(0)
-                df['author/followers'] = pd.to_numeric(df['author/followers'], errors='coerce').fillna(0)
-
-                # Seleccionar todas las columnas originales y las nuevas, incluyendo la foto de perfil
-                all_columns = ['author/profilePicture','text', 'createdAt', 'author/userName', 'author/followers', 'url', 'likeCount',
-                               'replyCount', 'retweetCount', 'quoteCount', 'bookmarkCount', 'viewCount', 'source']
-
-                # Filtrar solo las columnas que realmente existen en el DataFrame
-                df = df[[col for col in all_columns if col in df.columns]]
-
-                df['createdAt'] = pd.to_datetime(df['createdAt'], errors='coerce')
-                return df
-            else:
-                return pd.DataFrame()
-        except Exception as e:
-            st.error(f"Error al obtener datos de Twitter: {e}. Asegúrate de que tu token de Apify sea válido y los términos de búsqueda sean apropiados.")
-            return pd.DataFrame()
+    # Sin spinner propio: se invoca desde los hilos de scraping en paralelo.
+    # Los errores se propagan (y no se cachean) para informarlos por término.
+    # `_on_chunk` recibe cada página descargada y `_metricas` mide la descarga (no forman parte de la clave de caché).
+    @st.cache_data(ttl=3600, show_spinner=False) # Cachea los datos por 1 hora
+    def get_twitter_data(search_terms, start_date, end_date, sort_type, _on_chunk=None, _metricas=None):
+        apify_client = ApifyClient(apify_token)
+        return obtener_tweets(apify_client, search_terms, start_date, end_date, sort_type, on_chunk=_on_chunk,
+                              metricas=_metricas)
 
     # # --- Funciones IA ---
 
-    def clasificar_tweets_en_lote(tweets, contexto, model):
-        import json
-        import re
-
-        if not model:
-            return ["NEUTRO"] * len(tweets)
-
-        tweets_preparados = [
-            tweet.replace('"', "'").replace("\n", " ").strip()[:280]
-            for tweet in tweets
-        ]
-
-        prompt = f"""
-    Eres un modelo de lenguaje experto en análisis de sentimiento de redes sociales.
-
-    CONTEXTO GENERAL: {contexto}
-
-    Clasifica el sentimiento de los siguientes tweets. Para cada tweet responde en una línea con el formato:
-    Tweet 1: POSITIVO
-    Tweet 2: NEGATIVO
-    Tweet 3: NEUTRO
-
-    Sentimientos permitidos: POSITIVO, NEGATIVO, NEUTRO.
-
-    TWEETS:
-    """
-
-        for i, tweet in enumerate(tweets_preparados):
-            prompt += f'\nTweet {i+1}: "{tweet}"'
-
-        prompt += "\n\nClasificación:\n"
-
-        try:
-            response = model.generate_content(prompt, generation_config={"temperature": 0.2})
-            respuesta = response.text.strip()
-
-            # Extraer los valores usando regex
-            matches = re.findall(r"Tweet\s*\d+:\s*(POSITIVO|NEGATIVO|NEUTRO)", respuesta, re.IGNORECASE)
-            sentimientos = [s.upper() for s in matches]
-
-            # Si no coincide la cantidad, asumir NEUTRO
-            if len(sentimientos) != len(tweets):
-                st.warning(f"❗ Gemini devolvió {len(sentimientos)} sentimientos para {len(tweets)} tweets. Se completará con NEUTRO.")
-                while len(sentimientos) < len(tweets):
-                    sentimientos.append("NEUTRO")
-                if len(sentimientos) > len(tweets):
-                    sentimientos = sentimientos[:len(tweets)]
-
-            return sentimientos
-
-        except Exception as e:
-            st.error(f"❌ Error en la clasificación con Gemini: {e}")
-            return ["NEUTRO"] * len(tweets)
-
-    
     # --- Función actualizada para mostrar los temas ---
     def mostrar_temas_con_contraste(texto_temas):
         """
@@ -266,66 +384,6 @@ def main_app():
             # Un separador visual para cada tema
             st.markdown("---")
 
-    def extraer_temas_con_ia(tweets, sentimiento, contexto, num_temas=3):
-        if not model:
-            return "El modelo de IA no está disponible para extraer temas."
-        
-        # Actualización del prompt para que coincida con el formato de la función de visualización
-        prompt = f"""CONTEXTO: {contexto}
-        Aquí hay tweets clasificados como {sentimiento}. Extrae los {num_temas} temas principales, explicando brevemente cada uno y dando un ejemplo.
-        El formato de salida debe ser exactamente:
-        1. [Nombre del tema]
-        [Breve explicación del tema]
-        Ejemplo: "[tweet de ejemplo relevante]", [author/userName: usuario_ejemplo]
-        2. [Nombre del tema]
-        ...
-        ---
-        Tweets para analizar:\n"""
-
-        # Limitar la cantidad de tweets enviados a la IA para evitar sobrecargar el prompt
-        texto = "\n".join(tweets[:500]) # Se reduce de 1000 a 500 para mayor eficiencia
-        if not texto.strip():
-            return "No hay tweets suficientes para extraer temas."
-
-        try:
-            response = model.generate_content(prompt + texto, generation_config={"temperature": 0.4})
-            return response.text.strip()
-        except Exception as e:
-            st.error(f"Error al extraer temas con IA: {e}")
-            return "No se pudieron extraer temas."
-
-    # --- FUNCIÓN PARA TEMAS GENERALES (también con el prompt actualizado) ---
-    def extraer_temas_generales_con_ia(tweets, contexto, num_temas=5):
-        if not model:
-            return "El modelo de IA no está disponible para extraer temas generales."
-
-        # Actualización del prompt para que coincida con el formato de la función de visualización
-        prompt = f"""CONTEXTO: {contexto}
-        Analiza la siguiente colección de tweets y extrae los {num_temas} temas principales o más mencionados.
-        Para cada tema, proporciona un nombre, una breve explicación y un tweet de ejemplo relevante.
-        El formato de salida debe ser exactamente:
-        1. [Nombre del tema]
-        [Breve explicación del tema]
-        Ejemplo: "[tweet de ejemplo relevante]", [author/userName: usuario_ejemplo]
-        2. [Nombre del tema]
-        ...
-        ---
-        Tweets para analizar:\n"""
-
-        # Tomar una muestra de tweets para no exceder el límite de tokens
-        sample_tweets = tweets[:min(len(tweets), 500)]
-        texto = "\n".join(sample_tweets)
-
-        if not texto.strip():
-            return "No hay tweets suficientes para extraer temas generales."
-
-        try:
-            response = model.generate_content(prompt + texto, generation_config={"temperature": 0.4})
-            return response.text.strip()
-        except Exception as e:
-            st.error(f"Error al extraer temas generales con IA: {e}")
-            return "No se pudieron extraer temas generales."
-
     # --- Sidebar: Parámetros ---
     with st.sidebar:
         st.header("⚙️ Configuración")
@@ -352,6 +410,93 @@ def main_app():
             help="Proporciona un contexto a la IA para mejorar la precisión del análisis de sentimiento y la extracción de temas. Por ejemplo: 'Opiniones de clientes sobre un nuevo producto financiero'."
         )
 
+        with st.expander("⚡ Rendimiento"):
+            usar_almacen = st.checkbox(
+                "Reutilizar tweets ya descargados",
+                value=True,
+                help="Guarda los tweets por término y día, y sólo pide a Apify los días que todavía no se descargaron."
+            )
+            fusionar_terminos = st.checkbox(
+                "Agrupar términos en una misma búsqueda",
+                value=True,
+                help="Busca varios términos en una sola ejecución de Apify (mientras el volumen estimado entre en el límite de tweets) y después asigna cada tweet a los términos que menciona."
+            )
+            max_scrapers = st.number_input(
+                "Búsquedas de Apify en paralelo",
+                min_value=1, max_value=10, value=4,
+                help="Cantidad de términos que se buscan a la vez en Apify."
+            )
+            max_workers = st.number_input(
+                "Lotes de clasificación en paralelo",
+                min_value=1, max_value=16, value=4,
+                help="Cantidad de llamadas simultáneas a Gemini durante la clasificación de sentimientos."
+            )
+            tokens_por_lote = st.number_input(
+                "Tokens por lote de clasificación (inicial)",
+                min_value=MIN_TOKENS_LOTE, max_value=MAX_TOKENS_LOTE, value=PRESUPUESTO_TOKENS_LOTE, step=500,
+                help="Tamaño inicial de cada prompt de clasificación. Crece mientras Gemini responde completo y se reduce a la mitad ante errores o respuestas incompletas."
+            )
+            rpm = st.number_input(
+                "Límite de peticiones por minuto",
+                min_value=0, max_value=2000, value=60,
+                help="Máximo de llamadas a Gemini por minuto (0 = sin límite). Ajústalo a la cuota de tu API Key."
+            )
+            casi_duplicados = st.checkbox(
+                "Agrupar casi duplicados",
+                value=False,
+                help="Además de los textos idénticos, clasifica una sola vez los tweets casi iguales (MinHash), típicos de campañas y bots."
+            )
+            umbral_duplicados = st.slider(
+                "Similitud mínima entre casi duplicados",
+                min_value=0.5, max_value=0.95, value=0.8, step=0.05,
+                disabled=not casi_duplicados
+            )
+            prefiltro_local = st.checkbox(
+                "Prefiltro local de sentimiento",
+                value=False,
+                help="Clasifica primero con un modelo local (léxico + Naive Bayes entrenado con la caché de sentimientos) y sólo envía a Gemini los tweets dudosos."
+            )
+            umbral_prefiltro = st.slider(
+                "Confianza mínima del prefiltro",
+                min_value=0.6, max_value=0.99, value=UMBRAL_PREFILTRO, step=0.01,
+                disabled=not prefiltro_local,
+                help="Los tweets con menos confianza se envían a Gemini. Más alto: menos ahorro y más concordancia con Gemini."
+            )
+            temas_completos = st.checkbox(
+                "Extraer temas de todos los tweets",
+                value=True,
+                help="Divide todos los tweets en fragmentos, extrae temas de cada uno en paralelo y los fusiona, con la cantidad de tweets por tema. Los fragmentos ya analizados se reutilizan de una caché. Desactivado, usa una muestra representativa."
+            )
+            presupuesto_temas = st.number_input(
+                "Presupuesto de tokens para temas",
+                min_value=2000, max_value=200000, value=12000, step=1000,
+                disabled=temas_completos,
+                help="Tamaño máximo de la muestra de tweets que se envía a Gemini para extraer cada grupo de temas. La muestra prioriza tweets diversos y con más alcance."
+            )
+            reutilizar_resultados = st.checkbox(
+                "Reutilizar análisis con los mismos parámetros",
+                value=True,
+                help="Si ya hay un análisis (terminado o en curso) con los mismos términos, fechas, contexto y modelo, se muestra ese en lugar de ejecutar otro."
+            )
+            usar_cache = st.checkbox(
+                "Usar caché de sentimientos",
+                value=True,
+                help="Reutiliza la clasificación de tweets (y los temas de fragmentos de tweets) ya analizados con el mismo contexto y modelo, sin volver a consultar a Gemini."
+            )
+
+        with st.expander("🗂️ Trabajos recientes"):
+            recientes = get_cola_trabajos().listar(usuario=id_sesion(), limite=10)
+            if not recientes:
+                st.caption("Todavía no hay trabajos.")
+            for reciente in recientes:
+                etiqueta = (
+                    f"{', '.join(reciente['parametros']['terms'])[:40]} · "
+                    f"{ETIQUETAS_ESTADO[reciente['estado']]} · {reciente['id']}"
+                )
+                if st.button(etiqueta, key=f"abrir_trabajo_{reciente['id']}", use_container_width=True):
+                    st.session_state["trabajo_id"] = reciente["id"]
+                    st.query_params["trabajo"] = reciente["id"]
+
         st.markdown("---")
         st.info("💡 Consejo: Cuanto más específico sea el contexto, mejor será el análisis de la IA.")
 
@@ -361,311 +506,517 @@ def main_app():
             logout()
 
 
-    # --- Contenido principal ---
-    st.markdown("---") # Separador visual
+    # --- Trabajos en segundo plano ---
+    # El análisis corre en la cola de trabajos del servidor: sobrevive a los reruns
+    # (widgets, refrescos del navegador) y varias sesiones pueden encolar a la vez.
+    cola = get_cola_trabajos()
 
-    if st.button("🚀 Ejecutar Scraping y Análisis", use_container_width=True):
-        if not apify_token:
-            st.error("Por favor, ingresa tu token de Apify en `.streamlit/secrets.toml` para continuar.")
-        else:
-            # Check if the user has provided a Gemini API key
-            if not gemini_api_key:
-                st.error("Por favor, ingresa tu API Key de Gemini en `.streamlit/secrets.toml` para el análisis de sentimiento y temas.")
-                st.stop()
-
-            # Procesamiento de términos
-            # split by comma or new line
-            # Dividir por salto de línea **primero** y limpiar espacios
-            terms = [t.strip() for t in search_terms_input.split("\n") if t.strip()]
-            
-            # Permitir también comas dentro de una misma línea
-            final_terms = []
-            for t in terms:
-                final_terms.extend([x.strip() for x in t.split(",") if x.strip()])
-            
-            terms = list(set(final_terms))  # eliminar duplicados
-
-            if not terms:
-                st.warning("Por favor, introduce al menos un término de búsqueda.")
-                st.stop()
-
-            start_str = start_date.strftime("%Y-%m-%d")
-            end_str = end_date.strftime("%Y-%m-%d")
-
-            with st.spinner("Buscando tweets... esto puede tardar un momento."):
-                all_results = []
-
-                for term in terms:
-                    with st.spinner(f"Buscando tweets para: {term}..."):
-                        df_term = get_twitter_data([term], start_str, end_str, "Top")
-                        if not df_term.empty:
-                            df_term["search_term"] = term  # para saber origen del tweet
-                            all_results.append(df_term)
-                
-                if not all_results:
-                    st.warning("No se encontraron tweets para ninguno de los términos ingresados.")
-                    st.stop()
-                
-                df = pd.concat(all_results, ignore_index=True)
-                
-                # Eliminar duplicados por URL
-                df = df.drop_duplicates(subset=["url"]).reset_index(drop=True)
-                
-                st.success(f"Se encontraron {len(df)} tweets únicos combinando todos los términos.")
-
-
-            if df.empty:
-                st.warning("😔 No se encontraron tweets con los términos y fechas seleccionados. Intenta con otros parámetros.")
-                st.stop()
-
-            st.success(f"✅ Se recolectaron {len(df)} tweets únicos.")
-            st.subheader("Primeros tweets encontrados:")
-            st.dataframe(df.head(10))
-
-            # --- Métricas de Alcance e Interacciones (con estilo grande) ---
-            total_views = df['viewCount'].sum()
-            total_interacciones = (
-                df[['likeCount', 'replyCount', 'retweetCount', 'quoteCount', 'bookmarkCount']]
-                .fillna(0).sum().sum()
-            )
+    # Secciones del dashboard, compartidas por el resultado final y el parcial
+    def mostrar_alcance(agregados):
+        # --- Métricas de Alcance e Interacciones (con estilo grande) ---
+        metricas = agregados["metricas"]
+        total_views = metricas["total_vistas"]
+        total_interacciones = metricas["total_interacciones"]
 
-            st.markdown(f"""
-            <div style="text-align: center; padding: 20px 0;">
-                <div style="font-size: 2.2em; font-weight: bold; color: #FFFFFF;">
-                    📈 Alcance Total: {int(total_views):,} visualizaciones
-                </div>
-                <div style="font-size: 2.2em; font-weight: bold; color: #FFFFFF;">
-                    💬 Interacciones Totales: {int(total_interacciones):,}
-                </div>
+        st.markdown(f"""
+        <div style="text-align: center; padding: 20px 0;">
+            <div style="font-size: 2.2em; font-weight: bold; color: #FFFFFF;">
+                📈 Alcance Total: {int(total_views):,} visualizaciones
             </div>
-            """, unsafe_allow_html=True)
-
-            avg_views = total_views / len(df)
-            avg_interacciones = total_interacciones / len(df)
-
-            st.markdown(f"""
-            <div style="text-align: center; font-size: 1.5em; color: #FFFFFF; margin-top: -10px;">
-                Promedio por Tweet: {int(avg_views):,} vistas / {int(avg_interacciones):,} interacciones
+            <div style="font-size: 2.2em; font-weight: bold; color: #FFFFFF;">
+                💬 Interacciones Totales: {int(total_interacciones):,}
             </div>
-            """, unsafe_allow_html=True)
+        </div>
+        """, unsafe_allow_html=True)
+
+        avg_views = metricas["promedio_vistas"]
+        avg_interacciones = metricas["promedio_interacciones"]
+
+        st.markdown(f"""
+        <div style="text-align: center; font-size: 1.5em; color: #FFFFFF; margin-top: -10px;">
+            Promedio por Tweet: {int(avg_views):,} vistas / {int(avg_interacciones):,} interacciones
+        </div>
+        """, unsafe_allow_html=True)
+
+    def mostrar_rankings(agregados):
+        # --- TOP 10 Tweets por ViewCount ---
+        st.subheader("🔥 Top 10 Tweets Más Vistos")
+
+        top_10_views_display = agregados["top_tweets"]
+
+        if not top_10_views_display.empty:
+            st.dataframe(top_10_views_display, use_container_width=True, hide_index=True,
+                        column_config={
+                            "author/profilePicture": st.column_config.ImageColumn("Foto de Perfil"), # Added profile picture
+                            "url": st.column_config.LinkColumn("URL del Tweet"),
+                            "viewCount": st.column_config.NumberColumn("Visualizaciones", format="%d"),
+                            "createdAt": st.column_config.DateColumn("Fecha de Creación", format="YYYY-MM-DD"),
+                            "author/userName": st.column_config.TextColumn("Usuario"),
+                            "author/followers": st.column_config.NumberColumn("Seguidores", format="%d"),
+                            "likeCount": st.column_config.NumberColumn("Likes", format="%d"),
+                            "replyCount": st.column_config.NumberColumn("Respuestas", format="%d"),
+                            "retweetCount": st.column_config.NumberColumn("Retweets", format="%d"),
+                            "quoteCount": st.column_config.NumberColumn("Citas", format="%d"),
+                            "bookmarkCount": st.column_config.NumberColumn("Guardados", format="%d"),
+                            "source": st.column_config.TextColumn("Fuente"),
+                            "text": st.column_config.TextColumn("Contenido del Tweet"),
+                        })
+        else:
+            st.info("No hay datos de visualizaciones disponibles para mostrar el top 10.")
+        # --- FIN TOP 10 Tweets por ViewCount ---
 
+        # --- TOP 10 Usuarios por Seguidores ---
+        st.markdown("---")
+        st.subheader("👑 Top 10 Usuarios")
+
+        columnas_usuarios = {
+            "author/profilePicture": st.column_config.ImageColumn("Foto de Perfil"), # Added profile picture
+            "author/userName": st.column_config.TextColumn("Usuario"),
+            "author/followers": st.column_config.NumberColumn("Seguidores", format="%d"),
+            "tweets": st.column_config.NumberColumn("Tweets", format="%d"),
+            "interacciones": st.column_config.NumberColumn("Interacciones", format="%d"),
+        }
+        tab_seguidores, tab_activos, tab_interaccion = st.tabs(["Más seguidores", "Más activos", "Más interacción"])
+
+        with tab_seguidores:
+            top_users_display = agregados["top_usuarios"]
+            if not top_users_display.empty:
+                st.dataframe(top_users_display, use_container_width=True, hide_index=True, column_config=columnas_usuarios)
+            else:
+                st.info("No hay datos de seguidores disponibles para mostrar el top 10 de usuarios.")
 
+        for tab, clave, columna in [(tab_activos, "top_activos", "tweets"), (tab_interaccion, "top_interaccion", "interacciones")]:
+            with tab:
+                top = agregados.get(clave)
+                if top is None or top.empty:
+                    st.info("No hay datos de autores disponibles para mostrar este ranking.")
+                    continue
+                st.dataframe(top.drop(columns="error"), use_container_width=True, hide_index=True,
+                             column_config=columnas_usuarios)
+                if top["error"].any():
+                    # Space-Saving (ver `rankings.py`): el conteo puede exceder al real en `error`
+                    st.caption(f"Valores aproximados: cada uno puede superar al real en hasta {int(top['error'].max()):,} {columna}.")
+        # --- FIN TOP 10 Usuarios por Seguidores ---
+
+    def mostrar_distribucion(counts, fig_distribucion):
+        st.subheader("📊 Distribución de Sentimientos")
+
+        # --- Resumen de Porcentajes ---
+        st.markdown("### Resumen Rápido")
+        summary_df = counts[['Sentimiento', 'Porcentaje']].copy()
+        summary_df['Porcentaje'] = summary_df['Porcentaje'].round(2).astype(str) + '%'
+        st.dataframe(summary_df, hide_index=True, use_container_width=True)
+
+        st.plotly_chart(fig_distribucion, use_container_width=True)
+
+    def mostrar_evolucion(agregados):
+        if agregados["fig_timeline"] is not None:
+            # --- MÉTRICA: Evolución temporal de tweets ---
+            st.markdown("---")
+            st.subheader("📈 Evolución de Tweets en el Tiempo")
+            figuras = {"Total": agregados["fig_timeline"]}
+            if agregados.get("fig_sentimientos_tiempo") is not None:
+                figuras["Por sentimiento"] = agregados["fig_sentimientos_tiempo"]
+            if agregados.get("fig_terminos_tiempo") is not None:
+                figuras["Por término"] = agregados["fig_terminos_tiempo"]
+            for pestana, figura in zip(st.tabs(list(figuras)), figuras.values()):
+                with pestana:
+                    st.plotly_chart(figura, use_container_width=True)
+
+    def mostrar_chat(resultado, clave_resultado):
+        """
+        "💬 Chatbot de Datos": preguntas sobre los tweets del resultado (ver
+        `chat.py`). El índice se arma una vez por resultado y queda en la
+        sesión; el historial de la conversación también es por resultado.
+        """
+        df = resultado["df"]
+        st.markdown("---")
+        st.subheader("💬 Chatbot de Datos")
+        if not model:
+            st.info("Configura tu API Key de Gemini para chatear con los datos.")
+            return
 
-            # --- Clasificación de Sentimientos (en lotes) ---
-            st.subheader("🧠 Clasificando Sentimientos...")
+        indice_sesion = st.session_state.get("indice_chat")
+        if indice_sesion is None or indice_sesion[0] != clave_resultado:
+            with st.spinner(f"Indexando {len(df):,} tweets para el chat..."):
+                st.session_state["indice_chat"] = (clave_resultado, IndiceTweets(df))
+        indice = st.session_state["indice_chat"][1]
+        historial = st.session_state.setdefault(f"chat_{clave_resultado}", [])
+
+        with st.expander("Filtros del chat"):
+            col_sentimiento, col_termino = st.columns(2)
+            sentimientos = col_sentimiento.multiselect("Sentimiento", SENTIMIENTOS, key=f"chat_sentimientos_{clave_resultado}")
+            terminos = col_termino.multiselect("Término de búsqueda", indice.terminos, key=f"chat_terminos_{clave_resultado}")
+            col_usuarios, col_fechas = st.columns(2)
+            usuarios = col_usuarios.text_input(
+                "Usuarios", placeholder="@usuario1, usuario2", key=f"chat_usuarios_{clave_resultado}"
+            )
+            fechas = col_fechas.date_input(
+                "Fechas", value=(), key=f"chat_fechas_{clave_resultado}",
+                help="Deja vacío para usar todo el período."
+            )
+        filtros = {
+            "sentimientos": sentimientos,
+            "terminos": terminos,
+            "usuarios": [u for u in usuarios.split(",") if u.strip()],
+            "desde": fechas[0] if len(fechas) > 0 else None,
+            "hasta": fechas[-1] if len(fechas) > 0 else None,
+        }
+        st.caption(f"Cada pregunta envía a Gemini los números del conjunto filtrado y hasta {MAX_TWEETS_CHAT} tweets relevantes.")
+
+        with st.container():
+            for turno in historial:
+                with st.chat_message(turno["role"]):
+                    st.markdown(turno["content"])
+                    if turno.get("tweets") is not None and not turno["tweets"].empty:
+                        with st.expander(f"Tweets consultados ({len(turno['tweets'])})"):
+                            st.dataframe(turno["tweets"], hide_index=True, use_container_width=True)
+
+            pregunta = st.chat_input("Pregunta algo sobre los tweets recolectados", key=f"chat_input_{clave_resultado}")
+            if pregunta:
+                with st.chat_message("user"):
+                    st.markdown(pregunta)
+                with st.chat_message("assistant"):
+                    with st.spinner("Buscando tweets relevantes y consultando a Gemini..."):
+                        try:
+                            respuesta = responder(
+                                indice, pregunta,
+                                ClienteLLM(model, limitador=limitador_llm(int(rpm)), circuito=get_circuito_llm()),
+                                contexto=resultado["parametros"]["contexto"],
+                                historial=[{"role": t["role"], "content": t["content"]} for t in historial],
+                                **filtros,
+                            )
+                        except Exception as e:
+                            st.error(f"Error al consultar a Gemini: {e}")
+                            return
+                    st.markdown(respuesta["respuesta"])
+                columnas = [c for c in ['createdAt', 'author/userName', 'sentimiento', 'viewCount', 'text'] if c in respuesta["tweets"].columns]
+                historial.append({"role": "user", "content": pregunta})
+                historial.append({"role": "assistant", "content": respuesta["respuesta"], "tweets": respuesta["tweets"][columnas]})
+                st.rerun()
+
+    def mostrar_resultados(resultado, clave_resultado):
+        """
+        Dashboard de un trabajo terminado. Las tablas y figuras salen de
+        `agregados_dashboard`, memoizado por `clave_resultado`.
+        """
+        df = resultado["df"]
 
-            # Definir el tamaño del lote
-            batch_size = 50  # Puedes ajustar este valor. 
-                            # Un lote más grande puede ser más rápido, 
-                            # pero también aumenta el riesgo de errores si el prompt es muy largo.
-                            
-            tweets_to_classify = df['text'].astype(str).tolist()
-            total_tweets = len(tweets_to_classify)
+        dias_descargados = resultado["dias_descargados"]
+        if dias_descargados:
+            st.caption(
+                f"📦 Almacén local: se descargaron {sum(dias_descargados.values()):,} de {resultado['dias_totales']:,} días "
+                f"(sumando todos los términos); el resto se reutilizó de búsquedas anteriores."
+            )
 
-            sentimientos = []
-            progress_bar = st.progress(0)
+        grupos = resultado.get("grupos_busqueda") or []
+        if len(grupos) < len(resultado["parametros"]["terms"]):
+            st.caption(
+                f"🔗 {len(resultado['parametros']['terms'])} términos buscados en {len(grupos)} ejecuciones de Apify: "
+                + "; ".join(", ".join(grupo) for grupo in grupos)
+            )
 
-            # Iterar sobre los tweets en lotes
-            for i in range(0, total_tweets, batch_size):
-                batch = tweets_to_classify[i:i + batch_size]
-                
-                # Llamar a la nueva función de clasificación en lote
-                sentimientos_batch = clasificar_tweets_en_lote(batch, contexto, model)
-                sentimientos.extend(sentimientos_batch)
-                
-                # Actualizar la barra de progreso
-                progress_bar.progress(min((i + len(batch)) / total_tweets, 1.0))
+        for term, error in resultado["errores_scraping"].items():
+            st.error(f"Error al obtener datos de Twitter para '{term}': {error}. Asegúrate de que tu token de Apify sea válido y los términos de búsqueda sean apropiados.")
 
-            df["sentimiento"] = sentimientos
-            st.success("✅ Clasificación de sentimientos completada.")
-            progress_bar.empty()
+        if df.empty:
+            st.warning("😔 No se encontraron tweets con los términos y fechas seleccionados. Intenta con otros parámetros.")
+            return
 
-            # --- TEMAS CLAVE GENERALES (NUEVA SECCIÓN AQUÍ) ---
-            st.markdown("---")
-            st.subheader("💡 Temas Clave del Conjunto Total de Tweets")
+        st.success(f"✅ Se recolectaron {len(df)} tweets únicos.")
+        st.subheader("Primeros tweets encontrados:")
+        st.dataframe(df.head(10))
 
-            all_tweets_text = df['text'].astype(str).tolist()
-            if all_tweets_text:
-                with st.spinner("Extrayendo temas clave generales..."):
-                    temas_generales = extraer_temas_generales_con_ia(all_tweets_text, contexto)
-                mostrar_temas_con_contraste(temas_generales)
-            else:
-                st.warning("No hay tweets para extraer temas clave generales.")
-            # --- FIN TEMAS CLAVE GENERALES ---
-
-
-            # --- TOP 10 Tweets por ViewCount ---
-            st.subheader("🔥 Top 10 Tweets Más Vistos")
-
-            # Asegurarse de que 'viewCount' sea numérico y no nulo
-            df_sorted_by_views = df.dropna(subset=['viewCount']).sort_values(by='viewCount', ascending=False)
-
-            if not df_sorted_by_views.empty:
-                # Seleccionar todas las columnas del DataFrame original para los top 10 tweets
-                top_10_views = df_sorted_by_views.head(10)
-
-                # Formatear 'viewCount' para mejor lectura en la tabla si se muestran todas las columnas
-                top_10_views_display = top_10_views.copy()
-                if 'viewCount' in top_10_views_display.columns:
-                    top_10_views_display['viewCount'] = top_10_views_display['viewCount'].apply(lambda x: f"{int(x):,}" if pd.notna(x) else "N/A")
-
-                st.dataframe(top_10_views_display, use_container_width=True, hide_index=True,
-                            column_config={
-                                "author/profilePicture": st.column_config.ImageColumn("Foto de Perfil"), # Added profile picture
-                                "url": st.column_config.LinkColumn("URL del Tweet"),
-                                "viewCount": st.column_config.NumberColumn("Visualizaciones", format="%d"),
-                                "createdAt": st.column_config.DateColumn("Fecha de Creación", format="YYYY-MM-DD"),
-                                "author/userName": st.column_config.TextColumn("Usuario"),
-                                "author/followers": st.column_config.NumberColumn("Seguidores", format="%d"),
-                                "likeCount": st.column_config.NumberColumn("Likes", format="%d"),
-                                "replyCount": st.column_config.NumberColumn("Respuestas", format="%d"),
-                                "retweetCount": st.column_config.NumberColumn("Retweets", format="%d"),
-                                "quoteCount": st.column_config.NumberColumn("Citas", format="%d"),
-                                "bookmarkCount": st.column_config.NumberColumn("Guardados", format="%d"),
-                                "source": st.column_config.TextColumn("Fuente"),
-                                "text": st.column_config.TextColumn("Contenido del Tweet"),
-                            })
-            else:
-                st.info("No hay datos de visualizaciones disponibles para mostrar el top 10.")
-            # --- FIN TOP 10 Tweets por ViewCount ---
+        agregados = agregados_dashboard(
+            clave_resultado, df, (resultado["parametros"]["start_date"], resultado["parametros"]["end_date"]),
+            resultado.get("rankings"),
+        )
 
-            # --- TOP 10 Usuarios por Seguidores ---
-            st.markdown("---")
-            st.subheader("👑 Top 10 Usuarios con Más Seguidores")
-
-            # Asegurarse de que 'author/followers' y 'author/userName' no sean nulos
-            df_users_sorted = df.dropna(subset=['author/followers', 'author/userName'])
-
-            if not df_users_sorted.empty:
-                # Agrupar por usuario y obtener el máximo de seguidores y la primera foto de perfil encontrada
-                top_users = df_users_sorted.groupby('author/userName').agg(
-                    **{'author/followers': pd.NamedAgg(column='author/followers', aggfunc='max'),
-                       'author/profilePicture': pd.NamedAgg(column='author/profilePicture', aggfunc='first')}
-                ).reset_index()
-
-                top_users = top_users.sort_values(by='author/followers', ascending=False).head(10)
-
-                # Formatear 'author/followers' para mejor lectura
-                top_users_display = top_users.copy()
-                top_users_display['author/followers'] = top_users_display['author/followers'].apply(lambda x: f"{int(x):,}")
-
-                st.dataframe(top_users_display, use_container_width=True, hide_index=True,
-                            column_config={
-                                "author/profilePicture": st.column_config.ImageColumn("Foto de Perfil"), # Added profile picture
-                                "author/userName": st.column_config.TextColumn("Usuario"),
-                                "author/followers": st.column_config.NumberColumn("Seguidores", format="%d")
-                            })
-            else:
-                st.info("No hay datos de seguidores disponibles para mostrar el top 10 de usuarios.")
-            # --- FIN TOP 10 Usuarios por Seguidores ---
-
-            st.subheader("📊 Distribución de Sentimientos")
-            counts = df['sentimiento'].value_counts().reset_index()
-            counts.columns = ['Sentimiento', 'Cantidad']
-
-            # Calcular porcentajes
-            counts['Porcentaje'] = counts['Cantidad'] / counts['Cantidad'].sum() * 100
-
-            # --- Resumen de Porcentajes ---
-            st.markdown("### Resumen Rápido")
-            summary_df = counts[['Sentimiento', 'Porcentaje']].copy()
-            summary_df['Porcentaje'] = summary_df['Porcentaje'].round(2).astype(str) + '%'
-            st.dataframe(summary_df, hide_index=True, use_container_width=True)
-
-            # Gráfico de torta con Plotly
-            fig = px.pie(
-                counts,
-                values='Cantidad',
-                names='Sentimiento',
-                title='Distribución de Sentimientos de los Tweets',
-                hover_data=['Porcentaje'],
-                labels={'Porcentaje': 'Porcentaje (%)'},
-                color='Sentimiento',
-                color_discrete_map={
-                    'POSITIVO': '#4CAF50', # Green
-                    'NEGATIVO': '#F44336', # Red
-                    'NEUTRO': '#9E9E9E'     # Grey
-                }
+        mostrar_alcance(agregados)
+
+        # --- Clasificación de Sentimientos ---
+        st.subheader("🧠 Clasificación de Sentimientos")
+        for aviso in resultado["avisos"]:
+            st.warning(aviso)
+
+        estadisticas_clasificacion = resultado["estadisticas"]
+        textos_unicos = estadisticas_clasificacion["textos_unicos"]
+        repetidos = len(df) - textos_unicos
+        if repetidos > 0:
+            llamadas_ahorradas = round(repetidos / (resultado["tweets_por_lote"] or 1))
+            st.caption(
+                f"🧬 Duplicados: {len(df):,} tweets agrupados en {textos_unicos:,} textos únicos · "
+                f"{repetidos:,} tweets repetidos no se enviaron a Gemini (≈{llamadas_ahorradas:,} llamadas ahorradas)."
             )
 
-            fig.update_traces(textposition='inside', textinfo='percent+label', marker=dict(line=dict(color='#000000', width=1)))
-            fig.update_layout(
-                margin=dict(t=40, b=0, l=0, r=0),
-                legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="right", x=1)
+        if resultado["parametros"]["usar_cache"] and textos_unicos:
+            aciertos = estadisticas_clasificacion["aciertos_cache"]
+            st.caption(
+                f"♻️ Caché de sentimientos: {aciertos:,} de {textos_unicos:,} textos únicos "
+                f"({aciertos / textos_unicos:.0%}) sin consultar a Gemini · "
+                f"{estadisticas_clasificacion['llamadas_llm']:,} llamadas a la API."
             )
-            st.plotly_chart(fig, use_container_width=True)
 
+        resueltos_localmente = estadisticas_clasificacion.get("resueltos_localmente", 0)
+        if resultado["parametros"].get("prefiltro_local") and textos_unicos:
+            reporte = resultado.get("prefiltro")
+            concordancia = ""
+            if reporte and reporte["acierto_cubiertos"] is not None:
+                concordancia = (
+                    f" Concordancia con Gemini ({reporte['modelo']}, {reporte['ejemplos_prueba']:,} ejemplos reservados): "
+                    f"{reporte['acierto_cubiertos']:.0%} con cobertura de {reporte['cobertura']:.0%}."
+                )
+            st.caption(
+                f"🏷️ Prefiltro local: {resueltos_localmente:,} de {textos_unicos:,} textos únicos "
+                f"({resueltos_localmente / textos_unicos:.0%}) clasificados sin Gemini.{concordancia}"
+            )
 
-            # --- Temas principales por sentimiento ---
-            st.subheader("🔍 Temas Principales por Sentimiento")
+        estadisticas_llm = resultado["llm"]
+        if estadisticas_llm.get("reintentos"):
+            st.caption(
+                f"🔁 Gemini: {estadisticas_llm['reintentos']:,} reintentos "
+                f"({estadisticas_llm['errores_cuota']:,} por límite de cuota)."
+            )
 
-            # Usar st.expander para organizar los temas
-            for tipo in ["POSITIVO", "NEGATIVO", "NEUTRO"]:
-                subset = df[df["sentimiento"] == tipo]["text"].astype(str).tolist()
-                if subset:
-                    with st.expander(f"Mostrar temas **{tipo}** ({len(subset)} tweets)"):
-                        with st.spinner(f"Extrayendo temas {tipo}..."):
-                            resumen = extraer_temas_con_ia(subset, tipo, contexto)
-                        mostrar_temas_con_contraste(resumen)
-                else:
-                    st.info(f"No hay tweets clasificados como **{tipo}** para analizar temas.")
-
-            if 'createdAt' in df.columns:
-                df['createdAt'] = pd.to_datetime(df['createdAt'], errors='coerce')
-                df = df.dropna(subset=['createdAt'])
-
-                # Calcular el rango de fechas
-                min_date = df['createdAt'].min().date()
-                max_date = df['createdAt'].max().date()
-                date_range_days = (max_date - min_date).days
-
-                # Determinar frecuencia
-                if date_range_days <= 3:
-                    df['time_bucket'] = df['createdAt'].dt.strftime('%H:00')  # por hora
-                    xaxis_label = 'Hora'
-                elif date_range_days <= 150:
-                    df['time_bucket'] = df['createdAt'].dt.strftime('%Y-%m-%d')  # por día
-                    xaxis_label = 'Fecha'
-                else:
-                    df['time_bucket'] = df['createdAt'].dt.to_period('M').astype(str)  # por mes
-                    xaxis_label = 'Mes'
-
-                # --- MÉTRICA: Evolución temporal de tweets ---
-                st.markdown("---")
-                st.subheader("📈 Evolución de Tweets en el Tiempo")
-
-                tweet_count_timeline = df.groupby('time_bucket').size().reset_index(name='Cantidad de Tweets')
-
-                fig_timeline = px.line(
-                    tweet_count_timeline,
-                    x='time_bucket',
-                    y='Cantidad de Tweets',
-                    title='Cantidad de Tweets por ' + xaxis_label,
-                    markers=True,
-                    line_shape='spline'
+        if resultado["resumen_lotes"]:
+            with st.expander("📏 Tamaño de los lotes de clasificación"):
+                st.caption(
+                    f"Presupuesto final: {resultado['presupuesto_lotes']:,} tokens por lote. "
+                    "Latencia y fallos por tamaño de lote, para ajustar el valor inicial."
+                )
+                st.dataframe(pd.DataFrame(resultado["resumen_lotes"]), hide_index=True, use_container_width=True)
+
+        # Resultados guardados antes de que existiera la instrumentación no lo traen
+        diagnostico = resultado.get("diagnostico")
+        if diagnostico:
+            with st.expander("🩺 Diagnóstico de la ejecución"):
+                st.caption(
+                    f"🪙 Tokens de Gemini: {estadisticas_llm.get('tokens_entrada', 0):,} de entrada · "
+                    f"{estadisticas_llm.get('tokens_salida', 0):,} de salida · "
+                    f"{estadisticas_llm.get('llamadas', 0):,} llamadas · {estadisticas_llm.get('reintentos', 0):,} reintentos. "
+                    "Las búsquedas servidas desde la caché de Streamlit no miden la descarga de Apify."
                 )
-                fig_timeline.update_layout(
-                    xaxis_title=xaxis_label,
-                    yaxis_title='Número de Tweets',
-                    margin=dict(t=40, b=0, l=0, r=0),
-                    yaxis_range=[0, None]
+                st.dataframe(pd.DataFrame(diagnostico["etapas"]), hide_index=True, use_container_width=True)
+                if diagnostico["contadores"]:
+                    st.dataframe(pd.DataFrame(diagnostico["contadores"]), hide_index=True, use_container_width=True)
+                st.download_button(
+                    label="Descargar métricas (OpenMetrics)",
+                    data=a_openmetrics(diagnostico).encode("utf-8"),
+                    file_name=f"metricas_{clave_resultado.split(':')[-1]}.txt",
+                    mime="text/plain",
                 )
-                st.plotly_chart(fig_timeline, use_container_width=True)
 
+        def mostrar_temas(nombre):
+            if nombre in resultado["errores_temas"]:
+                if nombre == "GENERAL":
+                    st.error(f"Error al extraer temas generales con IA: {resultado['errores_temas'][nombre]}")
+                    mostrar_temas_con_contraste("No se pudieron extraer temas generales.")
+                else:
+                    st.error(f"Error al extraer temas con IA: {resultado['errores_temas'][nombre]}")
+                    mostrar_temas_con_contraste("No se pudieron extraer temas.")
+            else:
+                mostrar_temas_con_contraste(resultado["temas"].get(nombre))
+
+        # --- TEMAS CLAVE GENERALES ---
+        st.markdown("---")
+        st.subheader("💡 Temas Clave del Conjunto Total de Tweets")
+        mostrar_temas("GENERAL")
+        # --- FIN TEMAS CLAVE GENERALES ---
 
-            # # --- Descarga ---
-            # st.markdown("---")
-            # st.subheader("⬇️ Descargar Resultados")
-            # st.download_button(
-            #     label="Descargar resultados completos (CSV)",
-            #     data=df.to_csv(index=False).encode('utf-8'),
-            #     file_name="tweets_analizados.csv",
-            #     mime="text/csv",
-            #     help="Descarga un archivo CSV con todos los tweets recolectados y su clasificación de sentimiento."
-            # )
 
+        mostrar_rankings(agregados)
+
+        counts = agregados["distribucion"]
+        mostrar_distribucion(counts, agregados["fig_distribucion"])
+
+
+        # --- Temas principales por sentimiento ---
+        st.subheader("🔍 Temas Principales por Sentimiento")
+
+        # Usar st.expander para organizar los temas
+        cantidades = dict(zip(counts['Sentimiento'], counts['Cantidad']))
+        for tipo in ["POSITIVO", "NEGATIVO", "NEUTRO"]:
+            cantidad = int(cantidades.get(tipo, 0))
+            if cantidad:
+                with st.expander(f"Mostrar temas **{tipo}** ({cantidad} tweets)"):
+                    mostrar_temas(tipo)
+            else:
+                st.info(f"No hay tweets clasificados como **{tipo}** para analizar temas.")
+
+        mostrar_evolucion(agregados)
+
+        mostrar_chat(resultado, clave_resultado)
+
+        # --- Descarga ---
+        # El archivo se escribe por bloques en disco una sola vez por resultado y formato
+        # (ver `exportacion.py`) y el botón lo lee de ahí, sin armar el CSV en memoria en cada rerun.
+        st.markdown("---")
+        st.subheader("⬇️ Descargar Resultados")
+        formato = st.radio(
+            "Formato",
+            list(ETIQUETAS_EXPORTACION),
+            format_func=ETIQUETAS_EXPORTACION.get,
+            horizontal=True,
+            key=f"formato_{clave_resultado}",
+        )
+        directorio_exportaciones = os.path.join(DATA_DIR, "exportaciones")
+        clave_archivo = clave_resultado.replace(":", "_")
+        ruta = ruta_exportacion(directorio_exportaciones, clave_archivo, formato)
+        if not os.path.exists(ruta) and st.button("Preparar archivo", key=f"exportar_{clave_resultado}"):
+            with st.spinner("Escribiendo el archivo..."):
+                exportar_memoizado(resultado, directorio_exportaciones, clave_archivo, formato)
+        if os.path.exists(ruta):
+            with open(ruta, "rb") as archivo:
+                st.download_button(
+                    label=f"Descargar {ETIQUETAS_EXPORTACION[formato]} ({os.path.getsize(ruta) / 1e6:.1f} MB)",
+                    data=archivo,
+                    file_name=f"analisis_{clave_archivo}{FORMATOS[formato][0]}",
+                    mime=FORMATOS[formato][1],
+                    help="Todos los tweets recolectados con su sentimiento. El Parquet incluye además los temas y los datos de la ejecución; el JSON sólo los temas y los datos de la ejecución."
+                )
+
+    @st.fragment(run_every=2)
+    def seguir_trabajo(trabajo_id):
+        """
+        Avance de un trabajo en curso y lo que ya publicó (ver `on_parcial` en
+        `pipeline.ejecutar_analisis`): alcance, rankings y evolución apenas
+        termina el scraping, la distribución de sentimientos a medida que se
+        clasifican los lotes y los temas generales cuando están. Al terminar,
+        vuelve a ejecutar la página para mostrar el resultado completo.
+        """
+        trabajo = cola.estado(trabajo_id)
+        if trabajo["estado"] in ESTADOS_FINALES:
+            st.rerun()
+        etapa = trabajo["etapa"]
+        inicio_etapa, peso_etapa = PESO_ETAPAS.get(etapa, (0.0, 0.0))
+        st.info(f"⏳ Trabajo `{trabajo_id}` ({ETIQUETAS_ESTADO[trabajo['estado']]}): {trabajo['mensaje'] or 'en cola...'}")
+        st.progress(min(inicio_etapa + peso_etapa * trabajo["progreso"], 1.0))
+        st.caption("Puedes seguir usando la página o cerrarla: el análisis continúa en el servidor. Vuelve con el enlace de esta página.")
+
+        parcial = cola.parcial(trabajo_id)
+        tweets = parcial.get("tweets")
+        if not tweets or tweets["df"].empty:
+            return
+        df = tweets["df"]
+        st.success(f"✅ Se recolectaron {len(df)} tweets únicos. Clasificando sentimientos y extrayendo temas...")
+        # El DataFrame publicado no cambia mientras el trabajo sigue, así que se agrega una sola vez
+        agregados = agregados_dashboard(
+            f"parcial:{trabajo_id}", df, (trabajo["parametros"]["start_date"], trabajo["parametros"]["end_date"]),
+            tweets.get("rankings"),
+        )
+        mostrar_alcance(agregados)
+
+        conteo = parcial.get("sentimientos")
+        if conteo and sum(conteo.values()):
+            clasificados = sum(conteo.values())
+            counts = tabla_distribucion(conteo)
+            st.caption(f"🧠 Distribución parcial: {clasificados:,} de {len(df):,} tweets clasificados.")
+            mostrar_distribucion(counts, figura_sentimientos(counts))
+
+        temas = parcial.get("temas", {}).get("temas", {})
+        if "GENERAL" in temas:
             st.markdown("---")
-            st.info("✨ Aplicación creada con Streamlit, Apify y Google Gemini.")
+            st.subheader("💡 Temas Clave del Conjunto Total de Tweets")
+            mostrar_temas_con_contraste(temas["GENERAL"])
+
+        mostrar_rankings(agregados)
+        mostrar_evolucion(agregados)
+
+    # --- Contenido principal ---
+    st.markdown("---") # Separador visual
+
+    if st.button("🚀 Ejecutar Scraping y Análisis", use_container_width=True):
+        if not apify_token:
+            st.error("Por favor, ingresa tu token de Apify en `.streamlit/secrets.toml` para continuar.")
+            st.stop()
+        # Check if the user has provided a Gemini API key
+        if not gemini_api_key:
+            st.error("Por favor, ingresa tu API Key de Gemini en `.streamlit/secrets.toml` para el análisis de sentimiento y temas.")
+            st.stop()
+
+        # Dividir por salto de línea o coma, limpiar espacios y eliminar duplicados
+        terms = parsear_terminos(search_terms_input)
+        if not terms:
+            st.warning("Por favor, introduce al menos un término de búsqueda.")
+            st.stop()
+
+        parametros = {
+            "terms": terms,
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "end_date": end_date.strftime("%Y-%m-%d"),
+            "contexto": contexto,
+            "usar_almacen": usar_almacen,
+            "fusionar_terminos": fusionar_terminos,
+            "max_scrapers": int(max_scrapers),
+            "max_workers": int(max_workers),
+            "tokens_por_lote": int(tokens_por_lote),
+            "rpm": int(rpm),
+            "casi_duplicados": casi_duplicados,
+            "umbral_duplicados": umbral_duplicados,
+            "presupuesto_temas": int(presupuesto_temas),
+            "temas_completos": temas_completos,
+            "usar_cache": usar_cache,
+            "prefiltro_local": prefiltro_local,
+            "umbral_prefiltro": umbral_prefiltro,
+            "modelo": nombre_modelo(model),
+        }
+        huella = huella_ejecucion(parametros)
+
+        # Los recursos compartidos se resuelven aquí, en el hilo de la página, y no en el del trabajo.
+        # Todas las llamadas a Gemini (clasificación y temas) pasan por el mismo cliente,
+        # con reintentos, límite de peticiones y cortocircuito compartidos.
+        limitador, circuito = limitador_llm(int(rpm)), get_circuito_llm()
+        cache, almacen, cache_temas = get_cache_sentimientos(), get_almacen_tweets(), get_cache_temas()
+
+        def ejecutar_trabajo(parametros, on_progreso, on_parcial):
+            cliente_llm = ClienteLLM(model, limitador=limitador, circuito=circuito)
+            return ejecutar_analisis(
+                parametros,
+                lambda terminos, inicio, fin, orden, on_chunk, metricas: get_twitter_data(
+                    terminos, inicio, fin, orden, _on_chunk=on_chunk, _metricas=metricas
+                ),
+                cliente_llm, cache=cache, almacen=almacen, on_progreso=on_progreso, on_parcial=on_parcial,
+                cache_temas=cache_temas,
+            )
+
+        # Con la misma huella (términos, fechas, contexto, modelo) se reutiliza el trabajo
+        # anterior, terminado o en curso, sin volver a scrapear ni a consultar a Gemini
+        trabajo_id = None
+        if reutilizar_resultados:
+            vigencia = VIGENCIA_RESULTADOS if end_date >= date.today() else None
+            trabajo_id = cola.buscar(huella, max_edad=vigencia)
+            if trabajo_id:
+                st.toast(f"♻️ Se reutiliza el análisis `{trabajo_id}` con los mismos parámetros.")
+        if not trabajo_id:
+            trabajo_id = cola.enviar(ejecutar_trabajo, parametros, usuario=id_sesion(), huella=huella)
+        st.session_state["trabajo_id"] = trabajo_id
+        st.query_params["trabajo"] = trabajo_id
+
+    # El trabajo que se muestra sale del enlace (?trabajo=ID), así sobrevive a un refresco
+    trabajo_id = st.query_params.get("trabajo") or st.session_state.get("trabajo_id")
+    if trabajo_id:
+        trabajo = cola.estado(trabajo_id)
+        if trabajo is None:
+            st.warning(f"No se encontró el trabajo `{trabajo_id}`.")
+        elif trabajo["estado"] in (EN_COLA, EN_CURSO):
+            seguir_trabajo(trabajo_id)
+        elif trabajo["estado"] == FALLIDO:
+            st.error(f"El trabajo `{trabajo_id}` falló: {trabajo['error']}")
+        elif trabajo["estado"] == INTERRUMPIDO:
+            st.warning(f"El trabajo `{trabajo_id}` se interrumpió porque se reinició el servidor. Vuelve a ejecutarlo.")
+        else:
+            resultado = cargar_resultado(trabajo_id)
+            if resultado is None:
+                st.warning(f"El resultado del trabajo `{trabajo_id}` ya no está disponible.")
+            else:
+                st.caption(
+                    f"Trabajo `{trabajo_id}` · {', '.join(trabajo['parametros']['terms'])} · "
+                    f"{trabajo['parametros']['start_date']} a {trabajo['parametros']['end_date']}"
+                )
+                mostrar_resultados(resultado, f"{trabajo['huella']}:{trabajo_id}")
+
+    st.markdown("---")
+    st.info("✨ Aplicación creada con Streamlit, Apify y Google Gemini.")
 
 
 # --- Entry point ---
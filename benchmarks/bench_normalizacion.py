@@ -0,0 +1,109 @@
+# benchmarks/bench_normalizacion.py
+
+"""
+Micro-benchmark de la normalización de items de Apify.
+
+Compara el aplanado anterior (DataFrame de dicts anidados + tres `apply` sobre
+`author` + `pd.to_numeric` a posteriori) con `esquema.aplanar_items`, sobre
+payloads sintéticos de 10k y 100k items con objetos de tweet "anchos".
+
+Uso (desde la raíz del repositorio):
+
+    python benchmarks/bench_normalizacion.py [--tamanos 10000 100000] [--repeticiones 3]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from esquema import COLUMNAS, aplanar_items  # noqa: E402
+
+
+FUENTES = ["Twitter for iPhone", "Twitter for Android", "Twitter Web App", "TweetDeck"]
+
+
+def generar_items(n, semilla=0):
+    """Items con la forma aproximada de la salida de apidojo/twitter-scraper-lite."""
+    rng = random.Random(semilla)
+    items = []
+    for i in range(n):
+        items.append({
+            "type": "tweet",
+            "id": str(10**18 + i),
+            "url": f"https://x.com/usuario{i % 5000}/status/{10**18 + i}",
+            "twitterUrl": f"https://twitter.com/usuario{i % 5000}/status/{10**18 + i}",
+            "text": f"Tweet sintético número {i} sobre el tema {rng.randint(0, 200)} " + "palabra " * rng.randint(0, 30),
+            "fullText": None,
+            "source": rng.choice(FUENTES),
+            "retweetCount": rng.randint(0, 5000),
+            "replyCount": rng.randint(0, 500),
+            "likeCount": rng.randint(0, 50000),
+            "quoteCount": rng.randint(0, 100),
+            "viewCount": rng.randint(0, 10**7),
+            "bookmarkCount": rng.randint(0, 300),
+            "createdAt": time.strftime("%a %b %d %H:%M:%S +0000 %Y", time.gmtime(1_700_000_000 + i * 37)),
+            "lang": "es",
+            "isReply": False,
+            "isRetweet": False,
+            "isQuote": False,
+            "entities": {"hashtags": [{"text": "tema"}], "urls": [], "user_mentions": []},
+            "author": {
+                "type": "user",
+                "userName": f"usuario{i % 5000}",
+                "name": f"Usuario {i % 5000}",
+                "id": str(i % 5000),
+                "followers": rng.randint(0, 10**6),
+                "following": rng.randint(0, 5000),
+                "profilePicture": f"https://pbs.twimg.com/profile_images/{i % 5000}/foto.jpg",
+                "description": "Descripción del perfil " * 3,
+                "isVerified": False,
+                "location": "Buenos Aires",
+            },
+        })
+    return items
+
+
+def aplanar_anterior(items):
+    """Implementación previa de get_twitter_data, para comparar."""
+    df = pd.DataFrame(items)
+    df['author/profilePicture'] = df['author'].apply(lambda x: x.get('profilePicture') if isinstance(x, dict) else None)
+    df['author/followers'] = df['author'].apply(lambda x: x.get('followers') if isinstance(x, dict) else None)
+    df['author/userName'] = df['author'].apply(lambda x: x.get('userName') if isinstance(x, dict) else None)
+    df['viewCount'] = pd.to_numeric(df['viewCount'], errors='coerce').fillna(0)
+    df['author/followers'] = pd.to_numeric(df['author/followers'], errors='coerce').fillna(0)
+    df = df[[col for col in COLUMNAS if col in df.columns]].copy()
+    df['createdAt'] = pd.to_datetime(df['createdAt'], errors='coerce', format='mixed')
+    return df
+
+
+def medir(funcion, items, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        df = funcion(items)
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), df.memory_usage(deep=True).sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'items':>8} {'implementación':<16} {'tiempo (s)':>11} {'memoria (MB)':>13}")
+    for n in args.tamanos:
+        items = generar_items(n)
+        for nombre, funcion in [("anterior", aplanar_anterior), ("aplanar_items", aplanar_items)]:
+            tiempo, memoria = medir(funcion, items, args.repeticiones)
+            print(f"{n:>8} {nombre:<16} {tiempo:>11.3f} {memoria / 1e6:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# benchmarks/bench_pipeline.py
+
+"""
+Benchmark del pipeline completo sin red, con Apify y Gemini falsos (ver
+`falsos.py`).
+
+Para cada tamaño de corpus (1k, 10k y 100k tweets por defecto) mide, por
+etapa (scraping, clasificación, temas y agregaciones del dashboard), el
+tiempo de reloj, las llamadas a Gemini, los tokens de entrada y salida y el
+pico de memoria (tracemalloc, que hace todo más lento; `--sin-memoria` lo
+desactiva para medir sólo tiempos).
+
+Uso (desde la raíz del repositorio):
+
+    python benchmarks/bench_pipeline.py [--tamanos 1000 10000 100000] [--latencia-llm 0.05]
+        [--tasa-fallos 0.02] [--tasa-malformados 0.05] [--json resultados.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clasificacion import ClasificadorIncremental  # noqa: E402
+from esquema import aplicar_esquema  # noqa: E402
+from falsos import ApifyFalso, GeminiFalso  # noqa: E402
+from llm import ClienteLLM  # noqa: E402
+from pipeline import COLUMNAS_MUESTREO  # noqa: E402
+from rankings import RankingsTweets  # noqa: E402
+from resultados import distribucion_sentimientos, metricas_alcance  # noqa: E402
+from rollup import rollup  # noqa: E402
+from scraping import obtener_tweets, scrapear_en_paralelo  # noqa: E402
+from temas import extraer_temas_completos, extraer_temas_de_muestra  # noqa: E402
+
+
+TERMINOS = ["termino a", "termino b", "termino c", "termino d"]
+
+
+def medir_etapa(nombre, funcion, gemini, memoria=True):
+    """Ejecuta `funcion()` y devuelve `(resultado, fila)` con las métricas de la etapa."""
+    antes = dict(gemini.estadisticas)
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcion()
+    tiempo = time.perf_counter() - inicio
+    pico = None
+    if memoria:
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    despues = gemini.estadisticas
+    fila = {
+        "etapa": nombre,
+        "tiempo_s": round(tiempo, 3),
+        "llamadas_llm": despues["llamadas"] - antes["llamadas"],
+        "tokens_entrada": despues["tokens_entrada"] - antes["tokens_entrada"],
+        "tokens_salida": despues["tokens_salida"] - antes["tokens_salida"],
+        "pico_memoria_mb": round(pico / 1e6, 1) if pico is not None else None,
+    }
+    return resultado, fila
+
+
+def ejecutar(n, args):
+    """Corre las cuatro etapas sobre un corpus de `n` tweets y devuelve una fila por etapa."""
+    apify = ApifyFalso(
+        items_por_termino=-(-n // len(TERMINOS)), repetidos=args.repetidos,
+        latencia_ejecucion=args.latencia_apify, latencia_pagina=args.latencia_pagina,
+    )
+    gemini = GeminiFalso(
+        latencia=args.latencia_llm, latencia_por_1k_tokens=args.latencia_por_1k_tokens,
+        tasa_fallos=args.tasa_fallos, tasa_malformados=args.tasa_malformados,
+    )
+    cliente = ClienteLLM(gemini, espera_base=0.01, espera_maxima=0.1)
+    apify.preparar(TERMINOS)
+    filas = []
+
+    def scraping():
+        resultados, _ = scrapear_en_paralelo(
+            lambda term: obtener_tweets(apify, [term], "2023-11-14", "2024-01-01", "Top", max_items=n),
+            TERMINOS, max_workers=4,
+        )
+        return aplicar_esquema(pd.concat(resultados.values(), ignore_index=True))
+
+    df, fila = medir_etapa("scraping", scraping, gemini, args.memoria)
+    filas.append(fila)
+
+    def clasificacion():
+        clasificador = ClasificadorIncremental("Benchmark", cliente, max_workers=args.max_workers)
+        return clasificador.finalizar(df['text'].astype(str).tolist())
+
+    df["sentimiento"], fila = medir_etapa("clasificacion", clasificacion, gemini, args.memoria)
+    filas.append(fila)
+
+    def temas():
+        muestra = df[[c for c in COLUMNAS_MUESTREO if c in df.columns]]
+        if args.temas_muestra:
+            extraer = lambda datos, **kwargs: extraer_temas_de_muestra(datos, "Benchmark", cliente, **kwargs)
+        else:
+            extraer = lambda datos, **kwargs: extraer_temas_completos(
+                datos, "Benchmark", cliente, max_workers=args.max_workers, **kwargs
+            )
+        textos = [extraer(muestra)]
+        for tipo in ["POSITIVO", "NEGATIVO", "NEUTRO"]:
+            textos.append(extraer(muestra[df["sentimiento"] == tipo], sentimiento=tipo))
+        return textos
+
+    _, fila = medir_etapa("temas", temas, gemini, args.memoria)
+    filas.append(fila)
+
+    def agregaciones():
+        rankings = RankingsTweets.desde_df(df)
+        return (metricas_alcance(df), rankings.tablas(), distribucion_sentimientos(df), rollup(df))
+
+    _, fila = medir_etapa("agregaciones", agregaciones, gemini, args.memoria)
+    filas.append(fila)
+
+    for fila in filas:
+        fila["tweets"] = n
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repetidos", type=float, default=0.3, help="Fracción de textos repetidos en el corpus.")
+    parser.add_argument("--latencia-apify", type=float, default=0.0, help="Segundos por ejecución del actor.")
+    parser.add_argument("--latencia-pagina", type=float, default=0.0, help="Segundos por página del dataset.")
+    parser.add_argument("--latencia-llm", type=float, default=0.0, help="Segundos por llamada a Gemini.")
+    parser.add_argument("--latencia-por-1k-tokens", type=float, default=0.0)
+    parser.add_argument("--tasa-fallos", type=float, default=0.0, help="Probabilidad de error 429/503 por llamada.")
+    parser.add_argument("--tasa-malformados", type=float, default=0.0, help="Probabilidad de respuesta defectuosa.")
+    parser.add_argument("--max-workers", type=int, default=4, help="Lotes de clasificación (y fragmentos de temas) en paralelo.")
+    parser.add_argument("--temas-muestra", action="store_true", help="Temas de una muestra en lugar de map-reduce.")
+    parser.add_argument("--sin-memoria", dest="memoria", action="store_false", help="No medir el pico de memoria.")
+    parser.add_argument("--json", help="Guardar también las filas en este archivo JSON.")
+    args = parser.parse_args()
+
+    print(f"{'tweets':>8} {'etapa':<14} {'tiempo (s)':>11} {'llamadas':>9} {'tokens ent.':>12} {'tokens sal.':>12} {'memoria (MB)':>13}")
+    todas = []
+    for n in args.tamanos:
+        for fila in ejecutar(n, args):
+            todas.append(fila)
+            memoria = f"{fila['pico_memoria_mb']:>13.1f}" if fila["pico_memoria_mb"] is not None else f"{'-':>13}"
+            print(f"{n:>8} {fila['etapa']:<14} {fila['tiempo_s']:>11.3f} {fila['llamadas_llm']:>9} "
+                  f"{fila['tokens_entrada']:>12,} {fila['tokens_salida']:>12,} {memoria}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(todas, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
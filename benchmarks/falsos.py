@@ -0,0 +1,240 @@
+# benchmarks/falsos.py
+
+"""
+Dobles locales de Apify y Gemini para medir el pipeline sin red.
+
+- `ApifyFalso` imita lo que usa `scraping.obtener_tweets`:
+  `actor(id).call(run_input=...)`, `run(id).dataset().list_items(offset=, limit=, fields=)`.
+- `GeminiFalso` imita `genai.GenerativeModel.generate_content`: responde el
+  JSON de clasificación (un objeto por "Tweet N:" del prompt), el JSON de
+  los temas por fragmento y de su fusión, o un texto de temas, con latencia, tasa de fallos (429/503) y tasa de respuestas
+  malformadas configurables, y cuenta llamadas y tokens.
+
+Ambos son seguros para usar desde varios hilos.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+
+from bench_normalizacion import generar_items
+
+
+SENTIMIENTOS = ["POSITIVO", "NEGATIVO", "NEUTRO"]
+
+TEXTO_TEMAS = """1. Tema sintético
+Explicación breve del tema.
+Ejemplo: "tweet de ejemplo", [author/userName: usuario0]
+"""
+
+_RE_TWEET = re.compile(r"^\s*Tweet (\d+): ", re.MULTILINE)
+_RE_NUMERADO = re.compile(r"^\s*\[(\d+)\] ", re.MULTILINE)
+
+
+def generar_corpus(n, repetidos=0.3, semilla=0):
+    """
+    `generar_items(n)` con una fracción `repetidos` de textos copiados de
+    tweets anteriores (como retweets o campañas), para que la deduplicación
+    tenga trabajo realista.
+    """
+    items = generar_items(n, semilla=semilla)
+    rng = random.Random(semilla + 1)
+    for i in range(1, n):
+        if rng.random() < repetidos:
+            items[i]["text"] = items[rng.randrange(i)]["text"]
+    return items
+
+
+class _Pagina:
+    def __init__(self, items):
+        self.items = items
+
+
+class _DatasetFalso:
+    def __init__(self, items, latencia):
+        self._items = items
+        self._latencia = latencia
+
+    def list_items(self, offset=0, limit=None, fields=None):
+        time.sleep(self._latencia)
+        pagina = self._items[offset:offset + limit if limit else None]
+        if fields:
+            pagina = [{campo: item.get(campo) for campo in fields} for item in pagina]
+        return _Pagina(pagina)
+
+
+class _RunFalso:
+    def __init__(self, items, latencia):
+        self._dataset = _DatasetFalso(items, latencia)
+
+    def dataset(self):
+        return self._dataset
+
+
+class _ActorFalso:
+    def __init__(self, apify):
+        self._apify = apify
+
+    def call(self, run_input=None):
+        return self._apify._nueva_ejecucion(run_input or {})
+
+
+class ApifyFalso:
+    """
+    `ApifyClient` local. Cada término de búsqueda devuelve `items_por_termino`
+    items de `generar_corpus` (sin exceder `maxItems`). `latencia_ejecucion`
+    simula la corrida del actor y `latencia_pagina` cada página del dataset.
+
+    `preparar(terminos)` genera los corpus por adelantado, para que el
+    benchmark no mida la generación de datos sintéticos.
+
+    Las ejecuciones que incluyen algún término de `fallan` lanzan
+    `RuntimeError`; `maximo_en_curso` es la mayor cantidad de ejecuciones
+    del actor que corrieron a la vez.
+    """
+
+    def __init__(self, items_por_termino, repetidos=0.3, latencia_ejecucion=0.0, latencia_pagina=0.0, fallan=()):
+        self.items_por_termino = items_por_termino
+        self.repetidos = repetidos
+        self.latencia_ejecucion = latencia_ejecucion
+        self.latencia_pagina = latencia_pagina
+        self.fallan = set(fallan)
+        self.en_curso = 0
+        self.maximo_en_curso = 0
+        self._ejecuciones = {}
+        self._corpus = {}
+        self._lock = threading.Lock()
+
+    def actor(self, actor_id):
+        return _ActorFalso(self)
+
+    def _corpus_de(self, terminos):
+        clave = "|".join(terminos)
+        with self._lock:
+            if clave not in self._corpus:
+                self._corpus[clave] = generar_corpus(self.items_por_termino, self.repetidos, semilla=sum(map(ord, clave)))
+            return self._corpus[clave]
+
+    def preparar(self, terminos):
+        for termino in terminos:
+            self._corpus_de([termino])
+
+    def _nueva_ejecucion(self, run_input):
+        with self._lock:
+            self.en_curso += 1
+            self.maximo_en_curso = max(self.maximo_en_curso, self.en_curso)
+        try:
+            time.sleep(self.latencia_ejecucion)
+        finally:
+            with self._lock:
+                self.en_curso -= 1
+        terminos = run_input.get("searchTerms") or [""]
+        fallidos = self.fallan.intersection(terminos)
+        if fallidos:
+            raise RuntimeError(f"El actor falló para {', '.join(sorted(fallidos))}")
+        items = self._corpus_de(terminos)[:run_input.get("maxItems") or None]
+        with self._lock:
+            run_id = f"run{len(self._ejecuciones)}"
+            self._ejecuciones[run_id] = items
+        return {"id": run_id, "defaultDatasetId": run_id}
+
+    def run(self, run_id):
+        return _RunFalso(self._ejecuciones[run_id], self.latencia_pagina)
+
+
+class ErrorFalso(Exception):
+    """Error de la API con código HTTP, como las excepciones de google.api_core."""
+
+    def __init__(self, code, mensaje):
+        super().__init__(mensaje)
+        self.code = code
+
+
+class _UsoFalso:
+    def __init__(self, entrada, salida):
+        self.prompt_token_count = entrada
+        self.candidates_token_count = salida
+
+
+class _RespuestaFalsa:
+    def __init__(self, texto, entrada):
+        self.text = texto
+        self.usage_metadata = _UsoFalso(entrada, max(1, len(texto) // 4))
+
+
+class GeminiFalso:
+    """
+    `GenerativeModel` local.
+
+    - `latencia` (s) por llamada más `latencia_por_1k_tokens` según el prompt.
+    - `tasa_fallos`: probabilidad de lanzar `ErrorFalso` (429 o 503).
+    - `tasa_malformados`: probabilidad de una respuesta defectuosa (faltan
+      tweets, índices fuera de rango o JSON inválido).
+    """
+
+    model_name = "models/gemini-falso"
+
+    def __init__(self, latencia=0.0, latencia_por_1k_tokens=0.0, tasa_fallos=0.0, tasa_malformados=0.0, semilla=0):
+        self.latencia = latencia
+        self.latencia_por_1k_tokens = latencia_por_1k_tokens
+        self.tasa_fallos = tasa_fallos
+        self.tasa_malformados = tasa_malformados
+        self._rng = random.Random(semilla)
+        self._lock = threading.Lock()
+        self.estadisticas = {"llamadas": 0, "fallos": 0, "malformadas": 0, "tokens_entrada": 0, "tokens_salida": 0}
+
+    def _sortear(self):
+        with self._lock:
+            return self._rng.random(), self._rng.random()
+
+    def generate_content(self, prompt, generation_config=None):
+        tokens_entrada = max(1, len(prompt) // 4)
+        time.sleep(self.latencia + self.latencia_por_1k_tokens * tokens_entrada / 1000)
+        fallo, malformado = self._sortear()
+        with self._lock:
+            self.estadisticas["llamadas"] += 1
+            self.estadisticas["tokens_entrada"] += tokens_entrada
+        if fallo < self.tasa_fallos:
+            with self._lock:
+                self.estadisticas["fallos"] += 1
+            raise ErrorFalso(429 if fallo < self.tasa_fallos / 2 else 503, "Error simulado de la API")
+
+        indices = [int(n) for n in _RE_TWEET.findall(prompt)]
+        propiedades = ((generation_config or {}).get("response_schema") or {}).get("items", {}).get("properties", {})
+        numerados = [int(n) for n in _RE_NUMERADO.findall(prompt)]
+        if "tweets" in propiedades or "candidatos" in propiedades:
+            # Temas por fragmento o fusión de candidatos (map-reduce de `temas.py`): tres temas en ronda
+            campo = "tweets" if "tweets" in propiedades else "candidatos"
+            entradas = []
+            for k in range(min(3, len(numerados))):
+                miembros = numerados[k::3]
+                entrada = {"tema": f"Tema sintético {k + 1}", "explicacion": "Explicación breve del tema.", campo: miembros}
+                if campo == "tweets":
+                    entrada["ejemplo"] = miembros[0]
+                entradas.append(entrada)
+            texto = json.dumps(entradas)
+        elif not indices:
+            texto = TEXTO_TEMAS
+        else:
+            entradas = [{"indice": i, "sentimiento": SENTIMIENTOS[hash(i) % 3]} for i in indices]
+            if malformado < self.tasa_malformados:
+                with self._lock:
+                    self.estadisticas["malformadas"] += 1
+                tipo = int(malformado / self.tasa_malformados * 3)
+                if tipo == 0:
+                    entradas = entradas[::2]  # faltan la mitad
+                elif tipo == 1:
+                    entradas.append({"indice": len(indices) + 7, "sentimiento": "POSITIVO"})
+                    entradas = entradas[1:]
+                else:
+                    texto = "Lo siento, no puedo clasificar estos tweets."
+                    entradas = None
+            if entradas is not None:
+                texto = json.dumps(entradas)
+
+        respuesta = _RespuestaFalsa(texto, tokens_entrada)
+        with self._lock:
+            self.estadisticas["tokens_salida"] += respuesta.usage_metadata.candidates_token_count
+        return respuesta
@@ -0,0 +1,128 @@
+# cache_sentimientos.py
+
+"""
+Caché persistente (SQLite) de sentimientos ya clasificados por Gemini.
+
+La clave es un hash del texto normalizado del tweet, el contexto y el nombre
+del modelo, así que un mismo tweet analizado con otro contexto o con otro
+modelo se vuelve a clasificar. Cada entrada guarda además el hash de
+(contexto, modelo) en `ambito`, para leer las etiquetas de un contexto y
+modelo sin recorrer toda la tabla (ver `ejemplos`).
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+TTL_POR_DEFECTO = 7 * 24 * 3600  # 7 días
+MAX_ENTRADAS_POR_DEFECTO = 500_000
+
+
+def clave_sentimiento(texto_normalizado, contexto, modelo):
+    """Hash estable de (texto normalizado, contexto, modelo)."""
+    contenido = "\x1f".join([texto_normalizado, contexto or "", modelo or ""])
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def ambito_sentimiento(contexto, modelo):
+    """Hash estable de (contexto, modelo)."""
+    contenido = "\x1f".join([contexto or "", modelo or ""])
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+class CacheSentimientos:
+    """
+    Caché clave -> sentimiento con expiración (TTL) y desalojo por tamaño.
+
+    Cuando se supera `max_entradas`, se eliminan las entradas usadas hace más
+    tiempo. Se puede compartir entre hilos.
+    """
+
+    def __init__(self, path, ttl=TTL_POR_DEFECTO, max_entradas=MAX_ENTRADAS_POR_DEFECTO):
+        self.path = path
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+
+        directorio = os.path.dirname(path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS sentimientos (
+                       clave TEXT PRIMARY KEY,
+                       ambito TEXT NOT NULL,
+                       texto TEXT NOT NULL,
+                       sentimiento TEXT NOT NULL,
+                       creado REAL NOT NULL,
+                       usado REAL NOT NULL
+                   )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sentimientos_usado ON sentimientos (usado)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sentimientos_ambito ON sentimientos (ambito, usado)")
+
+    def obtener(self, claves):
+        """Devuelve {clave: sentimiento} para las claves vigentes encontradas."""
+        claves = list(dict.fromkeys(claves))
+        encontrados = {}
+        ahora = time.time()
+        limite = ahora - self.ttl
+        with self._lock, self._conn:
+            # SQLite limita la cantidad de parámetros por consulta
+            for i in range(0, len(claves), 500):
+                bloque = claves[i:i + 500]
+                marcas = ",".join("?" * len(bloque))
+                filas = self._conn.execute(
+                    f"SELECT clave, sentimiento FROM sentimientos WHERE creado >= ? AND clave IN ({marcas})",
+                    [limite, *bloque],
+                ).fetchall()
+                encontrados.update(filas)
+                self._conn.execute(
+                    f"UPDATE sentimientos SET usado = ? WHERE clave IN ({marcas})",
+                    [ahora, *bloque],
+                )
+        return encontrados
+
+    def guardar(self, entradas, contexto, modelo):
+        """Guarda una lista de tuplas (clave, texto_normalizado, sentimiento) clasificadas con `contexto` y `modelo`."""
+        ahora = time.time()
+        ambito = ambito_sentimiento(contexto, modelo)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sentimientos (clave, ambito, texto, sentimiento, creado, usado) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(clave, ambito, texto, sentimiento, ahora, ahora) for clave, texto, sentimiento in entradas],
+            )
+
+    def ejemplos(self, limite, contexto, modelo):
+        """
+        Hasta `limite` pares (texto_normalizado, sentimiento) vigentes
+        clasificados con `contexto` y `modelo`, los usados más recientemente
+        primero. Sirven para entrenar el prefiltro local (ver `prefiltro.py`).
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT texto, sentimiento FROM sentimientos WHERE ambito = ? AND creado >= ? ORDER BY usado DESC LIMIT ?",
+                (ambito_sentimiento(contexto, modelo), time.time() - self.ttl, limite),
+            ).fetchall()
+
+    def purgar(self):
+        """Elimina las entradas vencidas y, si sobran, las menos usadas recientemente."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sentimientos WHERE creado < ?", (time.time() - self.ttl,))
+            total = self._conn.execute("SELECT COUNT(*) FROM sentimientos").fetchone()[0]
+            sobrantes = total - self.max_entradas
+            if sobrantes > 0:
+                self._conn.execute(
+                    "DELETE FROM sentimientos WHERE clave IN (SELECT clave FROM sentimientos ORDER BY usado LIMIT ?)",
+                    (sobrantes,),
+                )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sentimientos").fetchone()[0]
@@ -0,0 +1,83 @@
+# cache_temas.py
+
+"""
+Caché persistente (SQLite) de los temas candidatos de cada fragmento de
+tweets (la etapa "map" de `temas.extraer_temas_completos`).
+
+La clave es un hash del contenido del fragmento, el contexto, el sentimiento
+y el modelo (ver `temas.clave_fragmento`). Los fragmentos se cortan según su
+contenido, así que al volver a analizar una ventana con tweets nuevos los
+fragmentos viejos conservan su clave y sólo los nuevos van a Gemini.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+TTL_POR_DEFECTO = 30 * 24 * 3600  # 30 días
+MAX_ENTRADAS_POR_DEFECTO = 50_000
+
+
+class CacheTemas:
+    """Caché clave -> lista de temas candidatos (JSON), con expiración y desalojo por tamaño."""
+
+    def __init__(self, path, ttl=TTL_POR_DEFECTO, max_entradas=MAX_ENTRADAS_POR_DEFECTO):
+        self.path = path
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+
+        directorio = os.path.dirname(path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS fragmentos (
+                       clave TEXT PRIMARY KEY,
+                       candidatos TEXT NOT NULL,
+                       creado REAL NOT NULL,
+                       usado REAL NOT NULL
+                   )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_fragmentos_usado ON fragmentos (usado)")
+
+    def obtener(self, clave):
+        """Los candidatos guardados para `clave`, o None si no están o vencieron."""
+        ahora = time.time()
+        with self._lock, self._conn:
+            fila = self._conn.execute(
+                "SELECT candidatos FROM fragmentos WHERE clave = ? AND creado >= ?", (clave, ahora - self.ttl)
+            ).fetchone()
+            if fila is None:
+                return None
+            self._conn.execute("UPDATE fragmentos SET usado = ? WHERE clave = ?", (ahora, clave))
+        return json.loads(fila[0])
+
+    def guardar(self, clave, candidatos):
+        ahora = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fragmentos (clave, candidatos, creado, usado) VALUES (?, ?, ?, ?)",
+                (clave, json.dumps(candidatos, ensure_ascii=False), ahora, ahora),
+            )
+
+    def purgar(self):
+        """Elimina las entradas vencidas y, si sobran, las menos usadas recientemente."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM fragmentos WHERE creado < ?", (time.time() - self.ttl,))
+            total = self._conn.execute("SELECT COUNT(*) FROM fragmentos").fetchone()[0]
+            sobrantes = total - self.max_entradas
+            if sobrantes > 0:
+                self._conn.execute(
+                    "DELETE FROM fragmentos WHERE clave IN (SELECT clave FROM fragmentos ORDER BY usado LIMIT ?)",
+                    (sobrantes,),
+                )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM fragmentos").fetchone()[0]
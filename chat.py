@@ -0,0 +1,287 @@
+# chat.py
+
+"""
+Chat sobre los tweets de una ejecución ("💬 Chatbot de Datos").
+
+Pegar todo el dataset en el prompt no escala más allá de unos cientos de
+tweets, así que cada pregunta recupera sólo los tweets relevantes:
+
+1. `IndiceTweets` arma una vez por resultado un índice invertido en memoria
+   sobre `text` (palabras sin mayúsculas ni tildes, con sus frecuencias por
+   tweet en arreglos de numpy) y guarda columnas auxiliares para filtrar por
+   sentimiento, usuario, fecha y término de búsqueda.
+2. `buscar` puntúa con BM25 sólo los tweets que contienen alguna palabra de
+   la pregunta y que pasan los filtros, y devuelve los mejores (sin textos
+   repetidos). Si la pregunta no tiene palabras del índice ("¿qué opina la
+   gente?"), devuelve los de más vistas.
+3. `responder` arma el prompt con agregados del subconjunto filtrado
+   (cantidad, fechas, sentimientos, términos, usuarios más activos) y los
+   tweets recuperados hasta `PRESUPUESTO_TOKENS_CHAT`, así el costo de cada
+   pregunta no depende del tamaño del dataset.
+"""
+
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from duplicados import normalizar_para_duplicados
+from esquema import SENTIMIENTOS
+from muestreo import estimar_tokens
+
+
+PRESUPUESTO_TOKENS_CHAT = 6000
+MAX_TWEETS_CHAT = 60
+MAX_TURNOS_HISTORIAL = 3
+# Parámetros de BM25
+K1 = 1.2
+B = 0.75
+
+_RE_PALABRA = re.compile(r"\w{2,}")
+
+# Palabras de las preguntas que no sirven para buscar tweets
+PALABRAS_VACIAS = frozenset("""
+    de la el los las un una unos unas y o que qué en con por para sobre se su sus del al lo le les es son fue
+    como cómo cuál cuáles cuales cual cuanto cuánto cuántos cuantos donde dónde quien quién quienes quiénes
+    hay más mas menos muy me mi te tu ya no si sí pero entre dicen dice opinan opina gente usuarios tweets tweet
+    habla hablan hablando mencionan menciona principales principal temas tema
+""".split())
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize("NFD", str(texto).lower())
+    return "".join(c for c in texto if unicodedata.category(c) != "Mn")
+
+
+def tokenizar(texto):
+    return _RE_PALABRA.findall(_normalizar(texto))
+
+
+_VACIAS = frozenset(_normalizar(palabra) for palabra in PALABRAS_VACIAS)
+
+
+class IndiceTweets:
+    """
+    Índice BM25 sobre el `text` de un DataFrame de tweets (ver `esquema.py`).
+    El DataFrame no se modifica: el índice guarda una referencia.
+    """
+
+    def __init__(self, df):
+        self.df = df.reset_index(drop=True)
+        n = len(self.df)
+        textos = self.df['text'].fillna("").astype(str) if 'text' in self.df.columns else pd.Series([""] * n)
+
+        # Índice invertido: por palabra, los tweets que la contienen y cuántas veces
+        self._vocabulario = {}
+        palabras, documentos, frecuencias = [], [], []
+        self._longitudes = np.zeros(n, dtype=np.float32)
+        for i, texto in enumerate(textos):
+            conteo = Counter(tokenizar(texto))
+            self._longitudes[i] = sum(conteo.values())
+            for palabra, veces in conteo.items():
+                palabras.append(self._vocabulario.setdefault(palabra, len(self._vocabulario)))
+                documentos.append(i)
+                frecuencias.append(veces)
+        palabras = np.asarray(palabras, dtype=np.int64)
+        orden = np.argsort(palabras, kind="stable")
+        self._documentos = np.asarray(documentos, dtype=np.int64)[orden]
+        self._frecuencias = np.asarray(frecuencias, dtype=np.float32)[orden]
+        self._inicios = np.concatenate([[0], np.cumsum(np.bincount(palabras, minlength=len(self._vocabulario)))])
+        self._longitud_media = float(self._longitudes.mean()) if n else 0.0
+
+        # Columnas para filtros y agregados
+        self._vistas = self.df['viewCount'].fillna(0).to_numpy(dtype=np.float64) if 'viewCount' in self.df.columns else np.zeros(n)
+        self._usuarios = (
+            self.df['author/userName'].fillna("").astype(str).str.lower().to_numpy()
+            if 'author/userName' in self.df.columns else np.full(n, "", dtype=object)
+        )
+        self._fechas = (
+            pd.to_datetime(self.df['createdAt'], errors='coerce', utc=True)
+            if 'createdAt' in self.df.columns else pd.Series(pd.NaT, index=self.df.index, dtype="datetime64[ns, UTC]")
+        )
+        self._sentimientos = (
+            self.df['sentimiento'].astype(object).fillna("").to_numpy()
+            if 'sentimiento' in self.df.columns else np.full(n, "", dtype=object)
+        )
+        if 'search_terms' in self.df.columns:
+            terminos_por_tweet = self.df['search_terms']
+        elif 'search_term' in self.df.columns:
+            terminos_por_tweet = self.df['search_term'].astype(object).map(lambda t: [t] if isinstance(t, str) else [])
+        else:
+            terminos_por_tweet = pd.Series([[]] * n)
+        self._terminos = {}
+        for i, terminos in enumerate(terminos_por_tweet):
+            for termino in terminos if isinstance(terminos, (list, tuple, np.ndarray)) else ():
+                self._terminos.setdefault(termino, np.zeros(n, dtype=bool))[i] = True
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def terminos(self):
+        return list(self._terminos)
+
+    def mascara(self, sentimientos=None, usuarios=None, desde=None, hasta=None, terminos=None):
+        """
+        Tweets que pasan los filtros (None o vacío = sin filtro). `desde` y
+        `hasta` son fechas incluidas; `usuarios`, nombres con o sin "@".
+        """
+        mascara = np.ones(len(self), dtype=bool)
+        if sentimientos:
+            mascara &= np.isin(self._sentimientos, list(sentimientos))
+        if usuarios:
+            mascara &= np.isin(self._usuarios, [u.strip().lstrip("@").lower() for u in usuarios])
+        if desde is not None:
+            mascara &= (self._fechas >= pd.Timestamp(desde, tz="UTC")).to_numpy()
+        if hasta is not None:
+            mascara &= (self._fechas < pd.Timestamp(hasta, tz="UTC") + pd.Timedelta(days=1)).to_numpy()
+        if terminos:
+            por_termino = np.zeros(len(self), dtype=bool)
+            for termino in terminos:
+                if termino in self._terminos:
+                    por_termino |= self._terminos[termino]
+            mascara &= por_termino
+        return mascara
+
+    def puntajes(self, consulta):
+        """Puntaje BM25 de cada tweet para las palabras de `consulta` (0 si no contiene ninguna)."""
+        puntajes = np.zeros(len(self), dtype=np.float32)
+        n = len(self)
+        for palabra in set(tokenizar(consulta)) - _VACIAS:
+            indice = self._vocabulario.get(palabra)
+            if indice is None:
+                continue
+            inicio, fin = self._inicios[indice], self._inicios[indice + 1]
+            documentos = self._documentos[inicio:fin]
+            frecuencias = self._frecuencias[inicio:fin]
+            idf = np.log(1 + (n - len(documentos) + 0.5) / (len(documentos) + 0.5))
+            normalizacion = K1 * (1 - B + B * self._longitudes[documentos] / (self._longitud_media or 1))
+            # Cada tweet aparece una sola vez por palabra, así que se puede sumar por índice
+            puntajes[documentos] += idf * frecuencias * (K1 + 1) / (frecuencias + normalizacion)
+        return puntajes
+
+    def buscar(self, consulta, k=MAX_TWEETS_CHAT, **filtros):
+        """
+        Hasta `k` filas de `df` (con la columna `puntaje`) que mejor responden
+        a `consulta` entre las que pasan `filtros` (ver `mascara`), sin textos
+        repetidos. Sin palabras conocidas en la consulta, las de más vistas.
+        """
+        mascara = self.mascara(**filtros)
+        puntajes = self.puntajes(consulta)
+        candidatos = np.flatnonzero(mascara & (puntajes > 0))
+        if not len(candidatos):
+            candidatos = np.flatnonzero(mascara)
+        # Por puntaje y, a igual puntaje (o sin palabras conocidas), por vistas
+        mejores = candidatos[np.lexsort((-self._vistas[candidatos], -puntajes[candidatos]))]
+
+        elegidos, vistos = [], set()
+        for i in mejores:
+            clave = normalizar_para_duplicados(str(self.df.at[i, 'text']))
+            if clave in vistos:
+                continue
+            vistos.add(clave)
+            elegidos.append(i)
+            if len(elegidos) == k:
+                break
+        resultado = self.df.iloc[elegidos].copy()
+        resultado['puntaje'] = puntajes[elegidos]
+        return resultado
+
+    def agregados(self, mascara=None, max_usuarios=5):
+        """Líneas con los números del subconjunto `mascara` (todo el índice si es None) para el prompt."""
+        mascara = np.ones(len(self), dtype=bool) if mascara is None else mascara
+        total = int(mascara.sum())
+        lineas = [f"Tweets: {total:,} de {len(self):,} recolectados"]
+        if not total:
+            return lineas
+        fechas = self._fechas[mascara].dropna()
+        if not fechas.empty:
+            lineas.append(f"Fechas: del {fechas.min():%Y-%m-%d} al {fechas.max():%Y-%m-%d}")
+        sentimientos = Counter(self._sentimientos[mascara])
+        if any(sentimientos[s] for s in SENTIMIENTOS):
+            lineas.append("Sentimiento: " + ", ".join(
+                f"{s} {sentimientos[s]:,} ({sentimientos[s] / total:.0%})" for s in SENTIMIENTOS
+            ))
+        por_termino = {t: int((m & mascara).sum()) for t, m in self._terminos.items()}
+        if len(por_termino) > 1:
+            lineas.append("Por término: " + ", ".join(f"{t} {c:,}" for t, c in por_termino.items() if c))
+        usuarios = Counter(u for u in self._usuarios[mascara] if u).most_common(max_usuarios)
+        if usuarios:
+            lineas.append("Usuarios con más tweets: " + ", ".join(f"@{u} ({c})" for u, c in usuarios))
+        lineas.append(f"Vistas totales: {int(self._vistas[mascara].sum()):,}")
+        return lineas
+
+
+def linea_tweet(registro):
+    """Un tweet en el prompt: fecha, usuario, sentimiento, vistas y texto."""
+    partes = []
+    fecha = pd.to_datetime(registro.get('createdAt'), errors='coerce', utc=True)
+    if not pd.isna(fecha):
+        partes.append(f"{fecha:%Y-%m-%d}")
+    usuario = registro.get('author/userName')
+    if isinstance(usuario, str) and usuario:
+        partes.append(f"@{usuario}")
+    sentimiento = registro.get('sentimiento')
+    if isinstance(sentimiento, str) and sentimiento:
+        partes.append(sentimiento)
+    vistas = registro.get('viewCount')
+    if vistas is not None and not pd.isna(vistas):
+        partes.append(f"{int(vistas):,} vistas")
+    texto = " ".join(str(registro.get('text', "")).split())
+    return f"[{' · '.join(partes)}] \"{texto}\""
+
+
+def armar_prompt(pregunta, contexto, agregados, tweets, historial=(), presupuesto_tokens=PRESUPUESTO_TOKENS_CHAT):
+    """
+    Prompt de una pregunta: contexto, agregados, los últimos turnos de
+    `historial` (lista de `{"role", "content"}`) y tantos tweets de `tweets`
+    (en orden de relevancia) como entren en `presupuesto_tokens`. Devuelve
+    `(prompt, tweets_incluidos)`.
+    """
+    conversacion = "\n".join(
+        f"{'Usuario' if turno['role'] == 'user' else 'Asistente'}: {turno['content']}"
+        for turno in list(historial)[-2 * MAX_TURNOS_HISTORIAL:]
+    )
+    encabezado = (
+        f"CONTEXTO: {contexto}\n"
+        "Eres un analista de redes sociales. Responde la pregunta en español usando sólo los datos de abajo: "
+        "los números del conjunto filtrado y una selección de los tweets más relevantes para la pregunta "
+        "(no son todos los tweets). Cita usuarios o tweets de ejemplo cuando ayude y, si los datos no "
+        "alcanzan para responder, dilo.\n"
+        "---\nDatos del conjunto:\n" + "\n".join(agregados) + "\n"
+    )
+    if conversacion:
+        encabezado += f"---\nConversación anterior:\n{conversacion}\n"
+    cierre = f"---\nPregunta: {pregunta}\n"
+
+    disponible = presupuesto_tokens - estimar_tokens(encabezado) - estimar_tokens(cierre)
+    lineas = []
+    for registro in tweets.to_dict('records'):
+        linea = linea_tweet(registro)
+        disponible -= estimar_tokens(linea) + 1
+        if disponible < 0:
+            break
+        lineas.append(linea)
+    prompt = encabezado + f"---\nTweets relevantes ({len(lineas)}):\n" + "\n".join(lineas) + "\n" + cierre
+    return prompt, tweets.iloc[:len(lineas)]
+
+
+def responder(indice, pregunta, model, contexto="", historial=(), presupuesto_tokens=PRESUPUESTO_TOKENS_CHAT,
+              **filtros):
+    """
+    Responde `pregunta` sobre el `indice` con Gemini. Devuelve un dict con
+    `respuesta`, `tweets` (los que fueron en el prompt) y `tokens_prompt`
+    (estimados). Los errores de la API se propagan.
+    """
+    if not model:
+        return {"respuesta": "El modelo de IA no está disponible para el chat.", "tweets": indice.df.iloc[0:0],
+                "tokens_prompt": 0}
+    # La búsqueda usa también el turno anterior del usuario, para preguntas de seguimiento ("¿y los negativos?")
+    anteriores = [turno['content'] for turno in historial if turno['role'] == 'user'][-1:]
+    tweets = indice.buscar(" ".join(anteriores + [pregunta]), **filtros)
+    agregados = indice.agregados(indice.mascara(**filtros))
+    prompt, incluidos = armar_prompt(pregunta, contexto, agregados, tweets, historial, presupuesto_tokens)
+    response = model.generate_content(prompt, generation_config={"temperature": 0.3})
+    return {"respuesta": response.text.strip(), "tweets": incluidos, "tokens_prompt": estimar_tokens(prompt)}
@@ -0,0 +1,338 @@
+# clasificacion.py
+
+"""
+Clasificación de sentimiento de tweets con Gemini.
+
+Este módulo no depende de Streamlit: las funciones se ejecutan en hilos de
+trabajo, así que los avisos se devuelven al llamador en lugar de mostrarse
+directamente en la página.
+
+Los reintentos por errores de la API, el límite de peticiones y el
+cortocircuito los pone `llm.ClienteLLM`, que se pasa en lugar del modelo.
+Los tweets que no se pudieron clasificar quedan como `None` (sin etiqueta),
+no como NEUTRO, para no mezclarlos con la distribución real.
+"""
+
+import json
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cache_sentimientos import clave_sentimiento
+from duplicados import AgrupadorDuplicados
+from esquema import SENTIMIENTOS
+from llm import uso_de_tokens
+from lotes import MAX_TWEETS_LOTE, PRESUPUESTO_TOKENS_LOTE, LoteAdaptativo, tokens_tweet
+
+
+def preparar_tweet(tweet):
+    """Limpia un tweet para incluirlo en el prompt (comillas, saltos de línea y largo)."""
+    return tweet.replace('"', "'").replace("\n", " ").strip()[:280]
+
+
+def nombre_modelo(model):
+    """Nombre del modelo de Gemini (p. ej. 'models/gemini-2.0-flash'), usado en la clave de caché."""
+    return getattr(model, "model_name", None) or type(model).__name__
+
+
+# Rondas extra en las que se reenvían sólo los tweets que faltaron en la respuesta
+REINTENTOS_FALTANTES = 2
+
+# Salida estructurada: una lista de {indice, sentimiento}, con el índice del tweet en el prompt
+ESQUEMA_RESPUESTA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "indice": {"type": "integer"},
+            "sentimiento": {"type": "string", "enum": SENTIMIENTOS},
+        },
+        "required": ["indice", "sentimiento"],
+    },
+}
+
+
+def interpretar_respuesta(respuesta, cantidad):
+    """
+    Extrae `{indice: sentimiento}` (índices desde 0) de la respuesta de Gemini,
+    descartando índices fuera de rango, repetidos o sentimientos inválidos.
+
+    Espera el JSON de `ESQUEMA_RESPUESTA`; si no es JSON válido, recurre al
+    formato de texto "Tweet N: SENTIMIENTO".
+    """
+    try:
+        datos = json.loads(respuesta)
+    except ValueError:
+        datos = None
+
+    pares = []
+    if isinstance(datos, list):
+        for entrada in datos:
+            if isinstance(entrada, dict):
+                pares.append((entrada.get("indice"), entrada.get("sentimiento")))
+    else:
+        pares = re.findall(r"Tweet\s*(\d+)\s*:\s*(POSITIVO|NEGATIVO|NEUTRO)", respuesta, re.IGNORECASE)
+
+    etiquetas = {}
+    for indice, sentimiento in pares:
+        try:
+            indice = int(indice)
+        except (TypeError, ValueError):
+            continue
+        sentimiento = str(sentimiento).strip().upper()
+        if 1 <= indice <= cantidad and sentimiento in SENTIMIENTOS:
+            etiquetas.setdefault(indice - 1, sentimiento)
+    return etiquetas
+
+
+def _clasificar_lote(tweets, contexto, model):
+    """
+    Una llamada a Gemini con salida JSON estructurada. Devuelve
+    `(etiquetas, uso)`: `{indice: sentimiento}` sólo con los tweets bien
+    clasificados (puede faltar alguno) y los tokens informados por la API.
+    Los errores de la API se propagan.
+    """
+    tweets_preparados = [preparar_tweet(tweet) for tweet in tweets]
+
+    prompt = f"""
+    Eres un modelo de lenguaje experto en análisis de sentimiento de redes sociales.
+
+    CONTEXTO GENERAL: {contexto}
+
+    Clasifica el sentimiento de cada uno de los siguientes tweets como POSITIVO, NEGATIVO o NEUTRO.
+    Responde con una lista JSON que tenga exactamente un objeto por tweet, con el número del tweet
+    en "indice" y su sentimiento en "sentimiento". Por ejemplo:
+    [{{"indice": 1, "sentimiento": "POSITIVO"}}, {{"indice": 2, "sentimiento": "NEUTRO"}}]
+
+    TWEETS:
+    """
+
+    for i, tweet in enumerate(tweets_preparados):
+        prompt += f'\nTweet {i+1}: "{tweet}"'
+
+    response = model.generate_content(
+        prompt,
+        generation_config={
+            "temperature": 0.2,
+            "response_mime_type": "application/json",
+            "response_schema": ESQUEMA_RESPUESTA,
+        },
+    )
+    return interpretar_respuesta(response.text.strip(), len(tweets)), uso_de_tokens(response)
+
+
+def _clasificar_con_reintentos(tweets, contexto, model, avisos, on_llamada=None):
+    """
+    Clasifica `tweets` y reenvía, hasta `REINTENTOS_FALTANTES` veces, sólo los
+    índices que faltaron o vinieron inválidos. Devuelve `(resultados, llamadas)`
+    donde `resultados` es `{indice: sentimiento}` de los tweets resueltos.
+
+    `on_llamada(textos, latencia, resueltos, error, uso)` se invoca después de
+    cada llamada.
+    """
+    resultados = {}
+    pendientes = list(range(len(tweets)))
+    llamadas = 0
+    for _ in range(1 + REINTENTOS_FALTANTES):
+        llamadas += 1
+        enviados = [tweets[i] for i in pendientes]
+        inicio = time.monotonic()
+        try:
+            etiquetas, uso = _clasificar_lote(enviados, contexto, model)
+        except Exception as e:
+            if on_llamada:
+                on_llamada(enviados, time.monotonic() - inicio, 0, e, None)
+            avisos.append(f"❌ Error en la clasificación con Gemini: {e}")
+            break
+        if on_llamada:
+            on_llamada(enviados, time.monotonic() - inicio, len(etiquetas), None, uso)
+        for posicion, sentimiento in etiquetas.items():
+            resultados[pendientes[posicion]] = sentimiento
+        pendientes = [i for i in pendientes if i not in resultados]
+        if not pendientes:
+            break
+
+    if pendientes:
+        avisos.append(f"❗ {len(pendientes)} de {len(tweets)} tweets quedaron sin clasificar tras reintentar. Se excluyen de la distribución de sentimientos.")
+    return resultados, llamadas
+
+
+class ClasificadorIncremental:
+    """
+    Motor de clasificación que acepta tweets a medida que llegan (por ejemplo,
+    página a página desde Apify) y empieza a enviar lotes a Gemini antes de
+    tener el conjunto completo.
+
+    Los textos repetidos se agrupan con `AgrupadorDuplicados` y sólo el
+    representante de cada grupo se consulta en la caché o se envía a Gemini.
+    `agregar()` se puede llamar desde varios hilos; `finalizar()` se llama una
+    vez, desde el hilo principal, con todos los textos a etiquetar.
+
+    Los lotes se llenan hasta un presupuesto de tokens que se adapta a las
+    respuestas (ver `lotes.LoteAdaptativo`); `self.lotes.historial` guarda la
+    latencia y los tokens de cada llamada.
+
+    Con un `prefiltro` (`prefiltro.PreClasificador`), los textos que no están
+    en la caché pasan primero por el clasificador local y sólo los de
+    confianza menor a su umbral se envían a Gemini. Sus etiquetas no se
+    guardan en la caché, que queda sólo con etiquetas de Gemini.
+    """
+
+    def __init__(self, contexto, model, presupuesto_tokens=PRESUPUESTO_TOKENS_LOTE, max_workers=4,
+                 cache=None, casi_duplicados=False, umbral=0.8, max_tweets_lote=MAX_TWEETS_LOTE, prefiltro=None):
+        self.contexto = contexto
+        self.model = model
+        self.lotes = LoteAdaptativo(presupuesto_tokens, max_tweets=max_tweets_lote)
+        self.cache = cache if model else None
+        self.prefiltro = prefiltro
+        self.avisos = []
+        self.estadisticas = {"tweets": 0, "textos_unicos": 0, "aciertos_cache": 0, "llamadas_llm": 0,
+                             "resueltos_localmente": 0}
+
+        self._lock = threading.Lock()
+        self._agrupador = AgrupadorDuplicados(casi_duplicados=casi_duplicados, umbral=umbral)
+        self._modelo = nombre_modelo(model) if model else None
+        self._grupo_por_texto = {}
+        self._sentimientos = {}  # grupo -> sentimiento
+        self._de_cache = set()  # grupos resueltos por la caché
+        self._locales = set()  # grupos resueltos por el prefiltro
+        self._pendientes = []  # (grupo, texto, tokens) todavía sin enviar
+        self._tokens_pendientes = 0
+        self._futuros = {}  # futuro -> grupos del lote
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+
+    def _clave(self, texto):
+        return clave_sentimiento(preparar_tweet(texto), self.contexto, self._modelo)
+
+    def agregar(self, textos):
+        """Registra textos nuevos y envía a Gemini los lotes que se completen."""
+        with self._lock:
+            nuevos = []
+            for texto in textos:
+                texto = str(texto)
+                if texto in self._grupo_por_texto:
+                    continue
+                grupo, es_nuevo = self._agrupador.agregar(texto)
+                self._grupo_por_texto[texto] = grupo
+                if es_nuevo:
+                    nuevos.append((grupo, texto))
+
+            if not self.model:
+                self._sentimientos.update((grupo, "NEUTRO") for grupo, _ in nuevos)
+                return
+
+            # Consultar la caché: sólo los fallos se envían a Gemini
+            if self.cache is not None and nuevos:
+                claves = [self._clave(texto) for _, texto in nuevos]
+                encontrados = self.cache.obtener(claves)
+                faltantes = []
+                for (grupo, texto), clave in zip(nuevos, claves):
+                    if clave in encontrados:
+                        self._sentimientos[grupo] = encontrados[clave]
+                        self._de_cache.add(grupo)
+                    else:
+                        faltantes.append((grupo, texto))
+                nuevos = faltantes
+
+            if self.prefiltro is not None and nuevos:
+                resueltos = self.prefiltro.filtrar([texto for _, texto in nuevos])
+                for i, sentimiento in resueltos.items():
+                    self._sentimientos[nuevos[i][0]] = sentimiento
+                    self._locales.add(nuevos[i][0])
+                nuevos = [par for i, par in enumerate(nuevos) if i not in resueltos]
+
+            for grupo, texto in nuevos:
+                costo = tokens_tweet(preparar_tweet(texto))
+                self._pendientes.append((grupo, texto, costo))
+                self._tokens_pendientes += costo
+            while self._pendientes and self.lotes.lleno(self._tokens_pendientes, len(self._pendientes)):
+                self._enviar_siguiente()
+
+    def _enviar_siguiente(self):
+        # Se llama con el lock tomado: saca del principio de la cola un lote del tamaño actual
+        tamano = self.lotes.tamano_siguiente([costo for _, _, costo in self._pendientes])
+        lote = self._pendientes[:tamano]
+        del self._pendientes[:tamano]
+        self._tokens_pendientes -= sum(costo for _, _, costo in lote)
+        futuro = self._executor.submit(self._clasificar, [texto for _, texto, _ in lote])
+        self._futuros[futuro] = [grupo for grupo, _, _ in lote]
+        self.estadisticas["llamadas_llm"] += 1
+
+    def _registrar_llamada(self, textos, latencia, resueltos, error, uso):
+        tokens = sum(tokens_tweet(preparar_tweet(texto)) for texto in textos)
+        self.lotes.registrar(len(textos), tokens, latencia, resueltos, error=error, uso=uso)
+
+    def _clasificar(self, textos):
+        resultados, llamadas = _clasificar_con_reintentos(
+            textos, self.contexto, self.model, self.avisos, on_llamada=self._registrar_llamada
+        )
+        with self._lock:
+            # La primera llamada ya se contó al enviar el lote
+            self.estadisticas["llamadas_llm"] += llamadas - 1
+        # Sólo se guardan en la caché los tweets que Gemini etiquetó de verdad
+        if resultados and self.cache is not None:
+            self.cache.guardar([
+                (self._clave(textos[i]), preparar_tweet(textos[i]), sentimiento)
+                for i, sentimiento in resultados.items()
+            ], self.contexto, self._modelo)
+        return [resultados.get(i) for i in range(len(textos))]
+
+    def finalizar(self, textos, on_progress=None, on_conteo=None):
+        """
+        Clasifica lo que falte de `textos`, espera a todos los lotes en curso y
+        devuelve los sentimientos en el orden de `textos`.
+
+        `on_progress(completados, total)` cuenta los textos únicos (grupos) de
+        `textos` y se invoca desde el hilo llamador cada vez que termina un lote.
+        `on_conteo({sentimiento: tweets})` recibe, en los mismos momentos, la
+        distribución parcial de `textos` ya clasificados.
+        """
+        textos = [str(texto) for texto in textos]
+        self.agregar(textos)
+        with self._lock:
+            while self._pendientes:
+                self._enviar_siguiente()
+            futuros = dict(self._futuros)
+
+        # Tweets por grupo, para que la distribución parcial cuente repetidos.
+        # Sólo los grupos de `textos`: pudieron agregarse textos que no quedaron
+        # en el resultado (p. ej. tweets de una búsqueda que se descartó)
+        peso = Counter(self._grupo_por_texto[texto] for texto in textos)
+        conteo = Counter()
+        if on_conteo:
+            for grupo, tweets in peso.items():
+                sentimiento = self._sentimientos.get(grupo)
+                if sentimiento:
+                    conteo[sentimiento] += tweets
+            on_conteo(dict(conteo))
+
+        total = len(peso)
+        completados = sum(grupo in self._sentimientos for grupo in peso)
+        if on_progress and total:
+            on_progress(completados, total)
+        try:
+            for futuro in as_completed(futuros):
+                for grupo, sentimiento in zip(futuros[futuro], futuro.result()):
+                    if grupo in peso and grupo not in self._sentimientos:
+                        completados += 1
+                    self._sentimientos[grupo] = sentimiento
+                    if sentimiento:
+                        conteo[sentimiento] += peso.get(grupo, 0)
+                if on_progress:
+                    on_progress(completados, total)
+                if on_conteo:
+                    on_conteo(dict(conteo))
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+        if self.cache is not None:
+            self.cache.purgar()
+
+        self.estadisticas["tweets"] = len(textos)
+        self.estadisticas["textos_unicos"] = total
+        self.estadisticas["aciertos_cache"] = len(self._de_cache.intersection(peso))
+        self.estadisticas["resueltos_localmente"] = len(self._locales.intersection(peso))
+        return [self._sentimientos[self._grupo_por_texto[texto]] for texto in textos]
+
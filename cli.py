@@ -0,0 +1,173 @@
+# cli.py
+
+"""
+Ejecución por lotes, sin Streamlit, del análisis completo (scraping →
+clasificación → temas) de `pipeline.py`.
+
+Pensado para corridas nocturnas sobre muchos términos. Las credenciales se
+leen de las variables de entorno `APIFY_TOKEN` y `GEMINI_API_KEY`. El
+resultado se escribe en Parquet, CSV comprimido o JSONL (según la extensión
+de `--salida`: `.parquet`, `.csv.gz` o `.jsonl`; ver `exportacion.py`) y los
+temas, errores y estadísticas en un JSON al lado (`<salida>.temas.json`).
+Con `--metricas` se escriben además los tiempos, tokens y reintentos por
+etapa en formato OpenMetrics (p. ej. para el textfile collector de
+node_exporter); con `--verbose`, cada medición sale como log JSON.
+
+Uso (desde la raíz del repositorio):
+
+    python cli.py --terminos terminos.txt --desde 2024-05-01 --hasta 2024-05-08 \\
+        --contexto "Opiniones sobre bancos digitales" --salida resultados/bancos.parquet
+
+El archivo de términos tiene un término por línea (o separados por comas);
+las líneas que empiezan con `#` se ignoran.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import date
+
+from exportacion import exportar, formato_de_ruta
+from lotes import PRESUPUESTO_TOKENS_LOTE
+from metricas import a_openmetrics
+from muestreo import PRESUPUESTO_TOKENS_TEMAS
+from prefiltro import UMBRAL_PREFILTRO
+from pipeline import ejecutar_analisis, parsear_terminos
+
+
+def leer_terminos(path):
+    with open(path, encoding="utf-8") as f:
+        texto = "\n".join(linea for linea in f if not linea.lstrip().startswith("#"))
+    return parsear_terminos(texto)
+
+
+def guardar_resultado(resultado, salida):
+    """
+    Escribe los tweets en Parquet, CSV comprimido o JSONL (según la extensión)
+    y el resto del resultado en `<salida>.temas.json`.
+    """
+    if formato_de_ruta(salida) == "json":
+        raise ValueError(f"Extensión de salida no soportada: {salida} (usa .parquet, .csv.gz o .jsonl)")
+    exportar(resultado, salida)
+    exportar(resultado, salida + ".temas.json", "json")
+
+
+def mostrar_progreso(etapa, fraccion, mensaje):
+    print(f"[{time.strftime('%H:%M:%S')}] {etapa:<13} {fraccion:>4.0%}  {mensaje}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terminos", required=True, help="Archivo con los términos de búsqueda.")
+    parser.add_argument("--desde", required=True, type=date.fromisoformat, help="Fecha de inicio (YYYY-MM-DD).")
+    parser.add_argument("--hasta", type=date.fromisoformat, default=date.today(), help="Fecha de fin (YYYY-MM-DD, por defecto hoy).")
+    parser.add_argument("--contexto", default="", help="Contexto para la clasificación y los temas.")
+    parser.add_argument("--salida", required=True, help="Archivo de salida (.parquet, .csv.gz o .jsonl).")
+    parser.add_argument("--orden", default="Top", choices=["Top", "Latest"])
+    parser.add_argument("--modelo", default=None, help="Modelo de Gemini (por defecto, el de la aplicación).")
+    parser.add_argument("--max-scrapers", type=int, default=4, help="Búsquedas de Apify en paralelo.")
+    parser.add_argument("--max-workers", type=int, default=4, help="Lotes de clasificación en paralelo.")
+    parser.add_argument("--rpm", type=int, default=60, help="Máximo de llamadas a Gemini por minuto (0 = sin límite).")
+    parser.add_argument("--tokens-por-lote", type=int, default=PRESUPUESTO_TOKENS_LOTE)
+    parser.add_argument("--presupuesto-temas", type=int, default=PRESUPUESTO_TOKENS_TEMAS,
+                        help="Tokens de la muestra de cada grupo de temas (con --temas-muestra).")
+    parser.add_argument("--temas-muestra", action="store_true",
+                        help="Extraer los temas de una muestra en lugar de todos los tweets (map-reduce).")
+    parser.add_argument("--casi-duplicados", action="store_true", help="Agrupar también tweets casi iguales (MinHash).")
+    parser.add_argument("--umbral-duplicados", type=float, default=0.8)
+    parser.add_argument("--prefiltro-local", action="store_true",
+                        help="Clasificar primero con el modelo local y enviar a Gemini sólo los tweets dudosos.")
+    parser.add_argument("--umbral-prefiltro", type=float, default=UMBRAL_PREFILTRO)
+    parser.add_argument("--sin-almacen", action="store_true", help="No reutilizar ni guardar tweets en el almacén local.")
+    parser.add_argument("--sin-fusionar", action="store_true",
+                        help="Una ejecución de Apify por término, sin agrupar términos en la misma búsqueda.")
+    parser.add_argument("--sin-cache", action="store_true", help="No usar las cachés de sentimientos y de temas.")
+    parser.add_argument("--data-dir", default=os.environ.get("LISTENING_DATA_DIR", ".cache"),
+                        help="Directorio del almacén y la caché (por defecto LISTENING_DATA_DIR o .cache).")
+    parser.add_argument("--metricas", help="Escribir las métricas de la ejecución en este archivo (OpenMetrics).")
+    parser.add_argument("--verbose", action="store_true", help="Logs JSON de cada etapa y llamada en stderr.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s", stream=sys.stderr)
+    logging.getLogger("listening").setLevel(logging.DEBUG if args.verbose else logging.INFO)
+
+    apify_token = os.environ.get("APIFY_TOKEN")
+    gemini_api_key = os.environ.get("GEMINI_API_KEY")
+    if not apify_token or not gemini_api_key:
+        parser.error("Faltan las variables de entorno APIFY_TOKEN y/o GEMINI_API_KEY.")
+    if args.desde > args.hasta:
+        parser.error("--desde no puede ser posterior a --hasta.")
+    terms = leer_terminos(args.terminos)
+    if not terms:
+        parser.error(f"No hay términos en {args.terminos}.")
+
+    # Importaciones pesadas recién aquí, para que --help y los errores de uso sean inmediatos
+    import google.generativeai as genai
+    from apify_client import ApifyClient
+
+    from almacen_tweets import AlmacenTweets
+    from cache_sentimientos import CacheSentimientos
+    from cache_temas import CacheTemas
+    from clasificacion import nombre_modelo
+    from llm import MODELO_GEMINI, ClienteLLM, CubetaTokens
+    from scraping import obtener_tweets
+
+    genai.configure(api_key=gemini_api_key)
+    model = genai.GenerativeModel(args.modelo or MODELO_GEMINI)
+    apify_client = ApifyClient(apify_token)
+
+    parametros = {
+        "terms": terms,
+        "start_date": args.desde.isoformat(),
+        "end_date": args.hasta.isoformat(),
+        "contexto": args.contexto,
+        "orden": args.orden,
+        "usar_almacen": not args.sin_almacen,
+        "fusionar_terminos": not args.sin_fusionar,
+        "max_scrapers": args.max_scrapers,
+        "max_workers": args.max_workers,
+        "tokens_por_lote": args.tokens_por_lote,
+        "rpm": args.rpm,
+        "casi_duplicados": args.casi_duplicados,
+        "umbral_duplicados": args.umbral_duplicados,
+        "presupuesto_temas": args.presupuesto_temas,
+        "temas_completos": not args.temas_muestra,
+        "usar_cache": not args.sin_cache,
+        "prefiltro_local": args.prefiltro_local,
+        "umbral_prefiltro": args.umbral_prefiltro,
+        "modelo": nombre_modelo(model),
+    }
+
+    inicio = time.perf_counter()
+    resultado = ejecutar_analisis(
+        parametros,
+        lambda terminos, desde, hasta, orden, on_chunk, metricas: obtener_tweets(
+            apify_client, terminos, desde, hasta, orden, on_chunk=on_chunk, metricas=metricas
+        ),
+        ClienteLLM(model, limitador=CubetaTokens(args.rpm)),
+        cache=None if args.sin_cache else CacheSentimientos(os.path.join(args.data_dir, "sentimientos.sqlite3")),
+        almacen=None if args.sin_almacen else AlmacenTweets(os.path.join(args.data_dir, "tweets.sqlite3")),
+        on_progreso=mostrar_progreso,
+        cache_temas=None if args.sin_cache else CacheTemas(os.path.join(args.data_dir, "temas.sqlite3")),
+    )
+    guardar_resultado(resultado, args.salida)
+    if args.metricas:
+        with open(args.metricas, "w", encoding="utf-8") as f:
+            f.write(a_openmetrics(resultado["diagnostico"]))
+
+    for term, error in resultado["errores_scraping"].items():
+        print(f"Error al obtener datos de Twitter para '{term}': {error}", file=sys.stderr)
+    for aviso in resultado["avisos"]:
+        print(aviso, file=sys.stderr)
+    print(
+        f"{len(resultado['df']):,} tweets de {len(terms)} términos en {time.perf_counter() - inicio:.0f} s → {args.salida}",
+        file=sys.stderr,
+    )
+    # Código de salida distinto de cero si algún término falló, para el programador de tareas
+    return 1 if resultado["errores_scraping"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
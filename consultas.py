@@ -0,0 +1,186 @@
+# consultas.py
+
+"""
+Planificación de las búsquedas en Apify y atribución de tweets a términos.
+
+El actor acepta varios términos en `searchTerms`, así que en lugar de una
+ejecución por término (cada una con su arranque en frío y su propio
+`maxItems`) se agrupan varios términos en una sola ejecución, mientras el
+volumen estimado de todos entre en el presupuesto de items. Después, cada
+tweet devuelto se atribuye a los términos que coinciden con su texto; los
+que no coinciden con ninguno no se atribuyen (ver `separar_por_termino`).
+
+- Sólo se agrupan términos "simples": palabras, #hashtags, @menciones y
+  frases entre comillas. Los que usan operadores de búsqueda (`from:`, `OR`,
+  `-palabra`, paréntesis, ...) van solos, porque su coincidencia no se puede
+  comprobar mirando el texto.
+- Como en la búsqueda de Twitter, un término de varias palabras coincide si
+  el tweet tiene todas (en cualquier orden) y una frase entre comillas si
+  las tiene seguidas. Se compara sin mayúsculas ni tildes.
+- `BuscadorTerminos` es un autómata de Aho-Corasick sobre palabras (no
+  caracteres): una sola pasada por las palabras de cada tweet encuentra
+  todas las palabras y frases de todos los términos a la vez.
+"""
+
+import re
+import unicodedata
+from collections import deque
+
+
+MAX_TERMINOS_EJECUCION = 5
+# Si más de esta fracción de los tweets de una ejecución agrupada no coincide
+# con ningún término, el grupo se vuelve a buscar término por término
+MAX_FRACCION_SIN_ATRIBUIR = 0.1
+# Items que se suponen para un término sin historial en el almacén
+ESTIMACION_POR_DEFECTO = 2000
+
+_RE_OPERADOR = re.compile(r"(^|\s)(-|\()|\)|\b(OR|AND)\b|\w:\S")
+_RE_FRASE = re.compile(r'"([^"]+)"')
+_RE_PALABRA = re.compile(r"[#@]?\w+")
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize("NFD", str(texto).lower())
+    return "".join(c for c in texto if unicodedata.category(c) != "Mn")
+
+
+def _palabras(texto):
+    """Palabras normalizadas; un #hashtag o una @mención también cuenta como la palabra sola."""
+    palabras = []
+    for palabra in _RE_PALABRA.findall(_normalizar(texto)):
+        palabras.append(palabra)
+        if palabra[0] in "#@" and len(palabra) > 1:
+            palabras.append(palabra[1:])
+    return palabras
+
+
+def piezas_termino(termino):
+    """
+    Lo que un tweet debe contener para coincidir con `termino`: una tupla de
+    palabras por cada frase entre comillas y una de una palabra por cada
+    palabra suelta. None si el término usa operadores y no se puede agrupar.
+    """
+    if _RE_OPERADOR.search(termino) or termino.count('"') % 2:
+        return None
+    piezas = [tuple(_RE_PALABRA.findall(_normalizar(frase))) for frase in _RE_FRASE.findall(termino)]
+    piezas += [(palabra,) for palabra in _RE_PALABRA.findall(_normalizar(_RE_FRASE.sub(" ", termino)))]
+    piezas = [pieza for pieza in piezas if pieza]
+    return piezas or None
+
+
+class BuscadorTerminos:
+    """
+    Aho-Corasick sobre palabras para un conjunto de términos simples (ver
+    `piezas_termino`). `terminos_de(texto)` devuelve los términos que
+    coinciden, en el orden en que se pasaron.
+    """
+
+    def __init__(self, terminos):
+        self.terminos = list(terminos)
+        self._piezas = []  # por término, índices de sus piezas
+        piezas = {}
+        for termino in self.terminos:
+            indices = set()
+            for pieza in piezas_termino(termino) or ():
+                indices.add(piezas.setdefault(pieza, len(piezas)))
+            self._piezas.append(indices)
+
+        # Trie por palabras: transiciones, enlace de fallo y piezas que terminan en cada nodo
+        self._hijos = [{}]
+        self._fallo = [0]
+        self._salidas = [set()]
+        for pieza, indice in piezas.items():
+            nodo = 0
+            for palabra in pieza:
+                if palabra not in self._hijos[nodo]:
+                    self._hijos.append({})
+                    self._fallo.append(0)
+                    self._salidas.append(set())
+                    self._hijos[nodo][palabra] = len(self._hijos) - 1
+                nodo = self._hijos[nodo][palabra]
+            self._salidas[nodo].add(indice)
+
+        cola = deque(self._hijos[0].values())
+        while cola:
+            nodo = cola.popleft()
+            for palabra, hijo in self._hijos[nodo].items():
+                fallo = self._fallo[nodo]
+                while fallo and palabra not in self._hijos[fallo]:
+                    fallo = self._fallo[fallo]
+                destino = self._hijos[fallo].get(palabra, 0)
+                self._fallo[hijo] = destino if destino != hijo else 0
+                self._salidas[hijo] |= self._salidas[self._fallo[hijo]]
+                cola.append(hijo)
+
+    def piezas_en(self, texto):
+        encontradas = set()
+        nodo = 0
+        for palabra in _palabras(texto):
+            while nodo and palabra not in self._hijos[nodo]:
+                nodo = self._fallo[nodo]
+            nodo = self._hijos[nodo].get(palabra, 0)
+            if self._salidas[nodo]:
+                encontradas |= self._salidas[nodo]
+        return encontradas
+
+    def terminos_de(self, texto):
+        encontradas = self.piezas_en(texto)
+        return [termino for termino, piezas in zip(self.terminos, self._piezas) if piezas and piezas <= encontradas]
+
+
+def planificar_ejecuciones(terminos, estimaciones, presupuesto, max_terminos=MAX_TERMINOS_EJECUCION):
+    """
+    Agrupa `terminos` en la menor cantidad de ejecuciones del actor tal que
+    la suma de items estimados (`estimaciones[termino]`, o
+    `ESTIMACION_POR_DEFECTO` si falta) de cada grupo entre en `presupuesto` y
+    no tenga más de `max_terminos` términos (primer ajuste decreciente). Los
+    términos con operadores van solos. Devuelve una lista de listas.
+    """
+    grupos = []
+    cargas = []
+    simples = []
+    for termino in terminos:
+        if piezas_termino(termino) is None:
+            grupos.append([termino])
+            cargas.append(presupuesto)
+        else:
+            simples.append(termino)
+
+    def estimacion(termino):
+        valor = estimaciones.get(termino)
+        return ESTIMACION_POR_DEFECTO if valor is None else valor
+
+    for termino in sorted(simples, key=estimacion, reverse=True):
+        carga = estimacion(termino)
+        for i, grupo in enumerate(grupos):
+            if len(grupo) < max_terminos and cargas[i] + carga <= presupuesto and piezas_termino(grupo[0]) is not None:
+                grupo.append(termino)
+                cargas[i] += carga
+                break
+        else:
+            grupos.append([termino])
+            cargas.append(carga)
+    return grupos
+
+
+def separar_por_termino(df, terminos, buscador=None):
+    """
+    Reparte los tweets de una ejecución agrupada entre sus `terminos`: cada
+    tweet va a todos los términos con los que coincide su texto. Devuelve
+    `({termino: DataFrame}, sin_atribuir)`, con `sin_atribuir` el DataFrame
+    de los tweets que no coinciden con ninguno (el actor también busca en
+    nombres de usuario o enlaces). Esos no se asignan a ningún término: no
+    se puede saber de cuál son.
+    """
+    if df.empty:
+        return {termino: df.copy() for termino in terminos}, df.copy()
+    if 'text' not in df.columns:
+        return {termino: df.iloc[:0].copy() for termino in terminos}, df.copy()
+    buscador = buscador or BuscadorTerminos(terminos)
+    coincidencias = [buscador.terminos_de(texto) for texto in df['text'].fillna("").astype(str)]
+    partes = {}
+    for termino in terminos:
+        mascara = [termino in c for c in coincidencias]
+        partes[termino] = df[mascara].reset_index(drop=True)
+    sin_atribuir = df[[not c for c in coincidencias]].reset_index(drop=True)
+    return partes, sin_atribuir
@@ -0,0 +1,109 @@
+# duplicados.py
+
+"""
+Agrupación de tweets repetidos antes de clasificarlos.
+
+Retweets, campañas de copiar y pegar y oleadas de bots repiten el mismo texto
+muchas veces. Se clasifica un representante por grupo y su sentimiento se
+replica al resto de las filas del grupo.
+
+- Duplicados exactos: mismo texto tras normalizar (minúsculas, sin prefijo
+  "RT @usuario:", sin URLs ni espacios repetidos).
+- Casi duplicados (opcional): MinHash sobre shingles de caracteres con LSH por
+  bandas; dos textos se agrupan si su similitud de Jaccard estimada supera el
+  umbral.
+"""
+
+import hashlib
+import re
+
+import numpy as np
+
+
+_RE_RT = re.compile(r"^rt\s+@\w+:?\s*")
+_RE_URL = re.compile(r"https?://\S+")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+_PRIMO = (1 << 31) - 1
+
+
+def normalizar_para_duplicados(texto):
+    """Normaliza un tweet para comparar textos repetidos."""
+    texto = str(texto).lower().strip()
+    texto = _RE_RT.sub("", texto)
+    texto = _RE_URL.sub("", texto)
+    return _RE_ESPACIOS.sub(" ", texto).strip()
+
+
+def _hash32(texto):
+    return int.from_bytes(hashlib.blake2b(texto.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+class AgrupadorDuplicados:
+    """
+    Asigna un grupo a cada texto agregado, de forma incremental.
+
+    `agregar(texto)` devuelve `(grupo, es_nuevo)`; el primer texto de cada grupo
+    es su representante.
+    """
+
+    def __init__(self, casi_duplicados=False, umbral=0.8, num_permutaciones=64, bandas=16, tam_shingle=5, semilla=42):
+        if num_permutaciones % bandas:
+            raise ValueError("num_permutaciones debe ser múltiplo de bandas")
+        self.casi_duplicados = casi_duplicados
+        self.umbral = umbral
+        self.bandas = bandas
+        self.filas_por_banda = num_permutaciones // bandas
+        self.tam_shingle = tam_shingle
+
+        rng = np.random.default_rng(semilla)
+        self._a = rng.integers(1, _PRIMO, size=num_permutaciones, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIMO, size=num_permutaciones, dtype=np.uint64)
+
+        self._grupo_por_texto = {}
+        # Firmas MinHash de los representantes (fila = grupo), con capacidad que se duplica
+        self._firmas = np.zeros((1024 if casi_duplicados else 0, num_permutaciones), dtype=np.uint64)
+        self._buckets = [{} for _ in range(bandas)]
+        self.num_grupos = 0
+
+    def _firma(self, texto):
+        k = self.tam_shingle
+        shingles = {texto[i:i + k] for i in range(max(1, len(texto) - k + 1))}
+        hashes = np.fromiter((_hash32(s) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # Permutaciones universales (a*x + b) mod p; a, x < 2^32 no desbordan uint64
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIMO).min(axis=1)
+
+    def _claves_bandas(self, firma):
+        r = self.filas_por_banda
+        return [firma[i * r:(i + 1) * r].tobytes() for i in range(self.bandas)]
+
+    def agregar(self, texto):
+        normalizado = normalizar_para_duplicados(texto)
+        grupo = self._grupo_por_texto.get(normalizado)
+        if grupo is not None:
+            return grupo, False
+
+        if self.casi_duplicados and normalizado:
+            firma = self._firma(normalizado)
+            bandas = self._claves_bandas(firma)
+            candidatos = {g for banda, clave in zip(self._buckets, bandas) for g in banda.get(clave, ())}
+            if candidatos:
+                candidatos = np.array(sorted(candidatos))
+                similitudes = (self._firmas[candidatos] == firma).mean(axis=1)
+                similares = np.flatnonzero(similitudes >= self.umbral)
+                if len(similares):
+                    candidato = int(candidatos[similares[0]])
+                    self._grupo_por_texto[normalizado] = candidato
+                    return candidato, False
+
+        grupo = self.num_grupos
+        self.num_grupos += 1
+        self._grupo_por_texto[normalizado] = grupo
+        if self.casi_duplicados and normalizado:
+            if grupo >= len(self._firmas):
+                self._firmas = np.concatenate([self._firmas, np.zeros_like(self._firmas)])
+            self._firmas[grupo] = firma
+            for banda, clave in zip(self._buckets, bandas):
+                banda.setdefault(clave, []).append(grupo)
+        return grupo, True
+
@@ -0,0 +1,100 @@
+# esquema.py
+
+"""
+Esquema tipado del DataFrame de tweets.
+
+Todas las etapas (scraping, almacén local, clasificación y dashboard) trabajan
+sobre las mismas columnas con los mismos tipos, para no volver a convertirlas
+en cada agregación:
+
+- contadores como enteros (`int64` para vistas y seguidores, `int32` para el resto),
+- `createdAt` como fecha con zona horaria (UTC),
+- `source`, `search_term` y `sentimiento` como categóricas.
+
+`search_term` es el primer término que trajo el tweet; `search_terms` (una
+lista por fila) tiene todos los términos con los que coincide.
+"""
+
+import pandas as pd
+
+
+# Columnas que usa el dashboard, en el orden en que se muestran
+COLUMNAS = ['author/profilePicture','text', 'createdAt', 'author/userName', 'author/followers', 'url', 'likeCount',
+            'replyCount', 'retweetCount', 'quoteCount', 'bookmarkCount', 'viewCount', 'source']
+
+# Campos de primer nivel que se piden al dataset de Apify (el resto no se descarga)
+CAMPOS_APIFY = ['text', 'createdAt', 'author', 'url', 'likeCount', 'replyCount', 'retweetCount',
+                'quoteCount', 'bookmarkCount', 'viewCount', 'source']
+
+CAMPOS_AUTOR = ['profilePicture', 'followers', 'userName']
+
+CONTADORES = {
+    'author/followers': 'int64',
+    'viewCount': 'int64',
+    'likeCount': 'int32',
+    'replyCount': 'int32',
+    'retweetCount': 'int32',
+    'quoteCount': 'int32',
+    'bookmarkCount': 'int32',
+}
+
+# Contadores que suman como interacciones (todos menos vistas y seguidores)
+CONTADORES_INTERACCION = ['likeCount', 'replyCount', 'retweetCount', 'quoteCount', 'bookmarkCount']
+
+CATEGORICAS = ['source', 'search_term', 'sentimiento']
+
+SENTIMIENTOS = ["POSITIVO", "NEGATIVO", "NEUTRO"]
+
+# Formato de fecha de la API de Twitter, p. ej. "Fri Nov 24 17:49:36 +0000 2023"
+FORMATO_FECHA_TWITTER = "%a %b %d %H:%M:%S %z %Y"
+
+
+def parsear_fechas(serie):
+    """Convierte a datetime UTC; prueba primero el formato de Twitter y luego cualquier otro."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return pd.to_datetime(serie, utc=True)
+    fechas = pd.to_datetime(serie, format=FORMATO_FECHA_TWITTER, errors='coerce', utc=True)
+    faltantes = fechas.isna() & serie.notna()
+    if faltantes.any():
+        fechas[faltantes] = pd.to_datetime(serie[faltantes], format='mixed', errors='coerce', utc=True)
+    return fechas
+
+
+def aplicar_esquema(df):
+    """
+    Convierte las columnas presentes de `df` a los tipos del esquema y
+    devuelve el DataFrame. Se puede aplicar más de una vez (por ejemplo,
+    después de `pd.concat`, que pierde las categorías).
+    """
+    if df.empty:
+        return df
+    for columna, tipo in CONTADORES.items():
+        if columna in df.columns and df[columna].dtype != tipo:
+            df[columna] = pd.to_numeric(df[columna], errors='coerce').fillna(0).astype(tipo)
+    if 'createdAt' in df.columns:
+        df['createdAt'] = parsear_fechas(df['createdAt'])
+    for columna in CATEGORICAS:
+        if columna in df.columns:
+            if columna == 'sentimiento':
+                df[columna] = pd.Categorical(df[columna], categories=SENTIMIENTOS)
+            elif not isinstance(df[columna].dtype, pd.CategoricalDtype):
+                df[columna] = df[columna].astype('category')
+    return df
+
+
+def aplanar_items(items):
+    """
+    Convierte una página de items de Apify en un DataFrame tipado con sólo las
+    columnas de `COLUMNAS`, en una pasada: `from_records` para los campos de
+    primer nivel y otra para los del autor, sin `apply` fila a fila.
+    """
+    registros = pd.DataFrame.from_records(items, columns=CAMPOS_APIFY)
+    autores = pd.DataFrame.from_records(
+        [autor if isinstance(autor, dict) else {} for autor in registros['author']],
+        columns=CAMPOS_AUTOR,
+    )
+    df = pd.DataFrame({
+        columna: (autores[columna[len('author/'):]] if columna.startswith('author/') else registros[columna]).to_numpy()
+        for columna in COLUMNAS
+    })
+    return aplicar_esquema(df)
@@ -0,0 +1,173 @@
+# exportacion.py
+
+"""
+Exportación de los resultados de una ejecución.
+
+Los tweets se escriben por bloques de `FILAS_POR_BLOQUE` filas directo a un
+archivo, sin armar el archivo entero (ni una copia del DataFrame) en memoria:
+
+- Parquet (tipado, comprimido con zstd), un grupo de filas por bloque. Los
+  temas, avisos, estadísticas y parámetros van en los metadatos del archivo
+  (clave `listening`), así un solo archivo lleva todo.
+- CSV comprimido con gzip. La lista `search_terms` se escribe unida con
+  `SEPARADOR_TERMINOS` (`banco|galicia`), que cualquier herramienta puede
+  separar, en lugar de la representación de Python de la lista.
+- JSONL (una línea por tweet), con `search_terms` como arreglo JSON.
+
+Los temas y metadatos también se pueden exportar solos en JSON
+(`escribir_resumen`), que es lo que acompaña al CSV y al JSONL.
+
+`exportar_memoizado` guarda cada exportación en un directorio con el nombre
+de la ejecución (huella + trabajo), así se genera una sola vez por resultado
+y formato aunque la página se vuelva a ejecutar o la pidan varias sesiones.
+"""
+
+import gzip
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+FILAS_POR_BLOQUE = 10_000
+MAX_EXPORTACIONES = 40
+SEPARADOR_TERMINOS = "|"
+
+# formato -> (extensión, tipo MIME)
+FORMATOS = {
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "jsonl": (".jsonl", "application/x-ndjson"),
+    "json": (".json", "application/json"),
+}
+
+
+def formato_de_ruta(path):
+    for formato, (extension, _) in FORMATOS.items():
+        if path.endswith(extension):
+            return formato
+    raise ValueError(f"Extensión de salida no soportada: {path} (usa {', '.join(e for e, _ in FORMATOS.values())})")
+
+
+def metadatos(resultado):
+    """Todo el resultado menos los tweets: parámetros, temas, rankings, avisos, estadísticas y diagnóstico."""
+    datos = {clave: valor for clave, valor in resultado.items() if clave != "df"}
+    if resultado.get("rankings") is not None:
+        datos["rankings"] = {
+            nombre: tabla.astype(object).where(tabla.notna(), None).to_dict("records")
+            for nombre, tabla in resultado["rankings"].tablas().items()
+        }
+    datos["tweets"] = len(resultado["df"])
+    datos["exportado"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    return datos
+
+
+def _json(datos, **kwargs):
+    return json.dumps(datos, ensure_ascii=False, default=str, **kwargs)
+
+
+def _bloques(df, filas=FILAS_POR_BLOQUE):
+    # Los cortes con iloc son vistas: no copian el DataFrame
+    for inicio in range(0, len(df), filas):
+        yield df.iloc[inicio:inicio + filas]
+
+
+def escribir_parquet(df, path, datos=None):
+    """Escribe `df` en Parquet por grupos de filas, con `datos` (JSON) en los metadatos del archivo."""
+    # El esquema se infiere sobre todo el DataFrame (una columna vacía en el
+    # primer bloque no debe fijar su tipo como nulo)
+    esquema = pa.Schema.from_pandas(df, preserve_index=False)
+    if datos is not None:
+        esquema = esquema.with_metadata({**(esquema.metadata or {}), b"listening": _json(datos).encode("utf-8")})
+    with pq.ParquetWriter(path, esquema, compression="zstd") as escritor:
+        for bloque in _bloques(df):
+            escritor.write_table(pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False))
+
+
+def _unir_terminos(terminos):
+    if isinstance(terminos, (list, tuple)):
+        return SEPARADOR_TERMINOS.join(map(str, terminos))
+    return terminos
+
+
+def escribir_csv_gz(df, path):
+    with gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6) as f:
+        if df.empty:
+            df.to_csv(f, index=False)
+        for i, bloque in enumerate(_bloques(df)):
+            if 'search_terms' in bloque.columns:
+                # Sólo se copia el bloque, no el DataFrame
+                bloque = bloque.assign(search_terms=bloque['search_terms'].map(_unir_terminos))
+            bloque.to_csv(f, index=False, header=i == 0)
+
+
+def escribir_jsonl(df, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for bloque in _bloques(df):
+            bloque.to_json(f, orient="records", lines=True, date_format="iso", force_ascii=False)
+
+
+def escribir_resumen(resultado, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(_json(metadatos(resultado), indent=2))
+
+
+def exportar(resultado, path, formato=None):
+    """
+    Exporta `resultado` (el dict de `pipeline.ejecutar_analisis`) a `path`
+    en `formato` (por defecto, según la extensión). Escribe en un temporal y
+    lo renombra al final, así nunca queda un archivo a medias.
+    """
+    formato = formato or formato_de_ruta(path)
+    directorio = os.path.dirname(path)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    temporal = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        if formato == "parquet":
+            escribir_parquet(resultado["df"], temporal, metadatos(resultado))
+        elif formato == "csv.gz":
+            escribir_csv_gz(resultado["df"], temporal)
+        elif formato == "jsonl":
+            escribir_jsonl(resultado["df"], temporal)
+        elif formato == "json":
+            escribir_resumen(resultado, temporal)
+        else:
+            raise ValueError(f"Formato de exportación desconocido: {formato}")
+        os.replace(temporal, path)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    return path
+
+
+def ruta_exportacion(directorio, clave, formato):
+    return os.path.join(directorio, clave + FORMATOS[formato][0])
+
+
+def exportar_memoizado(resultado, directorio, clave, formato):
+    """
+    Ruta de la exportación de `resultado` en `formato`, generándola sólo si
+    todavía no existe. `clave` identifica la ejecución (p. ej. huella + ID
+    del trabajo). Se conservan las `MAX_EXPORTACIONES` más recientes.
+    """
+    path = ruta_exportacion(directorio, clave, formato)
+    if not os.path.exists(path):
+        exportar(resultado, path, formato)
+        _purgar(directorio)
+    return path
+
+
+def _purgar(directorio, maximo=MAX_EXPORTACIONES):
+    archivos = [
+        os.path.join(directorio, nombre) for nombre in os.listdir(directorio) if not nombre.endswith(".tmp")
+    ]
+    archivos.sort(key=os.path.getmtime, reverse=True)
+    for path in archivos[maximo:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,275 @@
+# llm.py
+
+"""
+Cliente compartido para las llamadas a Gemini.
+
+`ClienteLLM` envuelve un `GenerativeModel` y expone el mismo
+`generate_content`, agregando para todos los que lo usan (clasificación y
+temas, desde varios hilos):
+
+- un limitador de cubeta de tokens compartido (`CubetaTokens`), que baja el
+  ritmo a la mitad ante errores de cuota (429) y lo recupera de a poco con
+  las respuestas exitosas;
+- reintentos con espera exponencial y jitter, sólo para errores transitorios
+  (cuota, 5xx, timeouts, conexión); los errores del pedido en sí (clave
+  inválida, prompt rechazado, ...) se propagan enseguida;
+- un cortocircuito (`Circuito`) que, tras varios fallos transitorios seguidos,
+  deja de llamar a la API durante un tiempo y después prueba con una sola
+  llamada antes de reabrir el paso.
+
+Así, bajo presión de cuota el rendimiento baja de forma gradual en lugar de
+perder lotes enteros.
+"""
+
+import copy
+import random
+import threading
+import time
+
+
+MODELO_GEMINI = "gemini-2.0-flash"
+
+REINTENTOS_LLM = 5
+ESPERA_BASE = 1.0
+ESPERA_MAXIMA = 60.0
+# Tiempo máximo que una llamada puede pasar entre reintentos y esperas
+PLAZO_LLAMADA = 300.0
+
+FALLOS_PARA_ABRIR = 5
+ENFRIAMIENTO = 30.0
+
+CODIGOS_TRANSITORIOS = {408, 429, 500, 502, 503, 504}
+_NOMBRES_TRANSITORIOS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "GatewayTimeout", "BadGateway",
+}
+_NOMBRES_CUOTA = {"ResourceExhausted", "TooManyRequests"}
+
+
+class CircuitoAbierto(RuntimeError):
+    """La API viene fallando y el cortocircuito no dejó pasar la llamada a tiempo."""
+
+
+def es_error_de_cuota(error):
+    return getattr(error, "code", None) == 429 or type(error).__name__ in _NOMBRES_CUOTA
+
+
+def es_transitorio(error):
+    """Si vale la pena reintentar: cuota, errores del servidor, timeouts o conexión."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # Las excepciones de google.api_core traen el código HTTP en `code`
+    return getattr(error, "code", None) in CODIGOS_TRANSITORIOS or type(error).__name__ in _NOMBRES_TRANSITORIOS
+
+
+def uso_de_tokens(response):
+    """Tokens de entrada y salida informados por la API, o None si no vienen."""
+    uso = getattr(response, "usage_metadata", None)
+    if uso is None:
+        return None
+    return {"entrada": getattr(uso, "prompt_token_count", None), "salida": getattr(uso, "candidates_token_count", None)}
+
+
+class CubetaTokens:
+    """
+    Limitador de peticiones por minuto con cubeta de tokens, seguro para varios
+    hilos. Permite ráfagas cortas (`rafaga` llamadas) y reparte el resto de
+    forma uniforme. Con `rpm` vacío o 0 no limita.
+
+    `reducir()` (ante un 429) baja el ritmo a la mitad y `aumentar()` lo
+    recupera de a un 5% del máximo por respuesta exitosa. `configurar(rpm)`
+    cambia el máximo sin crear otra cubeta.
+    """
+
+    def __init__(self, rpm=None, rafaga=None):
+        self.rpm_maximo = rpm or 0
+        self.rpm = self.rpm_maximo
+        self._rafaga = rafaga
+        self.capacidad = rafaga or max(1, self.rpm_maximo // 12)
+        self._tokens = float(self.capacidad)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _recargar(self, ahora):
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.rpm / 60.0)
+        self._ultimo = ahora
+
+    def adquirir(self):
+        """Bloquea hasta que haya un token disponible."""
+        if not self.rpm_maximo:
+            return
+        while True:
+            with self._lock:
+                if not self.rpm_maximo:
+                    return
+                ahora = time.monotonic()
+                self._recargar(ahora)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) * 60.0 / self.rpm
+            time.sleep(espera)
+
+    def configurar(self, rpm):
+        """
+        Cambia el máximo de peticiones por minuto. Si el ritmo estaba reducido
+        por errores de cuota, se mantiene la misma proporción del nuevo máximo.
+        """
+        rpm = rpm or 0
+        with self._lock:
+            if rpm == self.rpm_maximo:
+                return
+            self._recargar(time.monotonic())
+            fraccion = self.rpm / self.rpm_maximo if self.rpm_maximo else 1.0
+            self.rpm_maximo = rpm
+            self.rpm = rpm * fraccion
+            self.capacidad = self._rafaga or max(1, rpm // 12)
+            self._tokens = min(self._tokens, self.capacidad)
+
+    def reducir(self):
+        if not self.rpm_maximo:
+            return
+        with self._lock:
+            self._recargar(time.monotonic())
+            self.rpm = max(self.rpm_maximo / 16, self.rpm / 2)
+
+    def aumentar(self):
+        if not self.rpm_maximo or self.rpm >= self.rpm_maximo:
+            return
+        with self._lock:
+            self._recargar(time.monotonic())
+            self.rpm = min(self.rpm_maximo, self.rpm + self.rpm_maximo / 20)
+
+
+class Circuito:
+    """
+    Cortocircuito compartido. Cerrado: deja pasar todo. Tras
+    `fallos_para_abrir` fallos transitorios seguidos se abre durante
+    `enfriamiento` segundos; después deja pasar una sola llamada de prueba,
+    que lo cierra si sale bien o lo vuelve a abrir si falla.
+    """
+
+    def __init__(self, fallos_para_abrir=FALLOS_PARA_ABRIR, enfriamiento=ENFRIAMIENTO):
+        self.fallos_para_abrir = fallos_para_abrir
+        self.enfriamiento = enfriamiento
+        self._fallos = 0
+        self._abierto_hasta = 0.0
+        self._probando = False
+        self._lock = threading.Lock()
+
+    @property
+    def abierto(self):
+        return self._fallos >= self.fallos_para_abrir
+
+    def esperar(self, limite):
+        """
+        Bloquea mientras el circuito esté abierto. Lanza `CircuitoAbierto` si
+        no se puede pasar antes de `limite` (según `time.monotonic()`).
+        """
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                if not self.abierto:
+                    return
+                if ahora >= self._abierto_hasta and not self._probando:
+                    self._probando = True
+                    return
+                espera = max(self._abierto_hasta - ahora, 0.5)
+            if ahora + espera > limite:
+                raise CircuitoAbierto("La API de Gemini no responde; se dejó de reintentar por un momento.")
+            time.sleep(espera)
+
+    def exito(self):
+        with self._lock:
+            self._fallos = 0
+            self._probando = False
+
+    def fallo(self):
+        with self._lock:
+            self._fallos += 1
+            self._probando = False
+            if self.abierto:
+                self._abierto_hasta = time.monotonic() + self.enfriamiento
+
+
+class ClienteLLM:
+    """
+    Envoltorio de un modelo de Gemini con limitador, reintentos y
+    cortocircuito. Se usa igual que el modelo (`generate_content`), así que
+    se puede pasar a `clasificacion` y `temas` en su lugar.
+
+    `limitador` y `circuito` se pueden compartir entre varios clientes (por
+    ejemplo, entre sesiones que usan la misma API Key). `para(etapa,
+    metricas)` devuelve una vista del mismo cliente que además registra cada
+    llamada (latencia, tokens, reintentos) en `metricas` bajo esa etapa.
+    """
+
+    def __init__(self, model, limitador=None, circuito=None, reintentos=REINTENTOS_LLM,
+                 espera_base=ESPERA_BASE, espera_maxima=ESPERA_MAXIMA, plazo=PLAZO_LLAMADA, metricas=None):
+        self.model = model
+        self.limitador = limitador or CubetaTokens()
+        self.circuito = circuito or Circuito()
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.plazo = plazo
+        self.metricas = metricas
+        self.etapa = None
+        self.estadisticas = {"llamadas": 0, "reintentos": 0, "errores_cuota": 0, "tokens_entrada": 0, "tokens_salida": 0}
+        self._lock = threading.Lock()
+
+    def para(self, etapa, metricas=None):
+        """
+        Vista del cliente para una etapa (p. ej. "clasificacion" o "temas").
+        Comparte limitador, cortocircuito y `estadisticas` con el original.
+        """
+        vista = copy.copy(self)
+        vista.etapa = etapa
+        vista.metricas = metricas if metricas is not None else self.metricas
+        return vista
+
+    @property
+    def model_name(self):
+        return getattr(self.model, "model_name", None) or type(self.model).__name__
+
+    def _contar(self, clave, valor=1):
+        with self._lock:
+            self.estadisticas[clave] += valor
+        if self.metricas is not None:
+            self.metricas.contar(f"llm_{clave}", valor, etapa=self.etapa)
+
+    def generate_content(self, *args, **kwargs):
+        limite = time.monotonic() + self.plazo
+        for intento in range(self.reintentos + 1):
+            self.circuito.esperar(limite)
+            self.limitador.adquirir()
+            self._contar("llamadas")
+            inicio = time.perf_counter()
+            try:
+                respuesta = self.model.generate_content(*args, **kwargs)
+            except Exception as e:
+                if self.metricas is not None:
+                    self.metricas.registrar("llm_error", time.perf_counter() - inicio, detalle=self.etapa)
+                if not es_transitorio(e):
+                    # La API respondió: el problema es del pedido, no del servicio
+                    self.circuito.exito()
+                    raise
+                self.circuito.fallo()
+                if es_error_de_cuota(e):
+                    self._contar("errores_cuota")
+                    self.limitador.reducir()
+                # Espera exponencial con jitter completo
+                espera = random.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** intento))
+                if intento == self.reintentos or time.monotonic() + espera > limite:
+                    raise
+                self._contar("reintentos")
+                time.sleep(espera)
+            else:
+                self.circuito.exito()
+                self.limitador.aumentar()
+                uso = uso_de_tokens(respuesta) or {}
+                self._contar("tokens_entrada", uso.get("entrada") or 0)
+                self._contar("tokens_salida", uso.get("salida") or 0)
+                if self.metricas is not None:
+                    self.metricas.registrar("llm", time.perf_counter() - inicio, detalle=self.etapa)
+                return respuesta
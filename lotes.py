@@ -0,0 +1,111 @@
+# lotes.py
+
+"""
+Tamaño de lote adaptativo para la clasificación con Gemini.
+
+En lugar de una cantidad fija de tweets por prompt, cada lote se llena hasta
+un presupuesto de tokens (los tweets van de 10 a 280 caracteres, así que 50
+tweets pueden ser un prompt corto o uno muy largo). El presupuesto se ajusta
+con AIMD, como el control de congestión de TCP:
+
+- si la respuesta vuelve completa, el presupuesto crece de a `INCREMENTO_TOKENS`;
+- si faltan tweets, hay un timeout o un error de cuota, se reduce a la mitad.
+
+Cada llamada queda registrada (tweets, tokens, latencia, resultado) para
+poder elegir el tamaño óptimo con datos.
+"""
+
+import threading
+
+from muestreo import estimar_tokens
+
+
+PRESUPUESTO_TOKENS_LOTE = 3000
+MIN_TOKENS_LOTE = 400
+MAX_TOKENS_LOTE = 16000
+INCREMENTO_TOKENS = 500
+MAX_TWEETS_LOTE = 200
+
+# Tokens por tweet además de su texto: "Tweet N:" en el prompt y el objeto JSON de la respuesta
+TOKENS_POR_TWEET = 15
+
+
+def tokens_tweet(texto):
+    """Costo estimado de un tweet dentro de un lote (entrada y salida)."""
+    return estimar_tokens(texto) + TOKENS_POR_TWEET
+
+
+class LoteAdaptativo:
+    """
+    Presupuesto de tokens por lote que crece mientras las respuestas llegan
+    completas y se reduce a la mitad ante fallos. Seguro para varios hilos.
+    """
+
+    def __init__(self, presupuesto_tokens=PRESUPUESTO_TOKENS_LOTE, minimo=MIN_TOKENS_LOTE,
+                 maximo=MAX_TOKENS_LOTE, max_tweets=MAX_TWEETS_LOTE):
+        self.minimo = minimo
+        self.maximo = max(minimo, maximo)
+        self.presupuesto = min(max(presupuesto_tokens, minimo), self.maximo)
+        self.max_tweets = max(1, max_tweets)
+        self.historial = []
+        self._lock = threading.Lock()
+
+    def tamano_siguiente(self, costos):
+        """
+        Cuántos elementos del principio de `costos` (tokens por tweet) entran en
+        el próximo lote. Siempre al menos uno.
+        """
+        total = 0
+        for i, costo in enumerate(costos[:self.max_tweets]):
+            total += costo
+            if total > self.presupuesto and i > 0:
+                return i
+        return min(len(costos), self.max_tweets)
+
+    def lleno(self, tokens_pendientes, tweets_pendientes):
+        """Si lo pendiente ya alcanza para un lote completo."""
+        return tokens_pendientes >= self.presupuesto or tweets_pendientes >= self.max_tweets
+
+    def registrar(self, tweets, tokens_estimados, latencia, resueltos, error=None, uso=None):
+        """
+        Registra una llamada y ajusta el presupuesto. `uso` es el conteo de
+        tokens informado por la API (`{"entrada": ..., "salida": ...}`), si lo hay.
+        """
+        completo = error is None and resueltos == tweets
+        with self._lock:
+            if completo:
+                self.presupuesto = min(self.maximo, self.presupuesto + INCREMENTO_TOKENS)
+            else:
+                self.presupuesto = max(self.minimo, self.presupuesto // 2)
+            self.historial.append({
+                "tweets": tweets,
+                "tokens_estimados": tokens_estimados,
+                "tokens_entrada": (uso or {}).get("entrada"),
+                "tokens_salida": (uso or {}).get("salida"),
+                "latencia": latencia,
+                "resueltos": resueltos,
+                "error": type(error).__name__ if error is not None else None,
+                "presupuesto_siguiente": self.presupuesto,
+            })
+
+    def resumen(self, ancho=25):
+        """
+        Estadísticas por rango de tamaño de lote (de a `ancho` tweets): llamadas,
+        latencia media, tweets por segundo y proporción de fallos.
+        """
+        with self._lock:
+            historial = list(self.historial)
+        rangos = {}
+        for llamada in historial:
+            rangos.setdefault((llamada["tweets"] - 1) // ancho, []).append(llamada)
+        filas = []
+        for rango, llamadas in sorted(rangos.items()):
+            latencia = sum(l["latencia"] for l in llamadas)
+            filas.append({
+                "tweets_por_lote": f"{rango * ancho + 1}-{(rango + 1) * ancho}",
+                "llamadas": len(llamadas),
+                "latencia_media_s": round(latencia / len(llamadas), 2),
+                "tweets_por_segundo": round(sum(l["resueltos"] for l in llamadas) / latencia, 1) if latencia else None,
+                "fallos": round(sum(l["error"] is not None or l["resueltos"] < l["tweets"] for l in llamadas) / len(llamadas), 2),
+            })
+        return filas
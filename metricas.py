@@ -0,0 +1,134 @@
+# metricas.py
+
+"""
+Instrumentación de una ejecución del análisis: cuánto tarda cada etapa
+(espera del actor de Apify, descarga de páginas, normalización, llamadas a
+Gemini por etapa, temas, ...), cuántos items procesa y cuántos tokens y
+reintentos consume.
+
+`Metricas` se crea una vez por ejecución y se pasa a quien quiera medir
+(`scraping.obtener_tweets`, `llm.ClienteLLM.para`, `pipeline`). Es segura
+para varios hilos. Cada medición también se emite como log estructurado
+(una línea JSON en el logger `listening.metricas`, nivel DEBUG) y el
+conjunto se puede exportar en formato OpenMetrics para Prometheus.
+
+Lo que se guarda en el resultado es `resumen()` (dicts y números), no el
+objeto, para que se pueda serializar con el resto del trabajo.
+"""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+
+logger = logging.getLogger("listening.metricas")
+
+PREFIJO_OPENMETRICS = "listening"
+
+
+class Metricas:
+    """Duraciones por etapa (y detalle opcional, p. ej. el término) y contadores por etapa."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (etapa, detalle) -> {"veces", "total_s", "max_s", "items"}
+        self._duraciones = {}
+        # (nombre, etapa) -> valor
+        self._contadores = {}
+
+    def registrar(self, etapa, duracion, items=0, detalle=None):
+        with self._lock:
+            fila = self._duraciones.setdefault((etapa, detalle), {"veces": 0, "total_s": 0.0, "max_s": 0.0, "items": 0})
+            fila["veces"] += 1
+            fila["total_s"] += duracion
+            fila["max_s"] = max(fila["max_s"], duracion)
+            fila["items"] += items or 0
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps(
+                {"evento": "etapa", "etapa": etapa, "detalle": detalle, "duracion_s": round(duracion, 4), "items": items},
+                ensure_ascii=False,
+            ))
+
+    def contar(self, nombre, valor=1, etapa=None):
+        if not valor:
+            return
+        with self._lock:
+            clave = (nombre, etapa)
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    @contextmanager
+    def medir(self, etapa, detalle=None):
+        """
+        Mide el bloque `with`. Devuelve un dict en el que el bloque puede
+        anotar `items` (cuántos elementos procesó).
+        """
+        anotacion = {"items": 0}
+        inicio = time.perf_counter()
+        try:
+            yield anotacion
+        finally:
+            self.registrar(etapa, time.perf_counter() - inicio, anotacion["items"], detalle)
+
+    def resumen(self):
+        """
+        `{"etapas": [...], "contadores": [...]}` con una fila por etapa y
+        detalle (veces, total, media y máximo en segundos, items) y una por
+        contador y etapa.
+        """
+        with self._lock:
+            duraciones = {clave: dict(fila) for clave, fila in self._duraciones.items()}
+            contadores = dict(self._contadores)
+        etapas = []
+        for (etapa, detalle), fila in duraciones.items():
+            etapas.append({
+                "etapa": etapa,
+                "detalle": detalle,
+                "veces": fila["veces"],
+                "total_s": round(fila["total_s"], 3),
+                "media_s": round(fila["total_s"] / fila["veces"], 3),
+                "max_s": round(fila["max_s"], 3),
+                "items": fila["items"],
+            })
+        return {
+            "etapas": etapas,
+            "contadores": [
+                {"contador": nombre, "etapa": etapa, "valor": valor}
+                for (nombre, etapa), valor in sorted(contadores.items(), key=lambda c: (c[0][0], c[0][1] or ""))
+            ],
+        }
+
+
+def _etiquetas(**etiquetas):
+    partes = []
+    for clave, valor in etiquetas.items():
+        if valor is None:
+            continue
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        partes.append(f'{clave}="{valor}"')
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def a_openmetrics(resumen, prefijo=PREFIJO_OPENMETRICS):
+    """Texto en formato OpenMetrics (terminado en `# EOF`) a partir de `Metricas.resumen()`."""
+    lineas = [
+        f"# TYPE {prefijo}_etapa_segundos summary",
+        f"# UNIT {prefijo}_etapa_segundos seconds",
+    ]
+    for fila in resumen["etapas"]:
+        etiquetas = _etiquetas(etapa=fila["etapa"], detalle=fila["detalle"])
+        lineas.append(f"{prefijo}_etapa_segundos_count{etiquetas} {fila['veces']}")
+        lineas.append(f"{prefijo}_etapa_segundos_sum{etiquetas} {fila['total_s']}")
+    lineas.append(f"# TYPE {prefijo}_etapa_items counter")
+    for fila in resumen["etapas"]:
+        etiquetas = _etiquetas(etapa=fila["etapa"], detalle=fila["detalle"])
+        lineas.append(f"{prefijo}_etapa_items_total{etiquetas} {fila['items']}")
+    nombres = list(dict.fromkeys(c["contador"] for c in resumen["contadores"]))
+    for nombre in nombres:
+        lineas.append(f"# TYPE {prefijo}_{nombre} counter")
+        for c in resumen["contadores"]:
+            if c["contador"] == nombre:
+                lineas.append(f"{prefijo}_{nombre}_total{_etiquetas(etapa=c['etapa'])} {c['valor']}")
+    lineas.append("# EOF")
+    return "\n".join(lineas) + "\n"
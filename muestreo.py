@@ -0,0 +1,166 @@
+# muestreo.py
+
+"""
+Muestra representativa de tweets para los prompts de temas.
+
+En lugar de los primeros N tweets en el orden de Apify, se elige una muestra
+diversa que entra en un presupuesto de tokens:
+
+1. Se descartan textos repetidos (quedándose con la copia de más interacción,
+   y contando cuántas veces se repitió).
+2. Se reparte la muestra entre franjas de tiempo, en proporción a la
+   cantidad de tweets de cada franja.
+3. En cada franja se agrupan los candidatos con k-means sobre vectores
+   TF-IDF con hashing, y de cada grupo se toma el medoide (el tweet más
+   cercano al centro), priorizando los de más vistas e interacciones.
+4. La muestra se recorta al presupuesto de tokens.
+"""
+
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from duplicados import normalizar_para_duplicados
+
+
+PRESUPUESTO_TOKENS_TEMAS = 12000
+FRANJAS_TIEMPO = 8
+DIMENSION_VECTORES = 512
+
+_RE_PALABRA = re.compile(r"\w{3,}")
+
+
+# Tokens extra por línea del prompt (comillas, usuario, repeticiones)
+TOKENS_POR_LINEA = 10
+
+
+def estimar_tokens(texto):
+    """Aproximación barata: ~4 caracteres por token."""
+    return max(1, len(texto) // 4)
+
+
+def _puntaje_interaccion(df):
+    interacciones = sum(
+        df[col].fillna(0).astype('float64') for col in ['likeCount', 'retweetCount', 'replyCount', 'quoteCount']
+        if col in df.columns
+    )
+    vistas = df['viewCount'].fillna(0).astype('float64') if 'viewCount' in df.columns else 0
+    return np.log1p(vistas) + 2 * np.log1p(interacciones) + np.log1p(df['repeticiones'] - 1)
+
+
+def _vectorizar(textos, dimension=DIMENSION_VECTORES):
+    """TF-IDF con hashing de palabras, normalizado (L2)."""
+    matriz = np.zeros((len(textos), dimension), dtype=np.float32)
+    for i, texto in enumerate(textos):
+        for palabra in _RE_PALABRA.findall(texto):
+            matriz[i, zlib.crc32(palabra.encode("utf-8")) % dimension] += 1
+    documentos = (matriz > 0).sum(axis=0)
+    matriz *= np.log((1 + len(textos)) / (1 + documentos)) + 1
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.where(normas == 0, 1, normas)
+
+
+def _medoides(vectores, puntajes, k, rng, iteraciones=10):
+    """Índices de un medoide por grupo (k-means esférico con inicio k-means++)."""
+    n = len(vectores)
+    if k >= n:
+        return list(range(n))
+    centros = [int(np.argmax(puntajes))]
+    distancias = 1 - vectores @ vectores[centros[0]]
+    for _ in range(1, k):
+        pesos = np.clip(distancias, 0, None) ** 2
+        total = pesos.sum()
+        siguiente = int(rng.choice(n, p=pesos / total)) if total > 0 else int(rng.integers(n))
+        centros.append(siguiente)
+        distancias = np.minimum(distancias, 1 - vectores @ vectores[siguiente])
+    centroides = vectores[centros]
+    for _ in range(iteraciones):
+        asignacion = np.argmax(vectores @ centroides.T, axis=1)
+        for j in range(k):
+            miembros = vectores[asignacion == j]
+            if len(miembros):
+                centro = miembros.sum(axis=0)
+                norma = np.linalg.norm(centro)
+                centroides[j] = centro / norma if norma else centro
+
+    similitud = vectores @ centroides.T
+    asignacion = np.argmax(similitud, axis=1)
+    # Desempate leve a favor de los tweets con más alcance
+    ajuste = 0.05 * puntajes / (puntajes.max() or 1)
+    elegidos = []
+    for j in range(k):
+        miembros = np.flatnonzero(asignacion == j)
+        if len(miembros):
+            elegidos.append(int(miembros[np.argmax(similitud[miembros, j] + ajuste[miembros])]))
+    return elegidos
+
+
+def muestra_representativa(df, presupuesto_tokens=PRESUPUESTO_TOKENS_TEMAS, franjas=FRANJAS_TIEMPO, semilla=0):
+    """
+    Devuelve un subconjunto de filas de `df` (con la columna `repeticiones`)
+    cuyo texto total cabe en `presupuesto_tokens`, ordenado por alcance.
+    """
+    if df.empty or 'text' not in df.columns:
+        return df.iloc[0:0]
+
+    df = df.copy()
+    df['text'] = df['text'].astype(str)
+    df['_normalizado'] = df['text'].map(normalizar_para_duplicados)
+    df = df[df['_normalizado'] != ""]
+    if df.empty:
+        return df.drop(columns=['_normalizado'])
+
+    # 1. Un representante por texto repetido (el de más alcance)
+    df['repeticiones'] = df.groupby('_normalizado')['text'].transform('size')
+    df['_puntaje'] = _puntaje_interaccion(df)
+    df = df.sort_values('_puntaje', ascending=False).drop_duplicates('_normalizado')
+    df['_tokens'] = df['text'].map(estimar_tokens) + TOKENS_POR_LINEA
+
+    objetivo = max(1, int(presupuesto_tokens / df['_tokens'].mean()))
+    if objetivo >= len(df):
+        muestra = df
+    else:
+        # 2. Reparto entre franjas de tiempo
+        if 'createdAt' in df.columns and df['createdAt'].notna().any():
+            fechas = pd.to_datetime(df['createdAt'], errors='coerce', utc=True)
+            segundos = (fechas - fechas.min()).dt.total_seconds()
+            df['_franja'] = pd.cut(segundos, bins=franjas, labels=False, include_lowest=True).fillna(-1).astype(int)
+        else:
+            df['_franja'] = 0
+
+        rng = np.random.default_rng(semilla)
+        elegidos = []
+        tamanos = df['_franja'].value_counts()
+        for franja_id, tamano in tamanos.items():
+            cupo = max(1, round(objetivo * tamano / len(df)))
+            grupo = df[df['_franja'] == franja_id]
+            # 3. Candidatos: los de más alcance más una parte al azar, y medoides entre ellos
+            candidatos = pd.concat([
+                grupo.head(2 * cupo),
+                grupo.iloc[2 * cupo:].sample(n=min(2 * cupo, max(0, len(grupo) - 2 * cupo)), random_state=semilla),
+            ])
+            vectores = _vectorizar(candidatos['_normalizado'].tolist())
+            indices = _medoides(vectores, candidatos['_puntaje'].to_numpy(), cupo, rng)
+            elegidos.append(candidatos.iloc[indices])
+        muestra = pd.concat(elegidos).sort_values('_puntaje', ascending=False)
+
+    # 4. Recortar al presupuesto de tokens
+    muestra = muestra[muestra['_tokens'].cumsum() <= presupuesto_tokens]
+    return muestra.drop(columns=[c for c in muestra.columns if c.startswith('_')])
+
+
+def lineas_para_prompt(muestra):
+    """Una línea por tweet, con el usuario en el mismo formato que pide el prompt de temas."""
+    lineas = []
+    for registro in muestra.to_dict('records'):
+        texto = " ".join(registro['text'].split())
+        usuario = registro.get('author/userName')
+        linea = f'"{texto}"'
+        if isinstance(usuario, str) and usuario:
+            linea += f", [author/userName: {usuario}]"
+        if registro.get('repeticiones', 1) > 1:
+            linea += f" (repetido {registro['repeticiones']} veces)"
+        lineas.append(linea)
+    return lineas
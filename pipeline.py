@@ -0,0 +1,425 @@
+# pipeline.py
+
+"""
+Análisis completo (scraping, clasificación y temas) sin Streamlit.
+
+`ejecutar_analisis` recibe los parámetros de la ejecución como un dict
+serializable en JSON (así se pueden guardar en la tabla de trabajos, ver
+`trabajos.py`) y las dependencias ya construidas: la función que descarga
+tweets, el cliente de Gemini y, opcionalmente, la caché de sentimientos y el
+almacén local. Devuelve un dict con todo lo que muestra el dashboard.
+"""
+
+import copy
+import json
+import logging
+import threading
+import time
+from datetime import date, datetime, timezone
+
+import pandas as pd
+
+from almacen_tweets import dias_de_ventana, obtener_incremental, rangos_contiguos
+from clasificacion import ClasificadorIncremental, nombre_modelo
+from consultas import MAX_FRACCION_SIN_ATRIBUIR, BuscadorTerminos, planificar_ejecuciones, separar_por_termino
+from esquema import SENTIMIENTOS, aplicar_esquema
+from llm import ClienteLLM
+from lotes import PRESUPUESTO_TOKENS_LOTE
+from metricas import Metricas
+from muestreo import PRESUPUESTO_TOKENS_TEMAS
+from prefiltro import UMBRAL_PREFILTRO, entrenar_desde_cache
+from rankings import RankingsTweets, bloques
+from scraping import MAX_ITEMS, scrapear_en_paralelo
+from tareas import PlanificadorTareas
+from temas import extraer_temas_completos, extraer_temas_de_muestra
+
+
+logger = logging.getLogger("listening.pipeline")
+
+PARAMETROS_POR_DEFECTO = {
+    "terms": [],
+    "start_date": None,  # "YYYY-MM-DD"
+    "end_date": None,
+    "contexto": "",
+    "orden": "Top",
+    "usar_almacen": True,
+    "fusionar_terminos": True,
+    "max_scrapers": 4,
+    "max_workers": 4,
+    "tokens_por_lote": PRESUPUESTO_TOKENS_LOTE,
+    "casi_duplicados": False,
+    "umbral_duplicados": 0.8,
+    "presupuesto_temas": PRESUPUESTO_TOKENS_TEMAS,
+    "temas_completos": True,
+    "usar_cache": True,
+    "prefiltro_local": False,
+    "umbral_prefiltro": UMBRAL_PREFILTRO,
+}
+
+# Columnas que necesita el muestreo de los prompts de temas
+COLUMNAS_MUESTREO = ['text', 'createdAt', 'author/userName', 'viewCount', 'likeCount',
+                     'retweetCount', 'replyCount', 'quoteCount']
+
+
+def parsear_terminos(texto):
+    """Términos de búsqueda separados por saltos de línea o comas, sin repetidos."""
+    terminos = []
+    for linea in texto.split("\n"):
+        terminos.extend(t.strip() for t in linea.split(",") if t.strip())
+    return list(dict.fromkeys(terminos))
+
+
+def ejecutar_analisis(parametros, obtener_rango, model, cache=None, almacen=None, on_progreso=None, on_parcial=None,
+                      cache_temas=None):
+    """
+    Ejecuta el análisis descrito por `parametros` (ver `PARAMETROS_POR_DEFECTO`).
+
+    - `obtener_rango(terminos, inicio, fin, orden, on_chunk, metricas)` descarga
+      los tweets de Apify entre dos fechas "YYYY-MM-DD" (p. ej. `get_twitter_data`).
+      Con `fusionar_terminos`, una llamada puede recibir varios términos.
+    - `cache` es la caché de sentimientos y `cache_temas` la de temas por
+      fragmento (`cache_temas.CacheTemas`, sólo con `temas_completos`).
+    - `model` es el modelo de Gemini; si no viene envuelto en `llm.ClienteLLM`
+      se envuelve con los valores por defecto.
+    - `on_progreso(etapa, fraccion, mensaje)` informa el avance (fracción de 0 a 1
+      dentro de cada etapa: "scraping", "clasificacion", "temas").
+    - `on_parcial(clave, valor)` publica resultados parciales para mostrarlos
+      antes del final: "tweets" (dict con `df` sin sentimientos, sus
+      `rankings`, errores de scraping y días descargados) apenas termina el scraping, "sentimientos"
+      (`{sentimiento: tweets}` ya clasificados) con cada lote, y "temas"
+      (dict como `temas` y `errores_temas`) con cada grupo de temas. Los
+      valores publicados no se modifican después.
+
+    Devuelve un dict con `df` (tipado, con las columnas `sentimiento` y
+    `search_terms`), `rankings` (`rankings.RankingsTweets`, los tops del
+    dashboard), `temas` y `errores_temas` por nombre ("GENERAL" o un
+    sentimiento), `errores_scraping` por término, `grupos_busqueda` (los
+    términos de cada ejecución del actor), `avisos`, las estadísticas de cada
+    etapa y `diagnostico` (`metricas.Metricas.resumen()`: tiempos, items,
+    tokens y reintentos por etapa). Si no hay tweets, `df` está vacío y no se clasifica nada.
+    """
+    p = {**PARAMETROS_POR_DEFECTO, **parametros}
+    progreso = on_progreso or (lambda etapa, fraccion, mensaje: None)
+    publicar = on_parcial or (lambda clave, valor: None)
+    metricas = Metricas()
+    inicio_ejecucion = time.perf_counter()
+    if not isinstance(model, ClienteLLM):
+        model = ClienteLLM(model)
+    llm_clasificacion = model.para("clasificacion", metricas)
+    llm_temas = model.para("temas", metricas)
+    inicio = date.fromisoformat(p["start_date"])
+    fin = date.fromisoformat(p["end_date"])
+
+    resultado = {
+        "parametros": p,
+        "df": pd.DataFrame(),
+        "temas": {},
+        "errores_temas": {},
+        "errores_scraping": {},
+        "dias_descargados": {},
+        "dias_totales": 0,
+        "avisos": [],
+        "estadisticas": {},
+        "llm": {},
+        "resumen_lotes": [],
+        "presupuesto_lotes": None,
+        "tweets_por_lote": None,
+        "diagnostico": None,
+        "prefiltro": None,
+        "grupos_busqueda": [],
+        "rankings": None,
+    }
+
+    def cerrar_diagnostico():
+        metricas.registrar("total", time.perf_counter() - inicio_ejecucion, len(resultado["df"]))
+        resultado["diagnostico"] = metricas.resumen()
+        resultado["llm"] = dict(model.estadisticas)
+        logger.info(json.dumps({
+            "evento": "ejecucion",
+            "terminos": len(p["terms"]),
+            "tweets": len(resultado["df"]),
+            "duracion_s": round(time.perf_counter() - inicio_ejecucion, 3),
+            **resultado["llm"],
+        }, ensure_ascii=False))
+
+    # Prefiltro local entrenado con las etiquetas de Gemini de la caché; el
+    # reporte mide su concordancia con Gemini sobre ejemplos reservados.
+    prefiltro = None
+    if p["prefiltro_local"]:
+        with metricas.medir("prefiltro_entrenamiento") as medicion:
+            prefiltro, resultado["prefiltro"] = entrenar_desde_cache(
+                cache, p["contexto"], nombre_modelo(llm_clasificacion), umbral=float(p["umbral_prefiltro"]),
+            )
+            medicion["items"] = prefiltro.ejemplos
+
+    # El clasificador recibe los tweets página a página mientras se descargan,
+    # así los primeros lotes van a Gemini antes de que termine el scraping.
+    clasificador = ClasificadorIncremental(
+        p["contexto"], llm_clasificacion,
+        presupuesto_tokens=int(p["tokens_por_lote"]),
+        max_workers=int(p["max_workers"]),
+        cache=cache if p["usar_cache"] else None,
+        casi_duplicados=p["casi_duplicados"],
+        umbral=p["umbral_duplicados"],
+        prefiltro=prefiltro,
+    )
+
+    def clasificar_chunk(chunk):
+        if 'text' in chunk.columns:
+            clasificador.agregar(chunk['text'].astype(str).tolist())
+
+    # Los rankings (ver `rankings.py`) también se arman a medida que llegan
+    # los tweets, que se ingieren una vez por término que los trae. Con un
+    # solo término eso es una vez por tweet. Con varios, un tweet puede llegar
+    # con cada uno: los tops admiten repetidos y los conteos se suman en la
+    # unión, ya sin URLs repetidas.
+    rankings = RankingsTweets()
+    lock_rankings = threading.Lock()
+    un_termino = len(p["terms"]) == 1
+
+    def sumar_a_rankings(chunk):
+        if chunk.empty:
+            return
+        inicio_bloque = time.perf_counter()
+        with lock_rankings:
+            if un_termino:
+                rankings.actualizar(chunk)
+            else:
+                rankings.actualizar_tops(chunk)
+        metricas.registrar("rankings", time.perf_counter() - inicio_bloque, len(chunk))
+
+    def ingerir_chunk(chunk):
+        """Tweets ya atribuidos a un término: se clasifican y se suman a los rankings."""
+        clasificar_chunk(chunk)
+        sumar_a_rankings(chunk)
+
+    # --- Scraping ---
+    # Los términos se agrupan en la menor cantidad de ejecuciones del actor
+    # que entran en MAX_ITEMS (ver `consultas.py`); los tweets de cada
+    # ejecución agrupada se reparten después entre sus términos.
+    dias_descargados = {}
+    usar_almacen = p["usar_almacen"] and almacen is not None
+    hoy = datetime.now(timezone.utc).date()
+
+    def descargar(terminos, desde, hasta):
+        # Las páginas de una ejecución agrupada traen tweets que quizás no
+        # coinciden con ningún término, y la ejecución se puede descartar
+        # (ver `descargar_grupo`): se ingieren recién después de repartirlas
+        if len(terminos) > 1:
+            return obtener_rango(
+                list(terminos), desde.strftime("%Y-%m-%d"), hasta.strftime("%Y-%m-%d"), p["orden"], None, metricas,
+            )
+        paginas = []
+
+        def on_chunk(chunk):
+            paginas.append(len(chunk))
+            ingerir_chunk(chunk)
+
+        df = obtener_rango(
+            list(terminos), desde.strftime("%Y-%m-%d"), hasta.strftime("%Y-%m-%d"), p["orden"], on_chunk, metricas,
+        )
+        if not paginas:
+            # Servido desde la caché de `obtener_rango` (p. ej. `st.cache_data`): no pasó por on_chunk
+            ingerir_chunk(df)
+        return df
+
+    def obtener_termino(term):
+        with metricas.medir("busqueda", detalle=term) as medicion:
+            if not usar_almacen:
+                df_term = descargar([term], inicio, fin)
+            else:
+                # Lo descargado ya se ingirió en `descargar`; falta lo que estaba en el almacén
+                df_term, dias_descargados[term] = obtener_incremental(
+                    almacen, term, inicio, fin,
+                    lambda termino, desde, hasta: descargar([termino], desde, hasta),
+                    orden=p["orden"],
+                    max_items=MAX_ITEMS,
+                    on_almacenados=ingerir_chunk,
+                )
+            medicion["items"] = len(df_term)
+        return df_term
+
+    def descargar_grupo(grupo):
+        """
+        `{término: DataFrame}` con una ejecución del actor por rango de días
+        (los que le faltan a alguno de los términos, si hay almacén), o None si
+        alguna ejecución se cortó en MAX_ITEMS o trajo demasiados tweets que no
+        coinciden con ningún término. Esos tweets nunca se guardan en el
+        almacén ni se atribuyen a un término.
+        """
+        if usar_almacen:
+            faltantes = {term: almacen.dias_faltantes(term, p["orden"], inicio, fin) for term in grupo}
+            rangos = rangos_contiguos(sorted(set().union(*faltantes.values())))
+        else:
+            rangos = [(inicio, fin)]
+        buscador = BuscadorTerminos(grupo)
+        partes = {term: [] for term in grupo}
+        for desde, hasta in rangos:
+            df_rango = descargar(grupo, desde, hasta)
+            if len(df_rango) >= MAX_ITEMS:
+                return None
+            por_termino, sin_atribuir = separar_por_termino(df_rango, grupo, buscador)
+            metricas.contar("sin_atribuir", len(sin_atribuir), etapa="scraping")
+            if len(sin_atribuir) > MAX_FRACCION_SIN_ATRIBUIR * len(df_rango):
+                return None
+            if usar_almacen:
+                completos = [dia for dia in dias_de_ventana(desde, hasta) if dia < hoy]
+                for term in grupo:
+                    almacen.guardar(term, p["orden"], por_termino[term], completos)
+            else:
+                for term in grupo:
+                    partes[term].append(por_termino[term])
+        if usar_almacen:
+            for term in grupo:
+                dias_descargados[term] = len(faltantes[term])
+            return {term: almacen.leer(term, inicio, fin) for term in grupo}
+        return {term: dfs[0] for term, dfs in partes.items()}
+
+    def obtener_grupo(grupo):
+        if len(grupo) == 1:
+            return {grupo[0]: obtener_termino(grupo[0])}
+        with metricas.medir("busqueda", detalle=", ".join(grupo)) as medicion:
+            por_termino = descargar_grupo(grupo)
+            medicion["items"] = sum(len(df_term) for df_term in (por_termino or {}).values())
+        if por_termino is None:
+            # La estimación se quedó corta (al grupo le pueden faltar tweets) o
+            # muchos tweets no se pudieron atribuir: cada término se busca por
+            # separado (con almacén, sólo los días que no quedaron cubiertos)
+            metricas.contar("grupos_separados", etapa="scraping")
+            return {term: obtener_termino(term) for term in grupo}
+        for df_term in por_termino.values():
+            ingerir_chunk(df_term)
+        return por_termino
+
+    def estimar(term):
+        """Tweets que traería `term`: su promedio diario en el almacén por los días que le faltan."""
+        por_dia = almacen.tweets_por_dia(term) if usar_almacen else None
+        if por_dia is None:
+            return None
+        return por_dia * len(almacen.dias_faltantes(term, p["orden"], inicio, fin))
+
+    terms = p["terms"]
+    if p["fusionar_terminos"]:
+        grupos = planificar_ejecuciones(terms, {term: estimar(term) for term in terms}, presupuesto=MAX_ITEMS)
+    else:
+        grupos = [[term] for term in terms]
+    resultado["grupos_busqueda"] = grupos
+    metricas.contar("ejecuciones_planificadas", len(grupos), etapa="scraping")
+    progreso("scraping", 0.0, f"Buscando tweets para {len(terms)} términos en {len(grupos)} búsquedas...")
+    with metricas.medir("scraping") as medicion:
+        por_grupo, errores_grupo = scrapear_en_paralelo(
+            obtener_grupo, [tuple(grupo) for grupo in grupos],
+            max_workers=int(p["max_scrapers"]),
+            on_term_done=lambda grupo, completados, total: progreso(
+                "scraping", completados / total, f"Búsquedas completadas: {completados}/{total} (última: {', '.join(grupo)})"
+            ),
+        )
+        resultados = {term: df_term for partes_grupo in por_grupo.values() for term, df_term in partes_grupo.items()}
+        medicion["items"] = sum(len(df_term) for df_term in resultados.values())
+    errores = {term: error for grupo, error in errores_grupo.items() for term in grupo}
+    resultado["errores_scraping"] = {term: str(error) for term, error in errores.items()}
+    resultado["dias_descargados"] = dias_descargados
+    resultado["dias_totales"] = len(dias_de_ventana(inicio, fin)) * len(dias_descargados)
+
+    partes = []
+    for term in terms:
+        df_term = resultados.get(term)
+        if df_term is not None and not df_term.empty:
+            df_term["search_term"] = term  # para saber origen del tweet
+            partes.append(df_term)
+    if not partes:
+        clasificador.finalizar([])
+        cerrar_diagnostico()
+        return resultado
+
+    # Eliminar duplicados por URL (guardando en `search_terms` todos los
+    # términos de cada tweet) y recuperar los tipos que pd.concat pierde (categóricas)
+    with metricas.medir("union") as medicion:
+        df = pd.concat(partes, ignore_index=True)
+        terminos_por_url = df.groupby("url", sort=False)["search_term"].agg(list)
+        df = df.drop_duplicates(subset=["url"]).reset_index(drop=True)
+        df["search_terms"] = df["url"].map(terminos_por_url)
+        df = aplicar_esquema(df)
+        medicion["items"] = len(df)
+    if not un_termino:
+        with metricas.medir("rankings") as medicion:
+            for bloque in bloques(df):
+                rankings.actualizar_conteos(bloque)
+            medicion["items"] = len(df)
+    with lock_rankings:
+        rankings_parciales = copy.deepcopy(rankings)
+    publicar("tweets", {
+        "df": df,
+        "rankings": rankings_parciales,
+        "errores_scraping": resultado["errores_scraping"],
+        "dias_descargados": dias_descargados,
+        "dias_totales": resultado["dias_totales"],
+    })
+
+    def extraer_temas(nombre, df_temas, sentimiento=None):
+        with metricas.medir("temas", detalle=nombre) as medicion:
+            medicion["items"] = len(df_temas)
+            if p["temas_completos"]:
+                return extraer_temas_completos(
+                    df_temas, p["contexto"], llm_temas, sentimiento=sentimiento,
+                    cache=cache_temas if p["usar_cache"] else None,
+                    max_workers=int(p["max_workers"]), metricas=metricas,
+                )
+            return extraer_temas_de_muestra(
+                df_temas, p["contexto"], llm_temas, sentimiento=sentimiento, presupuesto_tokens=presupuesto_temas,
+            )
+
+    # --- Temas generales en segundo plano, mientras se clasifica ---
+    # Cada tarea recibe su propia copia de las columnas que usa el muestreo.
+    planificador = PlanificadorTareas(max_workers=4)
+    columnas_muestreo = [c for c in COLUMNAS_MUESTREO if c in df.columns]
+    presupuesto_temas = int(p["presupuesto_temas"])
+    planificador.lanzar("GENERAL", extraer_temas, "GENERAL", df[columnas_muestreo].copy())
+
+    # --- Clasificación ---
+    tweets_to_classify = df['text'].astype(str).tolist()
+    progreso("clasificacion", 0.0, f"Clasificando {len(tweets_to_classify):,} tweets...")
+    # Sólo lo que falta clasificar al terminar el scraping; los lotes enviados
+    # antes se ven en las llamadas "llm" de la etapa "clasificacion"
+    with metricas.medir("clasificacion") as medicion:
+        sentimientos = clasificador.finalizar(
+            tweets_to_classify,
+            on_progress=lambda completados, total: progreso(
+                "clasificacion", min(completados / total, 1.0), f"Textos únicos clasificados: {completados:,}/{total:,}"
+            ),
+            on_conteo=lambda conteo: publicar("sentimientos", conteo),
+        )
+        medicion["items"] = len(tweets_to_classify)
+    # Un DataFrame nuevo: el publicado en "tweets" puede estar leyéndose desde la página
+    df = aplicar_esquema(df.assign(sentimiento=sentimientos))
+    resultado["df"] = df
+    # Las filas del top de tweets entraron antes de conocer sus términos y su sentimiento
+    rankings.anotar_tweets(df, ["search_term", "search_terms", "sentimiento"])
+    resultado["rankings"] = rankings
+    resultado["avisos"] = list(clasificador.avisos)
+    resultado["estadisticas"] = dict(clasificador.estadisticas)
+    metricas.contar("aciertos_cache", clasificador.estadisticas["aciertos_cache"], etapa="clasificacion")
+    resultado["resumen_lotes"] = clasificador.lotes.resumen()
+    resultado["presupuesto_lotes"] = clasificador.lotes.presupuesto
+    historial = clasificador.lotes.historial
+    resultado["tweets_por_lote"] = sum(l["tweets"] for l in historial) / len(historial) if historial else None
+
+    # --- Temas por sentimiento ---
+    for tipo in SENTIMIENTOS:
+        subset = df.loc[df["sentimiento"] == tipo, columnas_muestreo]
+        if not subset.empty:
+            planificador.lanzar(tipo, extraer_temas, tipo, subset, sentimiento=tipo)
+
+    total_temas = len(planificador)
+    progreso("temas", 0.0, "Extrayendo temas...")
+    for completados, (nombre, futuro) in enumerate(planificador.a_medida_que_terminan(), start=1):
+        try:
+            resultado["temas"][nombre] = futuro.result()
+        except Exception as e:
+            resultado["errores_temas"][nombre] = str(e)
+        publicar("temas", {"temas": dict(resultado["temas"]), "errores_temas": dict(resultado["errores_temas"])})
+        progreso("temas", completados / total_temas, f"Temas listos: {completados}/{total_temas} (último: {nombre})")
+    planificador.cerrar()
+
+    cerrar_diagnostico()
+    return resultado
@@ -0,0 +1,266 @@
+# prefiltro.py
+
+"""
+Clasificador local de primera pasada, para no gastar llamadas a Gemini en
+tweets de sentimiento evidente.
+
+- Un léxico chico de palabras y emojis positivos y negativos en español, con
+  negación ("no me gusta" cuenta como negativo).
+- Un Naive Bayes multinomial sobre palabras con hashing (como los vectores de
+  `muestreo.py`) entrenado con las etiquetas de Gemini guardadas en la caché
+  de sentimientos. Los aciertos del léxico entran como dos rasgos más, así el
+  modelo aprende cuánto confiar en ellos.
+
+`PreClasificador.predecir` devuelve etiqueta y confianza para todos los
+textos de una vez (numpy, sin bucles por clase ni matrices densas). Sólo las
+predicciones con confianza de al menos `umbral` se usan; el resto se envía a
+Gemini. Sin modelo entrenado, sólo el léxico decide, y únicamente POSITIVO o
+NEGATIVO con varias palabras a favor y ninguna en contra.
+
+`entrenar_desde_cache` usa sólo los ejemplos de la caché del contexto y el
+modelo de la ejecución (las etiquetas dependen del contexto), reserva una parte y
+devuelve, junto con el modelo, un reporte de concordancia con Gemini sobre
+esos ejemplos (cobertura y acierto al umbral elegido, matriz de confusión).
+"""
+
+import random
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+
+from duplicados import normalizar_para_duplicados
+from esquema import SENTIMIENTOS
+
+
+UMBRAL_PREFILTRO = 0.9
+DIMENSION_RASGOS = 1 << 15
+FRACCION_PRUEBA = 0.2
+MIN_EJEMPLOS_POR_CLASE = 50
+MAX_EJEMPLOS = 50_000
+SUAVIZADO = 0.5
+
+# Sin tildes (ver `_tokens`). Las palabras se comparan enteras; las raíces,
+# por prefijo, sólo cuando no hay palabras comunes que empiecen igual con
+# otro sentido ("encant" -> encanta, encantó, encantador, ...)
+PALABRAS_POSITIVAS = {
+    "genial", "geniales", "feliz", "felices", "felicidad", "gracias", "mejor", "mejores", "bravo", "exito",
+    "exitos", "exitoso", "exitosa", "lindo", "linda", "lindos", "lindas", "divino", "divina", "top", "amo",
+    "ame", "amamos", "gusto", "gusta", "gustan", "facil", "faciles", "rapido", "rapida", "rapidos",
+    "rapidas", "contento", "contenta", "contentos", "contentas",
+}
+RAICES_POSITIVAS = (
+    "excelent", "encant", "buenisim", "maravill", "increibl", "felicit", "agradec", "recomiend", "recomend",
+    "perfect", "fantastic", "espectacular", "orgullos", "hermos", "brillant", "eficient", "confiabl",
+)
+PALABRAS_NEGATIVAS = {
+    "odio", "odie", "odian", "asco", "basura", "fraude", "robo", "roban", "robaron", "ladron", "ladrones",
+    "peor", "peores", "inutil", "inutiles", "lamentable", "lamentablemente", "harto", "harta", "hartos",
+    "cansado", "cansada", "queja", "quejas", "falla", "fallas", "fallo", "caido", "caida", "error", "errores",
+    "lento", "lenta", "lentos", "lentas", "mentira", "mentiras", "miente", "mienten", "triste", "bronca",
+    "cobran", "bloqueo", "bloquearon", "bloqueado", "bloqueada",
+}
+RAICES_NEGATIVAS = (
+    "pesim", "horribl", "terribl", "malisim", "estafa", "verguenz", "vergonzos", "decepcion", "indignad",
+    "indignant", "furios", "reclam", "denunci", "problem", "abusiv", "desastr", "porqueri", "nefast",
+)
+EMOJIS_POSITIVOS = set("😀😁😂😃😄😊😍🥰😘👍👏🙌💪🎉❤💙💚💛💜🔥✨⭐🤩😎🙏")
+EMOJIS_NEGATIVOS = set("😡😠🤬😤😢😭😞😩😫👎💩🤮🤢😒🙄💔😱")
+NEGADORES = {"no", "ni", "nunca", "jamas", "tampoco", "nada", "sin"}
+# Cuántas palabras después de un negador se invierte la polaridad
+VENTANA_NEGACION = 3
+
+_RE_TOKEN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_RE_MENCION = re.compile(r"@\w+")
+_RASGO_POSITIVO = "__lexico_positivo__"
+_RASGO_NEGATIVO = "__lexico_negativo__"
+
+
+def _sin_tildes(texto):
+    return "".join(c for c in unicodedata.normalize("NFD", texto) if unicodedata.category(c) != "Mn")
+
+
+def _tokens(texto):
+    """Palabras (sin tildes ni menciones) y emojis de un tweet normalizado."""
+    texto = _RE_MENCION.sub(" ", normalizar_para_duplicados(texto))
+    return _RE_TOKEN.findall(_sin_tildes(texto))
+
+
+def polaridad_lexica(tokens):
+    """
+    `(positivos, negativos)`: aciertos del léxico. Un negador convierte en
+    negativas las palabras positivas que lo siguen; las negativas no se
+    invierten ("no funciona, pésimo" y "nada de problemas" son ambiguas, y
+    en español la doble negación sigue siendo negativa).
+    """
+    positivos = negativos = 0
+    negado = 0
+    for token in tokens:
+        if token in NEGADORES:
+            negado = VENTANA_NEGACION
+            continue
+        signo = 0
+        if token in EMOJIS_POSITIVOS or token in PALABRAS_POSITIVAS or token.startswith(RAICES_POSITIVAS):
+            signo = 1
+        elif token in EMOJIS_NEGATIVOS or token in PALABRAS_NEGATIVAS or token.startswith(RAICES_NEGATIVAS):
+            signo = -1
+        if signo > 0 and negado:
+            signo = -1
+        if signo > 0:
+            positivos += 1
+        elif signo < 0:
+            negativos += 1
+        if negado and token.isalnum():
+            negado -= 1
+    return positivos, negativos
+
+
+def _rasgos(textos, dimension=DIMENSION_RASGOS):
+    """
+    Índices de rasgos (hash de palabras y bigramas, más los aciertos del
+    léxico) de todos los textos concatenados, el inicio de cada texto y la
+    polaridad léxica `(n, 2)`.
+    """
+    indices = []
+    inicios = np.zeros(len(textos), dtype=np.int64)
+    lexico = np.zeros((len(textos), 2), dtype=np.int32)
+    for i, texto in enumerate(textos):
+        inicios[i] = len(indices)
+        tokens = _tokens(texto)
+        positivos, negativos = polaridad_lexica(tokens)
+        lexico[i] = positivos, negativos
+        palabras = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        palabras += [_RASGO_POSITIVO] * positivos + [_RASGO_NEGATIVO] * negativos
+        indices.extend(zlib.crc32(p.encode("utf-8")) % dimension for p in palabras)
+    return np.asarray(indices, dtype=np.int64), inicios, lexico
+
+
+def _sumar_por_texto(valores, inicios, total):
+    """Suma `valores[:, indices]` por tramos de `inicios` (los textos vacíos suman 0)."""
+    n = len(inicios)
+    resultado = np.zeros((valores.shape[0], n), dtype=np.float64)
+    if total == 0:
+        return resultado
+    fines = np.append(inicios[1:], total)
+    no_vacios = fines > inicios
+    if no_vacios.any():
+        resultado[:, no_vacios] = np.add.reduceat(valores, inicios[no_vacios], axis=1)
+    return resultado
+
+
+class PreClasificador:
+    """
+    Naive Bayes multinomial (con rasgos léxicos) o, sin entrenar, sólo el
+    léxico. `predecir(textos)` devuelve `(etiquetas, confianzas)` como arrays;
+    `filtrar(textos)` devuelve `{indice: etiqueta}` sólo con las que superan
+    el umbral.
+    """
+
+    def __init__(self, umbral=UMBRAL_PREFILTRO, dimension=DIMENSION_RASGOS):
+        self.umbral = umbral
+        self.dimension = dimension
+        self.clases = np.array(SENTIMIENTOS)
+        self.entrenado = False
+        self.ejemplos = 0
+        self._log_previas = None
+        self._log_verosimilitudes = None
+
+    def entrenar(self, textos, etiquetas):
+        """
+        Ajusta el modelo con etiquetas de Gemini. Si alguna clase tiene menos
+        de `MIN_EJEMPLOS_POR_CLASE` ejemplos, queda sin entrenar (sólo léxico).
+        """
+        posicion = {clase: i for i, clase in enumerate(self.clases)}
+        validos = [(texto, posicion[etiqueta]) for texto, etiqueta in zip(textos, etiquetas) if etiqueta in posicion]
+        clases = np.array([clase for _, clase in validos], dtype=np.int64)
+        cantidades = np.bincount(clases, minlength=len(self.clases))
+        self.ejemplos = len(validos)
+        if cantidades.min() < MIN_EJEMPLOS_POR_CLASE:
+            self.entrenado = False
+            return self
+        indices, inicios, _ = _rasgos([texto for texto, _ in validos], self.dimension)
+        clase_por_rasgo = np.repeat(clases, np.diff(np.append(inicios, len(indices))))
+        conteos = np.zeros((len(self.clases), self.dimension), dtype=np.float64)
+        np.add.at(conteos, (clase_por_rasgo, indices), 1)
+        conteos += SUAVIZADO
+        self._log_verosimilitudes = np.log(conteos / conteos.sum(axis=1, keepdims=True))
+        self._log_previas = np.log(cantidades / cantidades.sum())
+        self.entrenado = True
+        return self
+
+    def predecir(self, textos):
+        indices, inicios, lexico = _rasgos(textos, self.dimension)
+        if not self.entrenado:
+            return self._predecir_lexico(lexico)
+        log_post = _sumar_por_texto(self._log_verosimilitudes[:, indices], inicios, len(indices))
+        log_post += self._log_previas[:, None]
+        log_post -= log_post.max(axis=0, keepdims=True)
+        probabilidades = np.exp(log_post)
+        probabilidades /= probabilidades.sum(axis=0, keepdims=True)
+        mejor = probabilidades.argmax(axis=0)
+        return self.clases[mejor], probabilidades[mejor, np.arange(len(textos))]
+
+    def _predecir_lexico(self, lexico):
+        positivos, negativos = lexico[:, 0], lexico[:, 1]
+        margen = positivos - negativos
+        # Sólo polaridades sin palabras en contra; 2 aciertos -> 0.75, 4 -> 0.94
+        unanime = (positivos == 0) | (negativos == 0)
+        confianzas = np.where(unanime & (margen != 0), 1 - 0.5 ** np.abs(margen), 0.0)
+        etiquetas = np.where(margen > 0, "POSITIVO", np.where(margen < 0, "NEGATIVO", "NEUTRO"))
+        return etiquetas, confianzas
+
+    def filtrar(self, textos):
+        """`{indice: etiqueta}` de los textos con confianza >= `umbral`."""
+        if not textos:
+            return {}
+        etiquetas, confianzas = self.predecir(textos)
+        return {int(i): str(etiquetas[i]) for i in np.flatnonzero(confianzas >= self.umbral)}
+
+    def evaluar(self, textos, etiquetas):
+        """
+        Concordancia con las etiquetas de Gemini: acierto total, cobertura
+        (fracción con confianza >= umbral), acierto dentro de la cobertura y
+        matriz de confusión de los cubiertos (filas: Gemini, columnas: local).
+        """
+        if not textos:
+            return None
+        etiquetas = np.asarray(etiquetas)
+        predichas, confianzas = self.predecir(textos)
+        cubiertos = confianzas >= self.umbral
+        confusion = {
+            real: {local: int(((etiquetas == real) & (predichas == local) & cubiertos).sum()) for local in SENTIMIENTOS}
+            for real in SENTIMIENTOS
+        }
+        return {
+            "modelo": "naive_bayes" if self.entrenado else "lexico",
+            "ejemplos_entrenamiento": self.ejemplos,
+            "ejemplos_prueba": len(textos),
+            "umbral": self.umbral,
+            "acierto": round(float((predichas == etiquetas).mean()), 3),
+            "cobertura": round(float(cubiertos.mean()), 3),
+            "acierto_cubiertos": round(float((predichas[cubiertos] == etiquetas[cubiertos]).mean()), 3) if cubiertos.any() else None,
+            "confusion": confusion,
+        }
+
+
+def entrenar_desde_cache(cache, contexto, modelo, umbral=UMBRAL_PREFILTRO, fraccion_prueba=FRACCION_PRUEBA, semilla=0):
+    """
+    Entrena un `PreClasificador` con los ejemplos de `cache`
+    (`CacheSentimientos`) clasificados con el mismo `contexto` y `modelo`,
+    reservando `fraccion_prueba` para evaluarlo. Devuelve
+    `(preclasificador, reporte)`; el reporte es None si no hay ejemplos.
+    """
+    ejemplos = cache.ejemplos(MAX_EJEMPLOS, contexto, modelo) if cache is not None else []
+    random.Random(semilla).shuffle(ejemplos)
+    corte = int(len(ejemplos) * fraccion_prueba)
+    prueba, entrenamiento = ejemplos[:corte], ejemplos[corte:]
+    preclasificador = PreClasificador(umbral=umbral)
+    if entrenamiento:
+        textos, etiquetas = zip(*entrenamiento)
+        preclasificador.entrenar(list(textos), list(etiquetas))
+    reporte = None
+    if prueba:
+        textos, etiquetas = zip(*prueba)
+        reporte = preclasificador.evaluar(list(textos), list(etiquetas))
+    return preclasificador, reporte
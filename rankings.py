@@ -0,0 +1,296 @@
+# rankings.py
+
+"""
+Rankings del dashboard (tweets más vistos y autores destacados) con memoria
+proporcional a K y no a la cantidad de tweets.
+
+Las estructuras se actualizan bloque a bloque (`RankingsTweets.actualizar`),
+así que sirven para recorrer colecciones que no entran enteras en memoria, y
+se guardan con el resultado: el dashboard muestra los rankings sin volver a
+ordenar ni agrupar el DataFrame en cada render.
+
+- `TopK` guarda las `k` claves con mayor valor máximo observado (un
+  min-heap acotado). Es exacto: una clave que salió del heap tenía un valor
+  menor que el de las `k` que quedaron, y si vuelve a aparecer con un valor
+  mayor entra con ese valor. Volver a sumar un tweet no lo cambia. Se usa
+  para los tweets más vistos (clave: URL) y los autores con más seguidores
+  (clave: usuario).
+- `SpaceSaving` cuenta (o suma) por clave con `capacidad` contadores
+  (Metwally et al., 2005): cuando no queda lugar, la clave nueva reemplaza a
+  la de menor conteo y hereda ese conteo como error. Cada conteo excede al
+  real en a lo sumo su `error`, y toda clave con más de `minimo` está entre
+  las monitoreadas. Se usa para los autores más activos (tweets) y con más
+  interacción (suma de likes, respuestas, retweets, citas y guardados).
+
+Dentro de cada bloque se agrega primero con pandas (una fila por autor), así
+las estructuras reciben una actualización por autor y bloque, no por tweet.
+"""
+
+import heapq
+
+import pandas as pd
+
+from esquema import CONTADORES_INTERACCION
+
+
+K_RANKINGS = 10
+# Contadores de Space-Saving por cada puesto del ranking
+CONTADORES_POR_PUESTO = 100
+FILAS_POR_BLOQUE = 50_000
+
+
+def bloques(df, filas=FILAS_POR_BLOQUE):
+    """Cortes consecutivos de `filas` filas de `df` (vistas, sin copiar)."""
+    return (df.iloc[i:i + filas] for i in range(0, len(df), filas))
+
+
+class TopK:
+    """Las `k` claves con mayor valor (el máximo observado de cada una) y los datos con que entraron."""
+
+    def __init__(self, k):
+        self.k = k
+        self._valores = {}  # clave -> (valor, orden de llegada)
+        self._datos = {}
+        self._heap = []  # (valor, -orden, clave); las entradas viejas se descartan al llegar al tope
+        self._siguiente = 0
+
+    def __len__(self):
+        return len(self._valores)
+
+    def _vigente(self, entrada):
+        valor, orden, clave = entrada
+        return self._valores.get(clave) == (valor, -orden)
+
+    def _minimo(self):
+        while not self._vigente(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0]
+
+    def agregar(self, clave, valor, datos=None):
+        """
+        Registra `valor` para `clave`. Ante empates queda la clave que llegó
+        primero (como `nlargest(keep='first')`); `datos` se guardan la primera
+        vez que la clave entra.
+        """
+        actual = self._valores.get(clave)
+        if actual is not None:
+            if valor <= actual[0]:
+                return
+            orden = actual[1]
+        else:
+            if len(self._valores) >= self.k:
+                minimo_valor, _, minimo_clave = self._minimo()
+                if valor <= minimo_valor:
+                    return
+                heapq.heappop(self._heap)
+                del self._valores[minimo_clave], self._datos[minimo_clave]
+            orden = self._siguiente
+            self._siguiente += 1
+            self._datos[clave] = datos
+        self._valores[clave] = (valor, orden)
+        heapq.heappush(self._heap, (valor, -orden, clave))
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(valor, -orden, clave) for clave, (valor, orden) in self._valores.items()]
+            heapq.heapify(self._heap)
+
+    def elementos(self):
+        """`[(clave, valor, datos)]` de mayor a menor valor."""
+        ordenadas = sorted(self._valores.items(), key=lambda item: (-item[1][0], item[1][1]))
+        return [(clave, valor, self._datos[clave]) for clave, (valor, _) in ordenadas]
+
+
+class SpaceSaving:
+    """Conteos (o sumas de pesos no negativos) aproximados de las claves más frecuentes con `capacidad` contadores."""
+
+    def __init__(self, capacidad):
+        self.capacidad = capacidad
+        self._conteos = {}  # clave -> [conteo, error]
+        self._datos = {}
+        self._heap = []  # (conteo, clave); vigente si coincide con el conteo actual
+        self.reemplazos = 0
+
+    def __len__(self):
+        return len(self._conteos)
+
+    def _minimo(self):
+        while True:
+            conteo, clave = self._heap[0]
+            actual = self._conteos.get(clave)
+            if actual is not None and actual[0] == conteo:
+                return conteo, clave
+            heapq.heappop(self._heap)
+
+    @property
+    def minimo(self):
+        """Cota del conteo de cualquier clave no monitoreada (0 mientras sobran contadores)."""
+        if len(self._conteos) < self.capacidad:
+            return 0
+        return self._minimo()[0]
+
+    def agregar(self, clave, peso=1, datos=None):
+        contador = self._conteos.get(clave)
+        if contador is not None:
+            contador[0] += peso
+        elif len(self._conteos) < self.capacidad:
+            contador = self._conteos[clave] = [peso, 0]
+            self._datos[clave] = datos
+        else:
+            minimo, clave_minima = self._minimo()
+            heapq.heappop(self._heap)
+            del self._conteos[clave_minima], self._datos[clave_minima]
+            contador = self._conteos[clave] = [minimo + peso, minimo]
+            self._datos[clave] = datos
+            self.reemplazos += 1
+        heapq.heappush(self._heap, (contador[0], clave))
+        if len(self._heap) > 4 * self.capacidad:
+            self._heap = [(conteo, clave) for clave, (conteo, _) in self._conteos.items()]
+            heapq.heapify(self._heap)
+
+    def elementos(self, n=None):
+        """`[(clave, conteo, error, datos)]` de mayor a menor conteo; el real está en `[conteo - error, conteo]`."""
+        ordenadas = sorted(self._conteos.items(), key=lambda item: (-item[1][0], item[1][1], str(item[0])))[:n]
+        return [(clave, conteo, error, self._datos[clave]) for clave, (conteo, error) in ordenadas]
+
+
+class RankingsTweets:
+    """
+    Los rankings del dashboard sobre un flujo de bloques de tweets (ver
+    `esquema.py`). Los tops (`actualizar_tops`) guardan el máximo por clave,
+    así que sumar otra vez un tweet no los cambia; los conteos
+    (`actualizar_conteos`) sí: cada tweet debe llegar una sola vez.
+    `actualizar` hace las dos cosas. No es seguro para usar desde varios
+    hilos a la vez.
+    """
+
+    def __init__(self, k=K_RANKINGS, capacidad=None):
+        self.k = k
+        capacidad = capacidad or CONTADORES_POR_PUESTO * k
+        self.vistas = TopK(k)
+        self.seguidores = TopK(k)
+        self.actividad = SpaceSaving(capacidad)
+        self.interaccion = SpaceSaving(capacidad)
+        self.tweets = 0
+        self._bloques = 0
+
+    @classmethod
+    def desde_bloques(cls, bloques, **kwargs):
+        rankings = cls(**kwargs)
+        for bloque in bloques:
+            rankings.actualizar(bloque)
+        return rankings
+
+    @classmethod
+    def desde_df(cls, df, filas=FILAS_POR_BLOQUE, **kwargs):
+        return cls.desde_bloques(bloques(df, filas), **kwargs)
+
+    def actualizar(self, df):
+        """Suma un bloque de tweets a los rankings."""
+        por_autor = self._por_autor(df)
+        self._sumar_tops(df, por_autor)
+        self._sumar_conteos(por_autor, len(df))
+
+    def actualizar_tops(self, df):
+        """Suma un bloque a los tweets más vistos y a los autores con más seguidores; admite tweets repetidos."""
+        self._sumar_tops(df, self._por_autor(df))
+
+    def actualizar_conteos(self, df):
+        """Suma un bloque a la cantidad de tweets y a los autores más activos y con más interacción."""
+        self._sumar_conteos(self._por_autor(df), len(df))
+
+    def _por_autor(self, df):
+        """Una fila por autor del bloque: tweets, foto, seguidores (máximo) e interacciones; None si no hay autores."""
+        if df.empty or 'author/userName' not in df.columns:
+            return None
+        autores = df[df['author/userName'].notna()]
+        if autores.empty:
+            return None
+        columnas = {'tweets': pd.NamedAgg(column='author/userName', aggfunc='size')}
+        if 'author/profilePicture' in autores.columns:
+            columnas['author/profilePicture'] = pd.NamedAgg(column='author/profilePicture', aggfunc='first')
+        if 'author/followers' in autores.columns:
+            columnas['author/followers'] = pd.NamedAgg(column='author/followers', aggfunc='max')
+        interacciones = [c for c in CONTADORES_INTERACCION if c in autores.columns]
+        if interacciones:
+            autores = autores.assign(interacciones=autores[interacciones].fillna(0).sum(axis=1))
+            columnas['interacciones'] = pd.NamedAgg(column='interacciones', aggfunc='sum')
+        return autores.groupby('author/userName', observed=True, sort=False).agg(**columnas)
+
+    def _sumar_tops(self, df, por_autor):
+        if df.empty:
+            return
+        self._bloques += 1
+        if 'viewCount' in df.columns:
+            vistos = df[df['viewCount'].notna()]
+            for posicion, fila in enumerate(vistos.nlargest(self.k, 'viewCount').to_dict('records')):
+                clave = fila['url'] if isinstance(fila.get('url'), str) else f"{self._bloques}:{posicion}"
+                self.vistas.agregar(clave, int(fila['viewCount']), fila)
+        if por_autor is not None and 'author/followers' in por_autor.columns:
+            for usuario, fila in por_autor.dropna(subset=['author/followers']).nlargest(self.k, 'author/followers').iterrows():
+                self.seguidores.agregar(usuario, int(fila['author/followers']), fila.get('author/profilePicture'))
+
+    def _sumar_conteos(self, por_autor, tweets):
+        self.tweets += tweets
+        if por_autor is None:
+            return
+        usuarios = por_autor.index.tolist()
+        fotos = por_autor['author/profilePicture'].tolist() if 'author/profilePicture' in por_autor.columns \
+            else [None] * len(usuarios)
+        for usuario, cantidad, foto in zip(usuarios, por_autor['tweets'].tolist(), fotos):
+            self.actividad.agregar(usuario, cantidad, foto)
+        if 'interacciones' in por_autor.columns:
+            for usuario, total, foto in zip(usuarios, por_autor['interacciones'].tolist(), fotos):
+                self.interaccion.agregar(usuario, int(total), foto)
+
+    def anotar_tweets(self, df, columnas):
+        """
+        Copia `columnas` de las filas de `df` (por URL) a los tweets más
+        vistos, p. ej. el sentimiento, que se conoce después de sumarlos.
+        """
+        columnas = [c for c in columnas if c in df.columns]
+        elementos = self.vistas.elementos()
+        if not columnas or 'url' not in df.columns or not elementos:
+            return
+        urls = [clave for clave, _, _ in elementos]
+        filas = df.loc[df['url'].isin(urls), ['url', *columnas]].drop_duplicates('url').set_index('url')
+        for clave, _, datos in elementos:
+            if clave in filas.index:
+                datos.update(filas.loc[clave].to_dict())
+
+    # --- Tablas del dashboard ---
+
+    def top_tweets(self):
+        """Los tweets más vistos, con `viewCount` formateado para la tabla."""
+        top = pd.DataFrame([datos for _, _, datos in self.vistas.elementos()])
+        if not top.empty:
+            top['viewCount'] = top['viewCount'].map(lambda x: f"{int(x):,}" if pd.notna(x) else "N/A")
+        return top
+
+    def top_seguidores(self):
+        """Los autores con más seguidores (máximo observado) y su foto de perfil."""
+        return pd.DataFrame(
+            [(usuario, f"{seguidores:,}", foto) for usuario, seguidores, foto in self.seguidores.elementos()],
+            columns=['author/userName', 'author/followers', 'author/profilePicture'],
+        )
+
+    def _tabla_conteos(self, sketch, columna):
+        return pd.DataFrame(
+            sketch.elementos(self.k),
+            columns=['author/userName', columna, 'error', 'author/profilePicture'],
+        )
+
+    def top_activos(self):
+        """Los autores con más tweets; `error` es cuánto puede exceder `tweets` al valor real (0 = exacto)."""
+        return self._tabla_conteos(self.actividad, 'tweets')
+
+    def top_interaccion(self):
+        """Los autores con más interacciones sumadas entre sus tweets, con el mismo `error` que `top_activos`."""
+        return self._tabla_conteos(self.interaccion, 'interacciones')
+
+    def tablas(self):
+        """Todas las tablas por nombre (p. ej. para exportarlas)."""
+        return {
+            "tweets_mas_vistos": self.top_tweets(),
+            "autores_mas_seguidores": self.top_seguidores(),
+            "autores_mas_activos": self.top_activos(),
+            "autores_mas_interaccion": self.top_interaccion(),
+        }
@@ -0,0 +1,66 @@
+# resultados.py
+
+"""
+Capa de resultados del dashboard.
+
+- `huella_ejecucion` identifica una ejecución por lo que determina su
+  resultado (términos, fechas, contexto, modelo y opciones de análisis), sin
+  las perillas de rendimiento (hilos, RPM, tamaño de lote, ...). Dos pedidos
+  con la misma huella pueden reutilizar el mismo trabajo (ver
+  `trabajos.ColaTrabajos.buscar`), sin volver a scrapear ni a consultar a Gemini.
+- Las funciones de agregación calculan las tablas del dashboard a partir del
+  DataFrame clasificado. No dependen de Streamlit; `app.py` las memoiza con
+  `st.cache_data` por resultado, así que un rerun no las recalcula. Los
+  rankings (tweets más vistos y autores) no salen de acá sino de
+  `rankings.py`, que el pipeline calcula una vez por ejecución.
+"""
+
+import hashlib
+import json
+
+import pandas as pd
+
+from esquema import CONTADORES_INTERACCION
+
+
+# Parámetros que cambian el resultado de una ejecución
+PARAMETROS_HUELLA = ["terms", "start_date", "end_date", "contexto", "modelo", "orden",
+                     "casi_duplicados", "umbral_duplicados", "presupuesto_temas",
+                     "prefiltro_local", "umbral_prefiltro", "fusionar_terminos",
+                     "temas_completos"]
+
+def huella_ejecucion(parametros):
+    """Hash estable de los parámetros que determinan el resultado (el orden de los términos no importa)."""
+    datos = {clave: parametros.get(clave) for clave in PARAMETROS_HUELLA}
+    datos["terms"] = sorted(datos["terms"] or [])
+    contenido = json.dumps(datos, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()[:16]
+
+
+def metricas_alcance(df):
+    """Vistas e interacciones totales y por tweet."""
+    total_vistas = int(df['viewCount'].sum())
+    total_interacciones = int(df[[c for c in CONTADORES_INTERACCION if c in df.columns]].fillna(0).sum().sum())
+    return {
+        "total_vistas": total_vistas,
+        "total_interacciones": total_interacciones,
+        "promedio_vistas": total_vistas / len(df),
+        "promedio_interacciones": total_interacciones / len(df),
+    }
+
+
+def distribucion_sentimientos(df):
+    """Cantidad y porcentaje de tweets por sentimiento (sin los que quedaron sin clasificar)."""
+    return tabla_distribucion(df['sentimiento'].value_counts())
+
+
+def tabla_distribucion(cantidades):
+    """
+    Tabla de `distribucion_sentimientos` a partir de `{sentimiento: cantidad}`
+    (p. ej. el conteo parcial que publica el pipeline mientras clasifica).
+    """
+    conteo = pd.Series(cantidades, dtype='int64').sort_values(ascending=False)
+    conteo = conteo[conteo > 0].rename_axis('Sentimiento').reset_index(name='Cantidad')
+    conteo['Porcentaje'] = conteo['Cantidad'] / conteo['Cantidad'].sum() * 100
+    return conteo
+
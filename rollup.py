@@ -0,0 +1,136 @@
+# rollup.py
+
+"""
+Series de tiempo del dashboard: tweets, vistas, interacciones, sentimientos y
+términos por franja de tiempo.
+
+Todo sale de una sola pasada: se arma una tabla numérica con una columna por
+métrica (1 por tweet, vistas, interacciones y un indicador por sentimiento)
+indexada por `createdAt`, y se agrega con `resample(...).sum()`. Los términos
+(varios por tweet) se agregan igual, después de `explode("search_terms")` e
+indicadores con `get_dummies`.
+Así no se formatean fechas como texto para agrupar y las franjas sin tweets
+quedan en la serie con 0, en lugar de desaparecer del gráfico.
+
+La granularidad depende del largo del rango: por hora hasta 3 días, por día
+hasta 150 y por mes después. Las franjas son en UTC, como `createdAt`.
+"""
+
+import numpy as np
+import pandas as pd
+
+from esquema import CONTADORES_INTERACCION, SENTIMIENTOS
+
+
+# (días máximos del rango, frecuencia de pandas, etiqueta del eje)
+GRANULARIDADES = [
+    (3, "h", "Hora"),
+    (150, "D", "Fecha"),
+    (None, "MS", "Mes"),
+]
+
+
+def granularidad(inicio, fin):
+    """`(frecuencia, etiqueta)` para un rango de fechas según su largo en días."""
+    dias = (pd.Timestamp(fin).normalize() - pd.Timestamp(inicio).normalize()).days
+    for maximo, frecuencia, etiqueta in GRANULARIDADES:
+        if maximo is None or dias <= maximo:
+            return frecuencia, etiqueta
+
+
+def _inicio_franja(instante, frecuencia):
+    if frecuencia == "MS":
+        return instante.normalize().replace(day=1)
+    return instante.floor(frecuencia)
+
+
+def _terminos_por_tweet(df):
+    if 'search_terms' in df.columns:
+        return df['search_terms']
+    if 'search_term' in df.columns:
+        return df['search_term'].astype(object).map(lambda t: [t] if isinstance(t, str) else [])
+    return None
+
+
+def rollup(df, desde=None, hasta=None):
+    """
+    Agregados por franja de tiempo de `df` (ver `esquema.py`). `desde` y
+    `hasta` (fechas, `hasta` excluida) extienden la serie a toda la ventana
+    pedida, con 0 en las franjas sin tweets.
+
+    Devuelve None si no hay fechas, o un dict con:
+
+    - `frecuencia` y `etiqueta` (ver `granularidad`),
+    - `totales`: DataFrame con `tweets`, `vistas` e `interacciones` por franja,
+    - `sentimientos`: tweets por sentimiento y franja (None sin `sentimiento`),
+    - `proporciones`: la fracción de cada sentimiento sobre los tweets
+      clasificados de la franja (NaN si no hay ninguno),
+    - `terminos`: tweets por término y franja (un tweet cuenta para cada
+      término de `search_terms`).
+
+    Todos los DataFrames tienen el mismo índice (inicio de cada franja).
+    """
+    if df.empty or 'createdAt' not in df.columns:
+        return None
+    fechas = pd.to_datetime(df['createdAt'], errors='coerce', utc=True)
+    validas = fechas.notna().to_numpy()
+    if not validas.any():
+        return None
+    fechas = fechas[validas]
+
+    inicio, fin = fechas.min(), fechas.max()
+    if desde is not None:
+        inicio = min(inicio, pd.Timestamp(desde, tz="UTC"))
+    if hasta is not None:
+        # `hasta` está excluida: la última franja es la que contiene el instante anterior
+        fin = max(fin, pd.Timestamp(hasta, tz="UTC") - pd.Timedelta(seconds=1))
+    frecuencia, etiqueta = granularidad(inicio, fin)
+
+    # Una columna por métrica, todas agregadas con la misma suma
+    n = int(validas.sum())
+    columnas = {
+        "tweets": np.ones(n, dtype=np.int64),
+        "vistas": df['viewCount'].fillna(0).to_numpy(dtype=np.int64)[validas] if 'viewCount' in df.columns
+        else np.zeros(n, dtype=np.int64),
+        "interacciones": df[[c for c in CONTADORES_INTERACCION if c in df.columns]].fillna(0).sum(axis=1)
+        .to_numpy(dtype=np.int64)[validas],
+    }
+    con_sentimiento = 'sentimiento' in df.columns
+    if con_sentimiento:
+        sentimientos = df['sentimiento'].astype(object).to_numpy()[validas]
+        for sentimiento in SENTIMIENTOS:
+            columnas[f"sentimiento:{sentimiento}"] = (sentimientos == sentimiento).astype(np.int64)
+    indice = pd.DatetimeIndex(fechas, name="time_bucket")
+    tabla = pd.DataFrame(columnas, index=indice).resample(frecuencia).sum()
+    franjas = pd.date_range(_inicio_franja(inicio, frecuencia), _inicio_franja(fin, frecuencia), freq=frecuencia,
+                            name="time_bucket")
+    tabla = tabla.reindex(franjas, fill_value=0)
+
+    # Términos: una fila por (tweet, término) con `explode` y un indicador por término
+    terminos = pd.DataFrame(index=franjas)
+    terminos_por_tweet = _terminos_por_tweet(df)
+    if terminos_por_tweet is not None:
+        por_termino = pd.Series(terminos_por_tweet.to_numpy()[validas], index=indice).explode().dropna()
+        if not por_termino.empty:
+            indicadores = pd.get_dummies(por_termino, dtype=np.int64)[pd.unique(por_termino)]
+            terminos = indicadores.resample(frecuencia).sum().reindex(franjas, fill_value=0)
+
+    resultado = {
+        "frecuencia": frecuencia,
+        "etiqueta": etiqueta,
+        "totales": tabla[["tweets", "vistas", "interacciones"]],
+        "sentimientos": None,
+        "proporciones": None,
+        "terminos": terminos,
+    }
+    if con_sentimiento:
+        conteo = tabla[[f"sentimiento:{s}" for s in SENTIMIENTOS]].rename(columns=lambda c: c.removeprefix("sentimiento:"))
+        clasificados = conteo.sum(axis=1)
+        resultado["sentimientos"] = conteo
+        resultado["proporciones"] = conteo.div(clasificados.where(clasificados > 0), axis=0)
+    return resultado
+
+
+def formato_largo(tabla, nombre_columna, nombre_valor):
+    """Una fila por franja y columna de `tabla` (para gráficos con `color=`)."""
+    return tabla.rename_axis(columns=nombre_columna).stack().rename(nombre_valor).reset_index()
@@ -0,0 +1,109 @@
+# scraping.py
+
+"""
+Obtención de tweets con el actor de Apify.
+
+Como `clasificacion.py`, este módulo no depende de Streamlit: los errores se
+lanzan o se devuelven al llamador para que los muestre en la página.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from esquema import CAMPOS_APIFY, aplanar_items
+
+
+ACTOR_ID = "apidojo/twitter-scraper-lite"
+MAX_ITEMS = 10000  # Mantener un límite razonable para evitar usos excesivos de la API
+TAM_PAGINA = 1000
+
+
+def iterar_paginas(dataset_client, tam_pagina=TAM_PAGINA, metricas=None):
+    """
+    Lee el dataset de Apify página a página y devuelve (generador) un DataFrame
+    compacto y tipado (ver `esquema.py`) por página. Los dicts originales de
+    cada página se descartan en cuanto se aplanan, así que nunca se
+    materializa el dataset completo.
+
+    Con `metricas` (ver `metricas.py`) se mide la descarga de cada página
+    ("apify_descarga") y su aplanado ("normalizacion").
+    """
+    offset = 0
+    while True:
+        inicio = time.perf_counter()
+        pagina = dataset_client.list_items(offset=offset, limit=tam_pagina, fields=CAMPOS_APIFY)
+        items = pagina.items
+        cantidad = len(items)
+        if metricas is not None:
+            metricas.registrar("apify_descarga", time.perf_counter() - inicio, cantidad)
+        if cantidad:
+            inicio = time.perf_counter()
+            chunk = aplanar_items(items)
+            if metricas is not None:
+                metricas.registrar("normalizacion", time.perf_counter() - inicio, cantidad)
+            del items, pagina
+            yield chunk
+        offset += cantidad
+        if cantidad < tam_pagina:
+            break
+
+
+def obtener_tweets(apify_client, search_terms, start_date, end_date, sort_type, max_items=MAX_ITEMS, on_chunk=None,
+                   metricas=None):
+    """
+    Ejecuta el actor de Apify para `search_terms` y devuelve un DataFrame con
+    las columnas que usa el dashboard. Los errores de la API se propagan.
+
+    Si se pasa `on_chunk(df_chunk)`, se invoca con cada página apenas se
+    descarga, para poder procesarla mientras llegan las siguientes. Con
+    `metricas` se mide la espera del actor ("apify_actor") y cada página.
+    """
+    run_input = {
+        "end": end_date,
+        "maxItems": max_items,
+        "searchTerms": search_terms,
+        "sort": sort_type,
+        "start": start_date
+    }
+    inicio = time.perf_counter()
+    run = apify_client.actor(ACTOR_ID).call(run_input=run_input)
+    if metricas is not None:
+        metricas.registrar("apify_actor", time.perf_counter() - inicio, detalle=", ".join(search_terms))
+    chunks = []
+    for chunk in iterar_paginas(apify_client.run(run['id']).dataset(), metricas=metricas):
+        if on_chunk:
+            on_chunk(chunk)
+        chunks.append(chunk)
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
+
+
+def scrapear_en_paralelo(obtener, terms, max_workers=4, on_term_done=None):
+    """
+    Lanza `obtener(term)` para todos los términos a la vez, con a lo sumo
+    `max_workers` ejecuciones del actor simultáneas.
+
+    Un término que falla no detiene a los demás. Devuelve `(resultados, errores)`:
+    `resultados` mapea término -> DataFrame y `errores` término -> excepción.
+    `on_term_done(term, completados, total)` se invoca desde el hilo llamador.
+    """
+    resultados = {}
+    errores = {}
+    if not terms:
+        return resultados, errores
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(terms)))) as executor:
+        futuros = {executor.submit(obtener, term): term for term in terms}
+        for completados, futuro in enumerate(as_completed(futuros), start=1):
+            term = futuros[futuro]
+            try:
+                resultados[term] = futuro.result()
+            except Exception as e:
+                errores[term] = e
+            if on_term_done:
+                on_term_done(term, completados, len(terms))
+
+    return resultados, errores
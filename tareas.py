@@ -0,0 +1,39 @@
+# tareas.py
+
+"""
+Planificador mínimo de tareas en segundo plano.
+
+Permite lanzar una tarea en cuanto están sus datos (por ejemplo, los temas
+generales apenas termina el scraping, sin esperar a la clasificación) y
+consumir los resultados en el orden en que terminan.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class PlanificadorTareas:
+    """Tareas con nombre sobre un pool de hilos acotado."""
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self._futuros = {}
+
+    def lanzar(self, nombre, funcion, *args, **kwargs):
+        """Programa `funcion(*args, **kwargs)` y devuelve su futuro."""
+        futuro = self._executor.submit(funcion, *args, **kwargs)
+        self._futuros[futuro] = nombre
+        return futuro
+
+    def __len__(self):
+        return len(self._futuros)
+
+    def a_medida_que_terminan(self):
+        """
+        Recorre `(nombre, futuro)` de todas las tareas lanzadas, a medida que
+        terminan. `futuro.result()` vuelve a lanzar la excepción de la tarea.
+        """
+        for futuro in as_completed(list(self._futuros)):
+            yield self._futuros[futuro], futuro
+
+    def cerrar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,440 @@
+# temas.py
+
+"""
+Extracción de temas principales con Gemini.
+
+Las funciones no dependen de Streamlit para poder ejecutarse en segundo plano
+(ver `tareas.py`): los errores de la API se propagan y el llamador decide cómo
+mostrarlos. El texto devuelto sigue el formato que interpreta
+`mostrar_temas_con_contraste` en `app.py`.
+
+El tamaño del prompt lo fija un presupuesto de tokens: los tweets que se envían
+son una muestra representativa (ver `muestreo.py`), no los primeros N.
+`extraer_temas_completos` cubre en cambio todos los tweets con map-reduce:
+temas candidatos por fragmento y una fusión final, con la cantidad de tweets
+de cada tema.
+"""
+
+import hashlib
+import json
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from clasificacion import preparar_tweet
+from duplicados import normalizar_para_duplicados
+from muestreo import (PRESUPUESTO_TOKENS_TEMAS, TOKENS_POR_LINEA, estimar_tokens, lineas_para_prompt,
+                      muestra_representativa)
+
+
+def extraer_temas_con_ia(tweets, sentimiento, contexto, model, num_temas=3):
+    if not model:
+        return "El modelo de IA no está disponible para extraer temas."
+
+    # Actualización del prompt para que coincida con el formato de la función de visualización
+    prompt = f"""CONTEXTO: {contexto}
+    Aquí hay tweets clasificados como {sentimiento}. Extrae los {num_temas} temas principales, explicando brevemente cada uno y dando un ejemplo.
+    El formato de salida debe ser exactamente:
+    1. [Nombre del tema]
+    [Breve explicación del tema]
+    Ejemplo: "[tweet de ejemplo relevante]", [author/userName: usuario_ejemplo]
+    2. [Nombre del tema]
+    ...
+    ---
+    Tweets para analizar:\n"""
+
+    texto = "\n".join(tweets)
+    if not texto.strip():
+        return "No hay tweets suficientes para extraer temas."
+
+    response = model.generate_content(prompt + texto, generation_config={"temperature": 0.4})
+    return response.text.strip()
+
+
+# --- FUNCIÓN PARA TEMAS GENERALES (también con el prompt actualizado) ---
+def extraer_temas_generales_con_ia(tweets, contexto, model, num_temas=5):
+    if not model:
+        return "El modelo de IA no está disponible para extraer temas generales."
+
+    # Actualización del prompt para que coincida con el formato de la función de visualización
+    prompt = f"""CONTEXTO: {contexto}
+    Analiza la siguiente colección de tweets y extrae los {num_temas} temas principales o más mencionados.
+    Para cada tema, proporciona un nombre, una breve explicación y un tweet de ejemplo relevante.
+    El formato de salida debe ser exactamente:
+    1. [Nombre del tema]
+    [Breve explicación del tema]
+    Ejemplo: "[tweet de ejemplo relevante]", [author/userName: usuario_ejemplo]
+    2. [Nombre del tema]
+    ...
+    ---
+    Tweets para analizar:\n"""
+
+    texto = "\n".join(tweets)
+
+    if not texto.strip():
+        return "No hay tweets suficientes para extraer temas generales."
+
+    response = model.generate_content(prompt + texto, generation_config={"temperature": 0.4})
+    return response.text.strip()
+
+
+def extraer_temas_de_muestra(df, contexto, model, sentimiento=None, presupuesto_tokens=PRESUPUESTO_TOKENS_TEMAS):
+    """
+    Elige una muestra representativa de `df` que entre en `presupuesto_tokens`
+    y extrae sus temas: generales si `sentimiento` es None, o los de ese
+    sentimiento en otro caso.
+    """
+    lineas = lineas_para_prompt(muestra_representativa(df, presupuesto_tokens))
+    if sentimiento is None:
+        return extraer_temas_generales_con_ia(lineas, contexto, model)
+    return extraer_temas_con_ia(lineas, sentimiento, contexto, model)
+
+
+# --- Temas sobre todos los tweets (map-reduce) ---
+#
+# 1. Los textos únicos (con cuántas veces se repitió cada uno) se ordenan por
+#    fecha y se cortan en fragmentos de hasta `TOKENS_POR_FRAGMENTO`. El corte
+#    depende del contenido (un texto cuyo hash es múltiplo de `DIVISOR_CORTE`
+#    cierra el fragmento una vez pasada la mitad del presupuesto), así que
+#    sumar tweets nuevos no corre los límites de los fragmentos anteriores.
+# 2. Map: Gemini propone hasta `CANDIDATOS_POR_FRAGMENTO` temas por fragmento,
+#    en paralelo, indicando qué tweets pertenecen a cada uno; de ahí (y de las
+#    repeticiones de cada texto) sale la cantidad de tweets por tema. Los
+#    candidatos de cada fragmento se guardan en `cache_temas.CacheTemas`.
+# 3. Reduce: los candidatos se fusionan en los temas finales. Si no entran en
+#    `TOKENS_REDUCCION`, se fusionan primero por grupos (en paralelo) y luego
+#    se fusionan los resultados, hasta que entren en un solo prompt.
+
+TOKENS_POR_FRAGMENTO = 6000
+TOKENS_REDUCCION = 12000
+CANDIDATOS_POR_FRAGMENTO = 5
+DIVISOR_CORTE = 16
+# Cambiarla invalida los candidatos guardados (p. ej. si cambia el prompt de fragmento)
+VERSION_FRAGMENTO = "1"
+
+# Salida de un fragmento: temas con el número de un tweet de ejemplo y los de todos sus tweets
+ESQUEMA_CANDIDATOS = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "tema": {"type": "string"},
+            "explicacion": {"type": "string"},
+            "ejemplo": {"type": "integer"},
+            "tweets": {"type": "array", "items": {"type": "integer"}},
+        },
+        "required": ["tema", "explicacion", "ejemplo", "tweets"],
+    },
+}
+
+# Salida de una fusión: temas con los números de los candidatos que agrupan
+ESQUEMA_FUSION = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "tema": {"type": "string"},
+            "explicacion": {"type": "string"},
+            "candidatos": {"type": "array", "items": {"type": "integer"}},
+        },
+        "required": ["tema", "explicacion", "candidatos"],
+    },
+}
+
+
+def textos_unicos(df):
+    """
+    Un registro por texto (normalizado) con `text` y `author/userName` de la
+    copia más vista, `repeticiones` y `fecha` (la primera aparición),
+    ordenados por fecha y texto.
+    """
+    columnas = ['text'] + [c for c in ('author/userName', 'createdAt', 'viewCount') if c in df.columns]
+    datos = df[columnas].copy()
+    datos['text'] = datos['text'].astype(str)
+    datos['_clave'] = datos['text'].map(normalizar_para_duplicados)
+    datos = datos[datos['_clave'] != ""]
+    if datos.empty:
+        return []
+    datos['repeticiones'] = datos.groupby('_clave')['text'].transform('size')
+    datos['fecha'] = (
+        pd.to_datetime(datos['createdAt'], errors='coerce', utc=True).groupby(datos['_clave']).transform('min')
+        if 'createdAt' in datos.columns else pd.NaT
+    )
+    if 'viewCount' in datos.columns:
+        datos = datos.sort_values('viewCount', ascending=False, kind='stable')
+    datos = datos.drop_duplicates('_clave').sort_values(['fecha', '_clave'], na_position='last')
+    return datos.to_dict('records')
+
+
+def fragmentar(unidades, presupuesto_tokens=TOKENS_POR_FRAGMENTO, divisor=DIVISOR_CORTE):
+    """Corta `unidades` (ver `textos_unicos`) en fragmentos por contenido, de hasta `presupuesto_tokens`."""
+    fragmentos, actual, tokens = [], [], 0
+    for unidad in unidades:
+        costo = estimar_tokens(unidad['text']) + TOKENS_POR_LINEA
+        if actual and tokens + costo > presupuesto_tokens:
+            fragmentos.append(actual)
+            actual, tokens = [], 0
+        actual.append(unidad)
+        tokens += costo
+        if tokens >= presupuesto_tokens // 2 and zlib.crc32(unidad['_clave'].encode("utf-8")) % divisor == 0:
+            fragmentos.append(actual)
+            actual, tokens = [], 0
+    if actual:
+        fragmentos.append(actual)
+    return fragmentos
+
+
+def _linea_fragmento(numero, unidad):
+    linea = f'[{numero}] "{preparar_tweet(unidad["text"])}"'
+    usuario = unidad.get('author/userName')
+    if isinstance(usuario, str) and usuario:
+        linea += f" (@{usuario})"
+    return linea
+
+
+def clave_fragmento(fragmento, contexto, sentimiento, modelo):
+    """
+    Hash estable de los textos del fragmento y de lo que cambia su respuesta.
+    No incluye las repeticiones, que se cuentan después: si un texto viejo se
+    repite en tweets nuevos, el fragmento sigue en la caché.
+    """
+    contenido = "\x1f".join([VERSION_FRAGMENTO, contexto or "", sentimiento or "", modelo or "",
+                             *(u['_clave'] for u in fragmento)])
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def _json_lista(texto):
+    try:
+        datos = json.loads(texto)
+    except ValueError:
+        raise ValueError(f"Respuesta de temas con formato inválido: {texto[:200]!r}")
+    if not isinstance(datos, list):
+        raise ValueError("Respuesta de temas con formato inválido: se esperaba una lista.")
+    return [entrada for entrada in datos if isinstance(entrada, dict) and str(entrada.get("tema", "")).strip()]
+
+
+def candidatos_de_fragmento(fragmento, contexto, model, sentimiento=None):
+    """
+    Map: hasta `CANDIDATOS_POR_FRAGMENTO` temas del fragmento, como dicts con
+    `tema`, `explicacion`, `miembros` (posiciones en el fragmento de sus
+    tweets) y `ejemplo` (la posición de uno de ellos). Es lo que se guarda en
+    la caché; `contar_candidatos` les agrega las cantidades. Los errores de la
+    API y las respuestas inválidas se propagan.
+    """
+    descripcion = f"clasificados como {sentimiento}" if sentimiento else "sobre la conversación"
+    prompt = f"""CONTEXTO: {contexto}
+    Aquí hay un fragmento de tweets {descripcion}, numerados entre corchetes.
+    Identifica hasta {CANDIDATOS_POR_FRAGMENTO} temas principales. Para cada tema indica un nombre corto,
+    una explicación de una oración, el número de un tweet de ejemplo representativo y los números
+    de todos los tweets del fragmento que tratan ese tema.
+    Responde con una lista JSON: [{{"tema": "...", "explicacion": "...", "ejemplo": 3, "tweets": [1, 3, 8]}}]
+    ---
+    Tweets:\n"""
+    prompt += "\n".join(_linea_fragmento(i, unidad) for i, unidad in enumerate(fragmento, start=1))
+    response = model.generate_content(
+        prompt,
+        generation_config={
+            "temperature": 0.3,
+            "response_mime_type": "application/json",
+            "response_schema": ESQUEMA_CANDIDATOS,
+        },
+    )
+
+    candidatos = []
+    for entrada in _json_lista(response.text.strip())[:CANDIDATOS_POR_FRAGMENTO]:
+        miembros = set()
+        for numero in entrada.get("tweets") or []:
+            if isinstance(numero, int) and 1 <= numero <= len(fragmento):
+                miembros.add(numero - 1)
+        ejemplo = entrada.get("ejemplo")
+        if isinstance(ejemplo, int) and 1 <= ejemplo <= len(fragmento):
+            miembros.add(ejemplo - 1)
+            ejemplo -= 1
+        elif miembros:
+            ejemplo = min(miembros)
+        else:
+            continue
+        candidatos.append({
+            "tema": " ".join(str(entrada["tema"]).split()),
+            "explicacion": " ".join(str(entrada.get("explicacion", "")).split()),
+            "miembros": sorted(miembros),
+            "ejemplo": ejemplo,
+        })
+    return candidatos
+
+
+def contar_candidatos(fragmento, candidatos):
+    """
+    Los candidatos de un fragmento con `tweets` (cuántos tweets, contando los
+    repetidos), y el texto y el usuario del tweet de ejemplo.
+    """
+    contados = []
+    for candidato in candidatos:
+        unidad = fragmento[candidato["ejemplo"]]
+        usuario = unidad.get('author/userName')
+        contados.append({
+            "tema": candidato["tema"],
+            "explicacion": candidato["explicacion"],
+            "tweets": sum(fragmento[i]['repeticiones'] for i in candidato["miembros"]),
+            "ejemplo": preparar_tweet(unidad['text']),
+            "usuario": usuario if isinstance(usuario, str) and usuario else "desconocido",
+        })
+    return contados
+
+
+def fusionar_candidatos(candidatos, contexto, model, num_temas, sentimiento=None):
+    """
+    Reduce: agrupa `candidatos` en hasta `num_temas` temas. La cantidad de
+    tweets de cada tema es la suma de sus candidatos (cada uno cuenta una
+    vez) y el ejemplo es el del candidato con más tweets.
+    """
+    descripcion = f"de tweets clasificados como {sentimiento}" if sentimiento else "de la conversación"
+    prompt = f"""CONTEXTO: {contexto}
+    Estos son temas candidatos {descripcion}, extraídos de distintos fragmentos de tweets, numerados
+    entre corchetes y con la cantidad de tweets de cada uno. Fusiona los que tratan lo mismo y devuelve
+    los {num_temas} temas principales de todo el conjunto, ordenados por importancia, con un nombre corto,
+    una explicación de una oración y los números de los candidatos que agrupa cada uno.
+    Responde con una lista JSON: [{{"tema": "...", "explicacion": "...", "candidatos": [1, 4]}}]
+    ---
+    Candidatos:\n"""
+    prompt += "\n".join(
+        f"[{i}] {c['tema']}: {c['explicacion']} ({c['tweets']} tweets)" for i, c in enumerate(candidatos, start=1)
+    )
+    response = model.generate_content(
+        prompt,
+        generation_config={
+            "temperature": 0.3,
+            "response_mime_type": "application/json",
+            "response_schema": ESQUEMA_FUSION,
+        },
+    )
+
+    temas, usados = [], set()
+    for entrada in _json_lista(response.text.strip()):
+        numeros = []
+        for numero in entrada.get("candidatos") or []:
+            if isinstance(numero, int) and 1 <= numero <= len(candidatos) and numero not in usados:
+                usados.add(numero)
+                numeros.append(numero)
+        if not numeros:
+            continue
+        principal = max((candidatos[n - 1] for n in numeros), key=lambda c: c["tweets"])
+        temas.append({
+            "tema": " ".join(str(entrada["tema"]).split()),
+            "explicacion": " ".join(str(entrada.get("explicacion", "")).split()),
+            "tweets": sum(candidatos[n - 1]["tweets"] for n in numeros),
+            "ejemplo": principal["ejemplo"],
+            "usuario": principal["usuario"],
+        })
+        if len(temas) == num_temas:
+            break
+    return temas
+
+
+def formatear_temas(temas):
+    """Texto en el formato que interpreta `mostrar_temas_con_contraste`, con la cantidad de tweets en el título."""
+    bloques = []
+    for numero, tema in enumerate(temas, start=1):
+        bloques.append(
+            f"{numero}. {tema['tema']} (~{tema['tweets']:,} tweets)\n"
+            f"{tema['explicacion']}\n"
+            f"Ejemplo: \"{tema['ejemplo']}\", [author/userName: {tema['usuario']}]"
+        )
+    return "\n".join(bloques)
+
+
+def _grupos_por_tokens(candidatos, presupuesto_tokens):
+    grupos, actual, tokens = [], [], 0
+    for candidato in candidatos:
+        costo = estimar_tokens(f"{candidato['tema']}: {candidato['explicacion']}") + TOKENS_POR_LINEA
+        if actual and tokens + costo > presupuesto_tokens:
+            grupos.append(actual)
+            actual, tokens = [], 0
+        actual.append(candidato)
+        tokens += costo
+    if actual:
+        grupos.append(actual)
+    return grupos
+
+
+def extraer_temas_completos(df, contexto, model, sentimiento=None, cache=None, max_workers=4,
+                            presupuesto_fragmento=TOKENS_POR_FRAGMENTO, presupuesto_reduccion=TOKENS_REDUCCION,
+                            num_temas=None, metricas=None):
+    """
+    Temas de todos los tweets de `df` con map-reduce (ver arriba): generales
+    si `sentimiento` es None, o los de ese sentimiento. Devuelve el texto de
+    `formatear_temas`. Un fragmento que falla se omite (y se cuenta en
+    `metricas` como `fragmentos_fallidos`); si fallan todos, o falla la
+    fusión, el error se propaga.
+    """
+    if not model:
+        return "El modelo de IA no está disponible para extraer temas."
+    num_temas = num_temas or (3 if sentimiento else 5)
+    contar = metricas.contar if metricas is not None else (lambda nombre, valor=1, etapa=None: None)
+
+    fragmentos = fragmentar(textos_unicos(df), presupuesto_fragmento)
+    if not fragmentos:
+        return "No hay tweets suficientes para extraer temas."
+    contar("fragmentos", len(fragmentos), etapa="temas")
+
+    modelo = getattr(model, "model_name", None) or type(model).__name__
+    candidatos_por_fragmento = [None] * len(fragmentos)
+    pendientes = []
+    for i, fragmento in enumerate(fragmentos):
+        clave = clave_fragmento(fragmento, contexto, sentimiento, modelo)
+        guardados = cache.obtener(clave) if cache is not None else None
+        if guardados is not None:
+            candidatos_por_fragmento[i] = guardados
+        else:
+            pendientes.append((i, clave))
+    contar("fragmentos_cache", len(fragmentos) - len(pendientes), etapa="temas")
+
+    # --- Map ---
+    ultimo_error = None
+    if pendientes:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pendientes)))) as executor:
+            futuros = {
+                executor.submit(candidatos_de_fragmento, fragmentos[i], contexto, model, sentimiento): (i, clave)
+                for i, clave in pendientes
+            }
+            for futuro in as_completed(futuros):
+                i, clave = futuros[futuro]
+                try:
+                    candidatos_por_fragmento[i] = futuro.result()
+                except Exception as e:
+                    ultimo_error = e
+                    contar("fragmentos_fallidos", etapa="temas")
+                    continue
+                if cache is not None:
+                    cache.guardar(clave, candidatos_por_fragmento[i])
+        if cache is not None:
+            cache.purgar()
+    if all(c is None for c in candidatos_por_fragmento):
+        raise ultimo_error
+    candidatos = [
+        candidato
+        for fragmento, lista in zip(fragmentos, candidatos_por_fragmento) if lista
+        for candidato in contar_candidatos(fragmento, lista)
+    ]
+    if not candidatos:
+        return "No se encontraron temas en los tweets."
+
+    # --- Reduce (por niveles mientras los candidatos no entren en un prompt) ---
+    intermedios = max(num_temas, 2 * CANDIDATOS_POR_FRAGMENTO)
+    while len(_grupos_por_tokens(candidatos, presupuesto_reduccion)) > 1:
+        grupos = _grupos_por_tokens(candidatos, presupuesto_reduccion)
+        contar("fusiones_intermedias", len(grupos), etapa="temas")
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(grupos)))) as executor:
+            resultados = list(executor.map(
+                lambda grupo: fusionar_candidatos(grupo, contexto, model, intermedios, sentimiento), grupos
+            ))
+        fusionados = [c for lista in resultados for c in lista]
+        if len(fusionados) >= len(candidatos):
+            # La fusión no achicó la lista: se sigue con los de más tweets
+            fusionados = sorted(fusionados, key=lambda c: c["tweets"], reverse=True)[:len(candidatos) // 2]
+        candidatos = fusionados
+    if not candidatos:
+        return "No se encontraron temas en los tweets."
+    temas = fusionar_candidatos(candidatos, contexto, model, num_temas, sentimiento)
+    return formatear_temas(temas)
@@ -0,0 +1,79 @@
+# tests/test_almacen_tweets.py
+
+"""`obtener_incremental`: sólo se descargan los días que faltan en el almacén."""
+
+import os
+import sys
+from datetime import date
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from almacen_tweets import AlmacenTweets, obtener_incremental, rangos_contiguos  # noqa: E402
+
+
+HOY = date(2024, 1, 10)
+
+
+def _descargar(pedidos):
+    def obtener_rango(termino, inicio, fin):
+        pedidos.append((inicio, fin))
+        dias = pd.date_range(inicio, fin, freq="D", inclusive="left", tz="UTC")
+        return pd.DataFrame({
+            "text": [f"{termino} {dia.date()}" for dia in dias],
+            "url": [f"u/{termino}/{dia.date()}" for dia in dias],
+            "createdAt": dias + pd.Timedelta(hours=12),
+            "viewCount": 1,
+        })
+    return obtener_rango
+
+
+def test_rangos_contiguos():
+    dias = [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 5)]
+    assert rangos_contiguos(dias) == [(date(2024, 1, 1), date(2024, 1, 3)), (date(2024, 1, 5), date(2024, 1, 6))]
+
+
+def test_desplazar_la_ventana_descarga_solo_los_dias_nuevos(tmp_path):
+    almacen = AlmacenTweets(str(tmp_path / "tweets.sqlite3"))
+    pedidos = []
+
+    df, descargados = obtener_incremental(almacen, "banco", date(2024, 1, 1), date(2024, 1, 8), _descargar(pedidos), hoy=HOY)
+    assert pedidos == [(date(2024, 1, 1), date(2024, 1, 8))]
+    assert descargados == 7 and len(df) == 7
+
+    pedidos.clear()
+    df, descargados = obtener_incremental(almacen, "banco", date(2024, 1, 2), date(2024, 1, 9), _descargar(pedidos), hoy=HOY)
+    assert pedidos == [(date(2024, 1, 8), date(2024, 1, 9))]
+    assert descargados == 1
+    assert sorted(df["url"]) == [f"u/banco/2024-01-0{d}" for d in range(2, 9)]
+
+    # Otro término no comparte la cobertura
+    pedidos.clear()
+    obtener_incremental(almacen, "galicia", date(2024, 1, 2), date(2024, 1, 4), _descargar(pedidos), hoy=HOY)
+    assert pedidos == [(date(2024, 1, 2), date(2024, 1, 4))]
+
+
+def test_no_cubre_hoy_ni_descargas_cortadas(tmp_path):
+    almacen = AlmacenTweets(str(tmp_path / "tweets.sqlite3"))
+    pedidos = []
+    obtener_incremental(almacen, "banco", date(2024, 1, 8), date(2024, 1, 11), _descargar(pedidos), hoy=HOY)
+    assert almacen.dias_faltantes("banco", "Top", date(2024, 1, 8), date(2024, 1, 11)) == [HOY]
+
+    # Una descarga que llega a `max_items` puede estar incompleta: no cubre ningún día
+    obtener_incremental(almacen, "tarjeta", date(2024, 1, 1), date(2024, 1, 4), _descargar(pedidos), max_items=3, hoy=HOY)
+    assert len(almacen.dias_faltantes("tarjeta", "Top", date(2024, 1, 1), date(2024, 1, 4))) == 3
+
+
+def test_on_almacenados_recibe_solo_lo_que_no_se_descargo(tmp_path):
+    almacen = AlmacenTweets(str(tmp_path / "tweets.sqlite3"))
+    pedidos = []
+    almacenados = []
+    obtener_incremental(almacen, "banco", date(2024, 1, 1), date(2024, 1, 4), _descargar(pedidos), hoy=HOY,
+                        on_almacenados=almacenados.append)
+    assert almacenados[-1].empty
+
+    df, _ = obtener_incremental(almacen, "banco", date(2024, 1, 2), date(2024, 1, 6), _descargar(pedidos), hoy=HOY,
+                                on_almacenados=almacenados.append)
+    assert len(df) == 4
+    assert sorted(almacenados[-1]["url"]) == ["u/banco/2024-01-02", "u/banco/2024-01-03"]
@@ -0,0 +1,44 @@
+# tests/test_cache_sentimientos.py
+
+"""`CacheSentimientos`: claves por contexto y modelo, y `ejemplos` de un solo contexto y modelo."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_sentimientos import CacheSentimientos, clave_sentimiento  # noqa: E402
+
+
+def _guardar(cache, textos, contexto, modelo, sentimiento):
+    cache.guardar([(clave_sentimiento(texto, contexto, modelo), texto, sentimiento) for texto in textos], contexto, modelo)
+
+
+def test_otro_contexto_u_otro_modelo_no_comparten_entradas(tmp_path):
+    cache = CacheSentimientos(str(tmp_path / "sentimientos.sqlite3"))
+    _guardar(cache, ["hola"], "bancos", "gemini", "POSITIVO")
+
+    assert cache.obtener([clave_sentimiento("hola", "bancos", "gemini")]) == {
+        clave_sentimiento("hola", "bancos", "gemini"): "POSITIVO"
+    }
+    assert cache.obtener([clave_sentimiento("hola", "autos", "gemini")]) == {}
+    assert cache.obtener([clave_sentimiento("hola", "bancos", "otro")]) == {}
+
+
+def test_ejemplos_filtra_por_contexto_y_modelo(tmp_path):
+    cache = CacheSentimientos(str(tmp_path / "sentimientos.sqlite3"))
+    _guardar(cache, [f"banco {i}" for i in range(5)], "bancos", "gemini", "POSITIVO")
+    _guardar(cache, [f"auto {i}" for i in range(5)], "autos", "gemini", "NEGATIVO")
+    _guardar(cache, [f"otro {i}" for i in range(5)], "bancos", "otro", "NEUTRO")
+
+    ejemplos = cache.ejemplos(10, "bancos", "gemini")
+    assert sorted(texto for texto, _ in ejemplos) == [f"banco {i}" for i in range(5)]
+    assert {sentimiento for _, sentimiento in ejemplos} == {"POSITIVO"}
+    assert len(cache.ejemplos(3, "autos", "gemini")) == 3
+    assert cache.ejemplos(10, "sin etiquetas", "gemini") == []
+
+
+def test_ejemplos_no_devuelve_entradas_vencidas(tmp_path):
+    cache = CacheSentimientos(str(tmp_path / "sentimientos.sqlite3"), ttl=-1)
+    _guardar(cache, ["hola"], "bancos", "gemini", "POSITIVO")
+    assert cache.ejemplos(10, "bancos", "gemini") == []
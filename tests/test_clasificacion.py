@@ -0,0 +1,76 @@
+# tests/test_clasificacion.py
+
+"""`interpretar_respuesta` ante respuestas de Gemini bien y mal formadas, y `ClasificadorIncremental` con `GeminiFalso`."""
+
+import json
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+from cache_sentimientos import CacheSentimientos, clave_sentimiento  # noqa: E402
+from clasificacion import ClasificadorIncremental, interpretar_respuesta, nombre_modelo  # noqa: E402
+from falsos import GeminiFalso  # noqa: E402
+
+
+def test_interpretar_json():
+    respuesta = json.dumps([
+        {"indice": 1, "sentimiento": "POSITIVO"},
+        {"indice": 2, "sentimiento": "negativo "},
+        {"indice": 3, "sentimiento": "NEUTRO"},
+    ])
+    assert interpretar_respuesta(respuesta, 3) == {0: "POSITIVO", 1: "NEGATIVO", 2: "NEUTRO"}
+
+
+def test_interpretar_descarta_indices_y_etiquetas_invalidos():
+    respuesta = json.dumps([
+        {"indice": 0, "sentimiento": "POSITIVO"},  # fuera de rango (empiezan en 1)
+        {"indice": 4, "sentimiento": "POSITIVO"},  # fuera de rango
+        {"indice": 1, "sentimiento": "ENOJADO"},
+        {"indice": "2", "sentimiento": "NEGATIVO"},
+        {"indice": 2, "sentimiento": "POSITIVO"},  # repetido: vale el primero
+        {"indice": None, "sentimiento": "NEUTRO"},
+        "basura",
+    ])
+    assert interpretar_respuesta(respuesta, 3) == {1: "NEGATIVO"}
+
+
+def test_interpretar_texto_libre():
+    respuesta = "Tweet 1: positivo\nTweet 3:NEUTRO\nTweet 9: NEGATIVO\nNo sé qué decir"
+    assert interpretar_respuesta(respuesta, 3) == {0: "POSITIVO", 2: "NEUTRO"}
+    assert interpretar_respuesta("Lo siento, no puedo clasificar estos tweets.", 3) == {}
+
+
+def test_clasificador_incremental_agrupa_repetidos():
+    modelo = GeminiFalso()
+    clasificador = ClasificadorIncremental("Contexto", modelo, presupuesto_tokens=200, max_workers=2)
+    clasificador.agregar(["uno", "dos", "uno"])
+    clasificador.agregar(["tres"])
+    sentimientos = clasificador.finalizar(["uno", "dos", "tres", "uno"])
+
+    assert len(sentimientos) == 4
+    assert sentimientos[0] == sentimientos[3]
+    assert all(sentimiento in ("POSITIVO", "NEGATIVO", "NEUTRO") for sentimiento in sentimientos)
+    assert clasificador.estadisticas["tweets"] == 4
+    assert clasificador.estadisticas["textos_unicos"] == 3
+
+
+def test_textos_unicos_cuenta_solo_los_textos_devueltos(tmp_path):
+    modelo = GeminiFalso()
+    cache = CacheSentimientos(str(tmp_path / "sentimientos.sqlite3"))
+    cache.guardar([
+        (clave_sentimiento(texto, "Contexto", nombre_modelo(modelo)), texto, "POSITIVO")
+        for texto in ("descartado", "uno")
+    ], "Contexto", nombre_modelo(modelo))
+    clasificador = ClasificadorIncremental("Contexto", modelo, presupuesto_tokens=200, cache=cache)
+    clasificador.agregar(["descartado", "otro descartado", "uno"])
+    avances = []
+    sentimientos = clasificador.finalizar(["uno", "dos", "uno"], on_progress=lambda hechos, total: avances.append((hechos, total)))
+
+    assert len(sentimientos) == 3
+    assert clasificador.estadisticas["textos_unicos"] == 2
+    assert clasificador.estadisticas["aciertos_cache"] == 1  # "descartado" no cuenta
+    assert {total for _, total in avances} == {2}
+    assert avances[-1] == (2, 2)
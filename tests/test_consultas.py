@@ -0,0 +1,68 @@
+# tests/test_consultas.py
+
+"""Atribución de tweets a términos (`BuscadorTerminos`, `separar_por_termino`) y agrupación de búsquedas."""
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from consultas import BuscadorTerminos, piezas_termino, planificar_ejecuciones, separar_por_termino  # noqa: E402
+
+
+def test_piezas_termino():
+    assert piezas_termino("Banco Galicia") == [("banco",), ("galicia",)]
+    assert piezas_termino('"mercado pago" app') == [("mercado", "pago"), ("app",)]
+    assert piezas_termino("from:bbva") is None
+    assert piezas_termino("a OR b") is None
+    assert piezas_termino("-spam banco") is None
+
+
+def test_buscador_palabras_en_cualquier_orden_y_frases_seguidas():
+    buscador = BuscadorTerminos(["Banco Galicia", '"mercado pago"', "#Ualá", "pago"])
+
+    assert buscador.terminos_de("Me encanta el banco de galicia") == ["Banco Galicia"]
+    assert buscador.terminos_de("pago con MERCADO PAGO") == ['"mercado pago"', "pago"]
+    assert buscador.terminos_de("pago mercado") == ["pago"]
+    # Sin tildes ni mayúsculas; un término #hashtag pide el hashtag
+    assert buscador.terminos_de("#UALA") == ["#Ualá"]
+    assert buscador.terminos_de("uso uala") == []
+    assert BuscadorTerminos(["uala"]).terminos_de("#Ualá") == ["uala"]
+    assert buscador.terminos_de("nada que ver") == []
+
+
+def test_buscador_frases_que_se_solapan():
+    buscador = BuscadorTerminos(['"a b c"', '"b c d"', '"c"'])
+    assert buscador.terminos_de("x a b c d") == ['"a b c"', '"b c d"', '"c"']
+    assert buscador.terminos_de("a b x c d") == ['"c"']
+
+
+def test_separar_por_termino_no_atribuye_los_que_no_coinciden():
+    df = pd.DataFrame({
+        "text": ["banco y galicia", "solo banco", "sin coincidencias", None],
+        "url": ["u/1", "u/2", "u/3", "u/4"],
+    })
+    partes, sin_atribuir = separar_por_termino(df, ["banco", "galicia"])
+
+    assert partes["banco"]["url"].tolist() == ["u/1", "u/2"]
+    assert partes["galicia"]["url"].tolist() == ["u/1"]
+    assert sin_atribuir["url"].tolist() == ["u/3", "u/4"]
+
+
+def test_separar_por_termino_sin_texto():
+    df = pd.DataFrame({"url": ["u/1"]})
+    partes, sin_atribuir = separar_por_termino(df, ["banco"])
+    assert partes["banco"].empty
+    assert sin_atribuir["url"].tolist() == ["u/1"]
+
+
+def test_planificar_ejecuciones():
+    grupos = planificar_ejecuciones(["a", "b", "from:x", "c", "d"], {"a": 6000, "b": 5000, "c": 100, "d": 100}, 10000)
+
+    assert ["from:x"] in grupos
+    assert sorted(t for grupo in grupos for t in grupo) == ["a", "b", "c", "d", "from:x"]
+    # "a" y "b" no entran juntos en el presupuesto
+    assert not any({"a", "b"} <= set(grupo) for grupo in grupos)
+    assert len(grupos) == 3
@@ -0,0 +1,36 @@
+# tests/test_exportacion.py
+
+"""La columna `search_terms` (una lista por tweet) se exporta en un formato que otras herramientas pueden leer."""
+
+import json
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exportacion import exportar  # noqa: E402
+
+
+def _resultado():
+    df = pd.DataFrame({
+        "text": ["banco y galicia", "solo banco"],
+        "url": ["u/1", "u/2"],
+        "search_terms": [["banco", "galicia"], ["banco"]],
+    })
+    return {"df": df, "rankings": None}
+
+
+def test_csv_une_los_terminos(tmp_path):
+    path = exportar(_resultado(), str(tmp_path / "tweets.csv.gz"))
+    df = pd.read_csv(path)
+    assert df["search_terms"].tolist() == ["banco|galicia", "banco"]
+    assert df["search_terms"].str.split("|").tolist() == [["banco", "galicia"], ["banco"]]
+
+
+def test_jsonl_escribe_arreglos(tmp_path):
+    path = exportar(_resultado(), str(tmp_path / "tweets.jsonl"))
+    with open(path, encoding="utf-8") as f:
+        filas = [json.loads(linea) for linea in f]
+    assert [fila["search_terms"] for fila in filas] == [["banco", "galicia"], ["banco"]]
@@ -0,0 +1,117 @@
+# tests/test_llm.py
+
+"""`CubetaTokens`, `Circuito` y los reintentos de `ClienteLLM` contra el `GeminiFalso` de los benchmarks."""
+
+import os
+import sys
+import time
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+from falsos import ErrorFalso  # noqa: E402
+from llm import Circuito, CircuitoAbierto, ClienteLLM, CubetaTokens, es_transitorio  # noqa: E402
+
+
+def test_cubeta_permite_la_rafaga_y_despues_espacia():
+    cubeta = CubetaTokens(rpm=600, rafaga=2)  # una llamada cada 0.1 s
+    inicio = time.monotonic()
+    cubeta.adquirir()
+    cubeta.adquirir()
+    assert time.monotonic() - inicio < 0.05
+    cubeta.adquirir()
+    cubeta.adquirir()
+    assert time.monotonic() - inicio >= 0.15
+
+
+def test_cubeta_sin_rpm_no_limita():
+    cubeta = CubetaTokens()
+    inicio = time.monotonic()
+    for _ in range(1000):
+        cubeta.adquirir()
+    assert time.monotonic() - inicio < 0.5
+
+
+def test_cubeta_reduce_y_recupera_el_ritmo():
+    cubeta = CubetaTokens(rpm=160)
+    cubeta.reducir()
+    assert cubeta.rpm == 80
+    for _ in range(10):
+        cubeta.reducir()
+    assert cubeta.rpm == 10  # nunca menos de 1/16 del máximo
+    for _ in range(100):
+        cubeta.aumentar()
+    assert cubeta.rpm == 160
+
+
+def test_circuito_se_abre_prueba_una_llamada_y_se_cierra():
+    circuito = Circuito(fallos_para_abrir=2, enfriamiento=0.2)
+    circuito.fallo()
+    circuito.esperar(time.monotonic())  # un fallo no lo abre
+    circuito.fallo()
+    assert circuito.abierto
+    with pytest.raises(CircuitoAbierto):
+        circuito.esperar(time.monotonic() + 0.05)
+
+    time.sleep(0.25)
+    circuito.esperar(time.monotonic())  # la llamada de prueba pasa...
+    with pytest.raises(CircuitoAbierto):
+        circuito.esperar(time.monotonic() + 0.05)  # ...y ninguna otra mientras tanto
+    circuito.exito()
+    assert not circuito.abierto
+    circuito.esperar(time.monotonic())
+
+
+class _ModeloQueFalla:
+    model_name = "models/falso"
+
+    def __init__(self, errores):
+        self.errores = list(errores)
+        self.llamadas = 0
+
+    def generate_content(self, prompt, generation_config=None):
+        self.llamadas += 1
+        if self.errores:
+            raise self.errores.pop(0)
+        return "ok"
+
+
+def test_cliente_reintenta_solo_errores_transitorios():
+    modelo = _ModeloQueFalla([ErrorFalso(429, "cuota"), ErrorFalso(503, "no disponible")])
+    cliente = ClienteLLM(modelo, limitador=CubetaTokens(rpm=6000), espera_base=0.001)
+    assert cliente.generate_content("hola") == "ok"
+    assert modelo.llamadas == 3
+    assert cliente.estadisticas["reintentos"] == 2
+    assert cliente.estadisticas["errores_cuota"] == 1
+    assert cliente.limitador.rpm < 6000
+
+    modelo = _ModeloQueFalla([ErrorFalso(400, "pedido inválido")])
+    cliente = ClienteLLM(modelo, espera_base=0.001)
+    with pytest.raises(ErrorFalso):
+        cliente.generate_content("hola")
+    assert modelo.llamadas == 1
+    assert not cliente.circuito.abierto
+
+
+def test_es_transitorio():
+    assert es_transitorio(TimeoutError())
+    assert es_transitorio(ErrorFalso(429, ""))
+    assert not es_transitorio(ErrorFalso(400, ""))
+    assert not es_transitorio(ValueError())
+
+
+def test_cubeta_configurar_cambia_el_maximo_y_conserva_la_reduccion():
+    cubeta = CubetaTokens()
+    cubeta.configurar(120)
+    assert cubeta.rpm == cubeta.rpm_maximo == 120
+    cubeta.reducir()
+    cubeta.configurar(240)
+    assert cubeta.rpm_maximo == 240 and cubeta.rpm == 120
+    cubeta.configurar(0)
+    inicio = time.monotonic()
+    for _ in range(100):
+        cubeta.adquirir()
+    assert time.monotonic() - inicio < 0.5
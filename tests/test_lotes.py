@@ -0,0 +1,57 @@
+# tests/test_lotes.py
+
+"""Presupuesto AIMD de `LoteAdaptativo` y armado de lotes por tokens."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lotes import INCREMENTO_TOKENS, LoteAdaptativo  # noqa: E402
+
+
+def test_tamano_siguiente_llena_hasta_el_presupuesto():
+    lotes = LoteAdaptativo(presupuesto_tokens=100, minimo=10, max_tweets=5)
+    assert lotes.tamano_siguiente([30, 30, 30, 30]) == 3
+    # Un tweet que solo ya excede el presupuesto va igual, solo en su lote
+    assert lotes.tamano_siguiente([500, 10]) == 1
+    assert lotes.tamano_siguiente([1] * 20) == 5
+    assert lotes.tamano_siguiente([]) == 0
+
+
+def test_lleno():
+    lotes = LoteAdaptativo(presupuesto_tokens=100, minimo=10, max_tweets=5)
+    assert not lotes.lleno(99, 4)
+    assert lotes.lleno(100, 1)
+    assert lotes.lleno(10, 5)
+
+
+def test_crece_de_a_poco_y_se_reduce_a_la_mitad():
+    lotes = LoteAdaptativo(presupuesto_tokens=2000, minimo=400, maximo=3000)
+    lotes.registrar(10, 1500, 1.0, resueltos=10)
+    assert lotes.presupuesto == 2000 + INCREMENTO_TOKENS
+    lotes.registrar(10, 1500, 1.0, resueltos=10)
+    lotes.registrar(10, 1500, 1.0, resueltos=10)
+    assert lotes.presupuesto == 3000  # no pasa del máximo
+
+    lotes.registrar(10, 1500, 1.0, resueltos=7)  # faltan tweets
+    assert lotes.presupuesto == 1500
+    lotes.registrar(10, 1500, 1.0, resueltos=0, error=TimeoutError())
+    lotes.registrar(10, 1500, 1.0, resueltos=0, error=TimeoutError())
+    lotes.registrar(10, 1500, 1.0, resueltos=0, error=TimeoutError())
+    assert lotes.presupuesto == 400  # no baja del mínimo
+
+    assert [llamada["error"] for llamada in lotes.historial[-3:]] == ["TimeoutError"] * 3
+
+
+def test_resumen_por_rango_de_tamano():
+    lotes = LoteAdaptativo()
+    lotes.registrar(10, 500, 2.0, resueltos=10)
+    lotes.registrar(20, 900, 2.0, resueltos=18)
+    lotes.registrar(30, 1200, 3.0, resueltos=30)
+    resumen = lotes.resumen(ancho=25)
+
+    assert [fila["tweets_por_lote"] for fila in resumen] == ["1-25", "26-50"]
+    assert resumen[0]["llamadas"] == 2
+    assert resumen[0]["fallos"] == 0.5
+    assert resumen[1]["tweets_por_segundo"] == 10.0
@@ -0,0 +1,133 @@
+# tests/test_pipeline.py
+
+"""
+`ejecutar_analisis` con un Apify simulado y `GeminiFalso`: qué tweets llegan
+a Gemini, a la caché y a los rankings cuando los términos se agrupan.
+"""
+
+import os
+import sys
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+from almacen_tweets import AlmacenTweets  # noqa: E402
+from cache_sentimientos import CacheSentimientos  # noqa: E402
+from clasificacion import ClasificadorIncremental  # noqa: E402
+from falsos import GeminiFalso  # noqa: E402
+from pipeline import ejecutar_analisis  # noqa: E402
+
+
+class GeminiQueAnota(GeminiFalso):
+    """`GeminiFalso` que guarda los prompts que recibe."""
+
+    def __init__(self):
+        super().__init__()
+        self.prompts = []
+
+    def generate_content(self, prompt, generation_config=None):
+        self.prompts.append(prompt)
+        return super().generate_content(prompt, generation_config)
+
+
+def _apify(sin_atribuir, llamadas):
+    """
+    `obtener_rango` simulado: 20 tweets por término y, en las ejecuciones
+    agrupadas, `sin_atribuir` tweets que no mencionan ningún término.
+    """
+    def obtener_rango(terminos, inicio, fin, orden, on_chunk, metricas):
+        llamadas.append(tuple(terminos))
+        filas = [
+            {"text": f"opinión {i} sobre {termino}", "url": f"u/{termino}/{i}", "viewCount": i,
+             "author/userName": f"autor{i % 7}", "createdAt": pd.Timestamp(inicio, tz="UTC") + pd.Timedelta(hours=i)}
+            for termino in terminos for i in range(20)
+        ]
+        if len(terminos) > 1:
+            filas += [
+                {"text": f"nada que ver {i}", "url": f"u/otro/{i}", "viewCount": 10**6,
+                 "author/userName": "ajeno", "createdAt": pd.Timestamp(inicio, tz="UTC")}
+                for i in range(sin_atribuir)
+            ]
+        df = pd.DataFrame(filas)
+        for i in range(0, len(df), 15):
+            if on_chunk:
+                on_chunk(df.iloc[i:i + 15])
+        return df
+    return obtener_rango
+
+
+PARAMETROS = {"terms": ["banco", "galicia"], "start_date": "2024-01-01", "end_date": "2024-01-03",
+              "fusionar_terminos": True}
+
+
+def _ejecutar(tmp_path, sin_atribuir, con_almacen=False):
+    llamadas = []
+    modelo = GeminiQueAnota()
+    cache = CacheSentimientos(str(tmp_path / "sentimientos.sqlite3"))
+    almacen = AlmacenTweets(str(tmp_path / "tweets.sqlite3")) if con_almacen else None
+    resultado = ejecutar_analisis(PARAMETROS, _apify(sin_atribuir, llamadas), modelo, cache=cache, almacen=almacen)
+    return resultado, modelo, cache, llamadas
+
+
+def test_los_tweets_sin_atribuir_no_se_clasifican(tmp_path):
+    for con_almacen in (False, True):
+        resultado, modelo, cache, llamadas = _ejecutar(tmp_path / str(con_almacen), sin_atribuir=2, con_almacen=con_almacen)
+
+        assert llamadas == [("banco", "galicia")]
+        assert len(resultado["df"]) == 40
+        assert not any("nada que ver" in prompt for prompt in modelo.prompts)
+        assert len(cache) == 40
+        assert "ajeno" not in set(resultado["rankings"].top_activos()["author/userName"])
+
+
+def test_una_ejecucion_agrupada_descartada_no_se_clasifica(tmp_path):
+    # Más del 10% sin atribuir: el grupo se vuelve a buscar término por término
+    resultado, modelo, cache, llamadas = _ejecutar(tmp_path, sin_atribuir=10)
+
+    assert llamadas == [("banco", "galicia"), ("banco",), ("galicia",)] or \
+        llamadas == [("banco", "galicia"), ("galicia",), ("banco",)]
+    assert len(resultado["df"]) == 40
+    assert not any("nada que ver" in prompt for prompt in modelo.prompts)
+    assert len(cache) == 40
+    assert resultado["estadisticas"]["textos_unicos"] == 40
+
+
+def test_rankings_cuentan_cada_tweet_una_vez(tmp_path):
+    resultado, _, _, _ = _ejecutar(tmp_path, sin_atribuir=0)
+    rankings = resultado["rankings"]
+
+    assert rankings.tweets == len(resultado["df"])
+    activos = resultado["df"]["author/userName"].value_counts()
+    assert dict(zip(rankings.top_activos()["author/userName"], rankings.top_activos()["tweets"])) == activos.to_dict()
+    assert "sentimiento" in rankings.top_tweets().columns
+
+
+def test_un_termino_se_ingiere_una_vez_desde_apify_la_cache_o_el_almacen(tmp_path, monkeypatch):
+    agregados = []
+    agregar = ClasificadorIncremental.agregar
+    monkeypatch.setattr(
+        ClasificadorIncremental, "agregar", lambda self, textos: (agregados.extend(textos), agregar(self, textos))
+    )
+    almacen = AlmacenTweets(str(tmp_path / "tweets.sqlite3"))
+    parametros = {**PARAMETROS, "terms": ["banco"], "end_date": "2024-01-02"}
+    cacheados = {}
+
+    def obtener_rango_cacheado(terminos, inicio, fin, orden, on_chunk, metricas):
+        # Como `st.cache_data`: la segunda vez devuelve el resultado sin llamar a on_chunk
+        clave = (tuple(terminos), inicio, fin)
+        if clave not in cacheados:
+            cacheados[clave] = _apify(0, [])(terminos, inicio, fin, orden, on_chunk, metricas)
+        return cacheados[clave]
+
+    # Apify, caché de `obtener_rango`, caché + almacén vacío, sólo almacén
+    for alm in (None, None, almacen, almacen):
+        agregados.clear()
+        resultado = ejecutar_analisis(parametros, obtener_rango_cacheado, GeminiFalso(), almacen=alm)
+        assert len(resultado["df"]) == 20
+        # Cada texto llega una vez mientras se ingiere y otra al finalizar la clasificación
+        assert len(agregados) == 2 * 20
+        assert resultado["rankings"].tweets == 20
+        assert resultado["estadisticas"]["textos_unicos"] == 20
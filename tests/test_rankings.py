@@ -0,0 +1,78 @@
+# tests/test_rankings.py
+
+"""`TopK` y `SpaceSaving` contra el cálculo exacto, y `RankingsTweets` por bloques contra el DataFrame completo."""
+
+import os
+import random
+import sys
+from collections import Counter
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rankings import RankingsTweets, SpaceSaving, TopK  # noqa: E402
+
+
+def test_topk_guarda_el_maximo_de_cada_clave():
+    rng = random.Random(0)
+    top = TopK(5)
+    maximos = {}
+    for _ in range(2000):
+        clave, valor = rng.randrange(50), rng.randrange(10_000)
+        top.agregar(clave, valor, datos=clave)
+        maximos[clave] = max(maximos.get(clave, -1), valor)
+
+    esperado = sorted(maximos.items(), key=lambda item: -item[1])[:5]
+    assert [(clave, valor) for clave, valor, _ in top.elementos()] == esperado
+    assert all(clave == datos for clave, _, datos in top.elementos())
+    assert len(top) == 5
+
+
+def test_topk_empates_y_claves_repetidas():
+    top = TopK(2)
+    top.agregar("a", 10)
+    top.agregar("b", 10)
+    top.agregar("c", 10)  # empata con el mínimo: quedan los que llegaron primero
+    top.agregar("a", 10)  # volver a agregar la misma clave no la duplica
+    assert [clave for clave, _, _ in top.elementos()] == ["a", "b"]
+    top.agregar("c", 11)
+    assert [clave for clave, _, _ in top.elementos()] == ["c", "a"]
+
+
+def test_space_saving_acota_el_error():
+    rng = random.Random(1)
+    flujo = [int(rng.paretovariate(1.2)) for _ in range(20_000)]
+    reales = Counter(flujo)
+    sketch = SpaceSaving(50)
+    for clave in flujo:
+        sketch.agregar(clave)
+
+    assert len(sketch) == 50
+    for clave, conteo, error, _ in sketch.elementos():
+        assert conteo - error <= reales[clave] <= conteo
+    # Toda clave con más de `minimo` apariciones está monitoreada
+    monitoreadas = {clave for clave, _, _, _ in sketch.elementos()}
+    assert {clave for clave, real in reales.items() if real > sketch.minimo} <= monitoreadas
+    assert [clave for clave, _, _, _ in sketch.elementos(3)] == [clave for clave, _ in reales.most_common(3)]
+
+
+def test_rankings_por_bloques_coinciden_con_el_df_completo():
+    rng = random.Random(2)
+    df = pd.DataFrame({
+        "url": [f"u/{i}" for i in range(500)],
+        "author/userName": [f"autor{rng.randrange(40)}" for _ in range(500)],
+        "author/followers": [rng.randrange(1000) for _ in range(500)],
+        "viewCount": [rng.randrange(10**6) for _ in range(500)],
+        "likeCount": [rng.randrange(100) for _ in range(500)],
+    })
+    rankings = RankingsTweets.desde_df(df, filas=64)
+
+    assert rankings.tweets == len(df)
+    assert rankings.top_tweets()["url"].tolist() == df.nlargest(10, "viewCount")["url"].tolist()
+    activos = df["author/userName"].value_counts()
+    top = rankings.top_activos()
+    assert (top["error"] == 0).all()
+    assert top["tweets"].tolist() == activos.head(10).tolist()
+    interacciones = df.groupby("author/userName")["likeCount"].sum().sort_values(ascending=False)
+    assert rankings.top_interaccion()["interacciones"].tolist() == interacciones.head(10).tolist()
@@ -0,0 +1,63 @@
+# tests/test_rollup.py
+
+"""Series de `rollup` contra conteos hechos a mano."""
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rollup import granularidad, rollup  # noqa: E402
+
+
+def _df():
+    return pd.DataFrame({
+        "createdAt": pd.to_datetime([
+            "2024-01-01 10:00", "2024-01-01 22:00", "2024-01-03 08:00", None,
+        ], utc=True),
+        "viewCount": [10, 20, 30, 40],
+        "likeCount": [1, 2, None, 4],
+        "retweetCount": [1, 0, 0, 0],
+        "sentimiento": ["POSITIVO", "NEGATIVO", None, "NEUTRO"],
+        "search_terms": [["banco"], ["banco", "galicia"], ["galicia"], ["banco"]],
+    })
+
+
+def test_granularidad():
+    assert granularidad("2024-01-01", "2024-01-03")[0] == "h"
+    assert granularidad("2024-01-01", "2024-03-01")[0] == "D"
+    assert granularidad("2024-01-01", "2024-12-31")[0] == "MS"
+
+
+def test_totales_y_franjas_vacias():
+    serie = rollup(_df(), desde="2024-01-01", hasta="2024-01-08")
+
+    assert serie["frecuencia"] == "D"
+    totales = serie["totales"]
+    assert len(totales) == 7  # la ventana entera, con 0 en los días sin tweets
+    assert totales["tweets"].tolist() == [2, 0, 1, 0, 0, 0, 0]
+    assert totales["vistas"].tolist()[:3] == [30, 0, 30]
+    assert totales["interacciones"].tolist()[:3] == [4, 0, 0]
+
+
+def test_sentimientos_y_terminos():
+    serie = rollup(_df(), desde="2024-01-01", hasta="2024-01-08")
+
+    sentimientos = serie["sentimientos"]
+    assert sentimientos.loc["2024-01-01", "POSITIVO"] == 1
+    assert sentimientos.loc["2024-01-01", "NEGATIVO"] == 1
+    assert sentimientos.loc["2024-01-03"].sum() == 0
+    assert serie["proporciones"].loc["2024-01-01", "POSITIVO"] == 0.5
+    assert serie["proporciones"].loc["2024-01-03"].isna().all()
+
+    terminos = serie["terminos"]
+    assert terminos.columns.tolist() == ["banco", "galicia"]
+    assert terminos["banco"].tolist() == [2, 0, 0, 0, 0, 0, 0]
+    assert terminos["galicia"].tolist() == [1, 0, 1, 0, 0, 0, 0]
+
+
+def test_sin_fechas():
+    assert rollup(pd.DataFrame()) is None
+    assert rollup(pd.DataFrame({"createdAt": [None]})) is None
@@ -0,0 +1,54 @@
+# tests/test_scraping.py
+
+"""
+`scrapear_en_paralelo` + `obtener_tweets` contra el `ApifyFalso` de los
+benchmarks: un término que falla no afecta a los demás y nunca hay más de
+`max_workers` ejecuciones del actor a la vez.
+"""
+
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+from falsos import ApifyFalso  # noqa: E402
+from scraping import obtener_tweets, scrapear_en_paralelo  # noqa: E402
+
+
+def _scrapear(cliente, terminos, max_workers):
+    avances = []
+    resultados, errores = scrapear_en_paralelo(
+        lambda termino: obtener_tweets(cliente, [termino], "2023-11-24", "2023-11-25", "Top"),
+        terminos,
+        max_workers=max_workers,
+        on_term_done=lambda termino, completados, total: avances.append((termino, completados, total)),
+    )
+    return resultados, errores, avances
+
+
+def test_un_termino_que_falla_no_afecta_a_los_demas():
+    cliente = ApifyFalso(3, latencia_ejecucion=0.05, fallan={"roto"})
+    resultados, errores, avances = _scrapear(cliente, ["banco", "roto", "tarjeta"], max_workers=3)
+
+    assert set(resultados) == {"banco", "tarjeta"}
+    for df in resultados.values():
+        assert len(df) == 3
+    assert set(errores) == {"roto"}
+    assert "roto" in str(errores["roto"])
+    assert sorted(completados for _, completados, _ in avances) == [1, 2, 3]
+
+
+def test_respeta_el_maximo_de_ejecuciones_simultaneas():
+    cliente = ApifyFalso(3, latencia_ejecucion=0.05)
+    terminos = [f"termino{i}" for i in range(8)]
+    resultados, errores, _ = _scrapear(cliente, terminos, max_workers=2)
+
+    assert set(resultados) == set(terminos)
+    assert not errores
+    assert cliente.maximo_en_curso == 2
+
+
+def test_sin_terminos():
+    assert scrapear_en_paralelo(lambda termino: None, []) == ({}, {})
@@ -0,0 +1,200 @@
+# trabajos.py
+
+"""
+Trabajos en segundo plano con estado persistente en SQLite.
+
+Un análisis completo puede tardar minutos; si se ejecutara dentro del script
+de Streamlit, cualquier interacción con un widget, un refresco del navegador
+o un segundo usuario lo cortaría. `ColaTrabajos` lo ejecuta en un pool de
+hilos del proceso del servidor, guarda el avance en la tabla `trabajos` y el
+resultado en disco, y la página sólo consulta el estado por ID.
+
+Mientras corre, un trabajo puede publicar resultados parciales (p. ej. los
+tweets apenas termina el scraping) que la página muestra antes del final.
+Viven en memoria, porque sólo tienen sentido mientras el hilo del trabajo
+existe, y se descartan al terminar.
+
+Los trabajos que estaban en cola o en curso cuando se reinició el proceso
+quedan marcados como "interrumpido".
+"""
+
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+EN_COLA = "en_cola"
+EN_CURSO = "en_curso"
+TERMINADO = "terminado"
+FALLIDO = "fallido"
+INTERRUMPIDO = "interrumpido"
+
+ESTADOS_FINALES = {TERMINADO, FALLIDO, INTERRUMPIDO}
+
+
+class ColaTrabajos:
+    """
+    Cola de trabajos con `max_workers` ejecuciones simultáneas. Se puede
+    compartir entre sesiones e hilos.
+    """
+
+    def __init__(self, path, directorio_resultados, max_workers=2):
+        self.path = path
+        self.directorio_resultados = directorio_resultados
+        self._lock = threading.Lock()
+        self._parciales = {}  # trabajo -> {clave: valor}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="trabajo")
+
+        directorio = os.path.dirname(path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        os.makedirs(directorio_resultados, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS trabajos (
+                       id TEXT PRIMARY KEY,
+                       usuario TEXT,
+                       huella TEXT,
+                       estado TEXT NOT NULL,
+                       etapa TEXT,
+                       progreso REAL NOT NULL DEFAULT 0,
+                       mensaje TEXT,
+                       parametros TEXT NOT NULL,
+                       error TEXT,
+                       creado REAL NOT NULL,
+                       actualizado REAL NOT NULL
+                   )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_usuario ON trabajos (usuario, creado)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_huella ON trabajos (huella, creado)")
+            # Los hilos de un proceso anterior ya no existen
+            self._conn.execute(
+                "UPDATE trabajos SET estado = ?, actualizado = ? WHERE estado IN (?, ?)",
+                (INTERRUMPIDO, time.time(), EN_COLA, EN_CURSO),
+            )
+
+    def _ruta_resultado(self, trabajo_id):
+        return os.path.join(self.directorio_resultados, f"{trabajo_id}.pkl")
+
+    def _actualizar(self, trabajo_id, **campos):
+        campos["actualizado"] = time.time()
+        asignaciones = ", ".join(f"{campo} = ?" for campo in campos)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE trabajos SET {asignaciones} WHERE id = ?", (*campos.values(), trabajo_id))
+
+    def enviar(self, funcion, parametros, usuario=None, huella=None):
+        """
+        Encola `funcion(parametros, on_progreso, on_parcial)` y devuelve el ID
+        del trabajo. `parametros` debe ser serializable en JSON;
+        `on_progreso(etapa, fraccion, mensaje)` actualiza la tabla y
+        `on_parcial(clave, valor)` publica un resultado parcial (ver
+        `parcial()`). El valor devuelto por `funcion` se guarda como resultado
+        del trabajo. `huella` identifica la ejecución para poder reutilizarla
+        con `buscar()`.
+        """
+        trabajo_id = uuid.uuid4().hex[:12]
+        ahora = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO trabajos (id, usuario, huella, estado, parametros, creado, actualizado)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (trabajo_id, usuario, huella, EN_COLA, json.dumps(parametros, ensure_ascii=False), ahora, ahora),
+            )
+        self._executor.submit(self._ejecutar, trabajo_id, funcion, parametros)
+        return trabajo_id
+
+    def _ejecutar(self, trabajo_id, funcion, parametros):
+        self._actualizar(trabajo_id, estado=EN_CURSO, mensaje="Iniciando...")
+
+        def on_progreso(etapa, fraccion, mensaje):
+            self._actualizar(trabajo_id, etapa=etapa, progreso=float(fraccion), mensaje=mensaje)
+
+        def on_parcial(clave, valor):
+            with self._lock:
+                self._parciales.setdefault(trabajo_id, {})[clave] = valor
+
+        try:
+            resultado = funcion(parametros, on_progreso, on_parcial)
+            temporal = self._ruta_resultado(trabajo_id) + ".tmp"
+            with open(temporal, "wb") as f:
+                pickle.dump(resultado, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporal, self._ruta_resultado(trabajo_id))
+        except Exception as e:
+            self._actualizar(trabajo_id, estado=FALLIDO, error=f"{type(e).__name__}: {e}")
+        else:
+            self._actualizar(trabajo_id, estado=TERMINADO, progreso=1.0, mensaje="Listo")
+        finally:
+            with self._lock:
+                self._parciales.pop(trabajo_id, None)
+
+    def parcial(self, trabajo_id):
+        """
+        Resultados parciales publicados por un trabajo en curso de este
+        proceso (`{clave: valor}`, vacío si no hay). Los valores no se copian:
+        no se deben modificar.
+        """
+        with self._lock:
+            return dict(self._parciales.get(trabajo_id, {}))
+
+    def buscar(self, huella, max_edad=None):
+        """
+        ID del trabajo más reciente con esa `huella` que terminó bien o sigue
+        en curso (creado hace menos de `max_edad` segundos, si se indica), o None.
+        """
+        consulta = "SELECT id FROM trabajos WHERE huella = ? AND estado IN (?, ?, ?)"
+        argumentos = [huella, EN_COLA, EN_CURSO, TERMINADO]
+        if max_edad is not None:
+            consulta += " AND creado >= ?"
+            argumentos.append(time.time() - max_edad)
+        consulta += " ORDER BY creado DESC"
+        with self._lock:
+            filas = self._conn.execute(consulta, argumentos).fetchall()
+        for (trabajo_id,) in filas:
+            # Un trabajo terminado sólo sirve si su resultado sigue en disco
+            if self.estado(trabajo_id)["estado"] != TERMINADO or os.path.exists(self._ruta_resultado(trabajo_id)):
+                return trabajo_id
+        return None
+
+    def estado(self, trabajo_id):
+        """Fila del trabajo como dict (con `parametros` ya decodificados), o None."""
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM trabajos WHERE id = ?", (trabajo_id,))
+            fila = cursor.fetchone()
+            columnas = [d[0] for d in cursor.description]
+        if fila is None:
+            return None
+        trabajo = dict(zip(columnas, fila))
+        trabajo["parametros"] = json.loads(trabajo["parametros"])
+        return trabajo
+
+    def resultado(self, trabajo_id):
+        """Resultado de un trabajo terminado, o None si no está disponible."""
+        try:
+            with open(self._ruta_resultado(trabajo_id), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def listar(self, usuario=None, limite=20):
+        """Últimos trabajos (de `usuario`, si se indica), del más reciente al más antiguo."""
+        consulta = "SELECT id, usuario, estado, etapa, progreso, mensaje, parametros, creado FROM trabajos"
+        argumentos = ()
+        if usuario is not None:
+            consulta += " WHERE usuario = ?"
+            argumentos = (usuario,)
+        consulta += " ORDER BY creado DESC LIMIT ?"
+        with self._lock:
+            cursor = self._conn.execute(consulta, (*argumentos, limite))
+            filas = cursor.fetchall()
+            columnas = [d[0] for d in cursor.description]
+        trabajos = [dict(zip(columnas, fila)) for fila in filas]
+        for trabajo in trabajos:
+            trabajo["parametros"] = json.loads(trabajo["parametros"])
+        return trabajos